@@ -0,0 +1,38 @@
+"""/capture 的二进制打包格式，控制端与被控端共用，只依赖标准库
+
+magic(4) + 头长度(u32, 小端) + 头 JSON + 各部分原始字节（按头中 parts 的顺序首尾相接）
+
+头 JSON：{"meta": {...}, "parts": [{"name": ..., "content_type": ..., "size": ...}, ...]}
+"""
+import json
+import struct
+
+BUNDLE_MAGIC = b"CAPB"
+BUNDLE_MEDIA_TYPE = "application/x-capture-bundle"
+
+
+def pack_bundle(meta, parts):
+    """parts 为 [(name, content_type, bytes), ...]"""
+    header = json.dumps({
+        "meta": meta,
+        "parts": [{"name": name, "content_type": content_type, "size": len(body)}
+                  for name, content_type, body in parts],
+    }, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+    return b"".join([BUNDLE_MAGIC, struct.pack("<I", len(header)), header] + [body for _, _, body in parts])
+
+
+def unpack_bundle(data):
+    """返回 (meta, {name: (content_type, bytes)})"""
+    if data[:4] != BUNDLE_MAGIC:
+        raise ValueError("Not a capture bundle (bad magic)")
+    (header_len,) = struct.unpack_from("<I", data, 4)
+    offset = 8
+    header = json.loads(data[offset:offset + header_len].decode("utf-8"))
+    offset += header_len
+    parts = {}
+    for part in header["parts"]:
+        parts[part["name"]] = (part["content_type"], data[offset:offset + part["size"]])
+        offset += part["size"]
+    if offset != len(data):
+        raise ValueError(f"Capture bundle size mismatch: expected {offset} bytes, got {len(data)}")
+    return header["meta"], parts
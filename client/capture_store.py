@@ -0,0 +1,159 @@
+"""截图内存仓库：替代在 SHARED_DIR 中无限堆积的截图文件
+
+- 按总字节数与条数限额，超限时按 LRU 淘汰；超过 TTL 的条目在每次写入/读取时清理
+- id 为 uuid4，不会像按秒命名的文件那样互相覆盖
+- 默认首次下载后即删除
+- 可选溢出到磁盘：因限额被挤出内存的条目写到 spill_dir，仍可下载一次，同样受 TTL 约束；
+  目录在设置时创建，文件在锁外写入，写盘期间该条目仍从内存提供，不阻塞其他读写
+"""
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict
+
+
+class CaptureStore:
+    def __init__(self, max_bytes=256 * 1024 * 1024, max_items=64, ttl=300.0,
+                 spill_dir=None, delete_on_read=True):
+        self.max_bytes = max_bytes
+        self.max_items = max_items
+        self.ttl = ttl
+        self.spill_dir = None
+        self.delete_on_read = delete_on_read
+        self._items = OrderedDict()  # id -> (body, media_type, created)
+        self._spilling = {}          # 正在写盘的条目：id -> (body, media_type, created)
+        self._spilled = {}           # id -> (path, media_type, created)
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._stats = {"puts": 0, "hits": 0, "misses": 0, "spill_hits": 0,
+                       "evicted_lru": 0, "evicted_ttl": 0, "spilled": 0}
+        self.set_spill_dir(spill_dir)
+
+    def set_spill_dir(self, spill_dir):
+        """启用（None 为关闭）溢出到磁盘，目录不存在时创建"""
+        if spill_dir:
+            os.makedirs(spill_dir, exist_ok=True)
+        self.spill_dir = spill_dir
+
+    def put(self, body, media_type="image/png", ext="png"):
+        """存入一张编码后的图像，返回下载 id"""
+        capture_id = f"{uuid.uuid4().hex}.{ext}"
+        with self._lock:
+            self._expire()
+            self._items[capture_id] = (body, media_type, time.time())
+            self._bytes += len(body)
+            self._stats["puts"] += 1
+            # 至少保留刚写入的这一条
+            evicted = []
+            while len(self._items) > 1 and (len(self._items) > self.max_items or self._bytes > self.max_bytes):
+                evicted.append(self._evict_oldest())
+            spill_dir = self.spill_dir
+            if spill_dir:
+                self._spilling.update(evicted)
+        if spill_dir:
+            for item in evicted:
+                self._spill(spill_dir, *item)
+        return capture_id
+
+    def _spill(self, spill_dir, capture_id, item):
+        """在锁外把一个被淘汰的条目写到磁盘，写完后登记；写盘期间已被读走的条目直接删除文件"""
+        path = os.path.join(spill_dir, capture_id)
+        try:
+            with open(path, "wb") as f:
+                f.write(item[0])
+        except OSError as e:
+            print(f"Capture store spill failed for {capture_id}: {e}")
+            path = None
+        with self._lock:
+            pending = self._spilling.pop(capture_id, None)
+            if path is None:
+                return
+            if pending is None:
+                self._remove_file(path)
+                return
+            self._spilled[capture_id] = (path, item[1], item[2])
+            self._stats["spilled"] += 1
+
+    def get(self, capture_id):
+        """返回 (body, media_type)，不存在或已过期时返回 None"""
+        with self._lock:
+            self._expire()
+            item = self._items.get(capture_id)
+            if item is not None:
+                self._stats["hits"] += 1
+                if self.delete_on_read:
+                    del self._items[capture_id]
+                    self._bytes -= len(item[0])
+                else:
+                    self._items.move_to_end(capture_id)
+                return item[0], item[1]
+
+            item = self._spilling.get(capture_id)
+            if item is not None:
+                self._stats["hits"] += 1
+                if self.delete_on_read:
+                    del self._spilling[capture_id]
+                return item[0], item[1]
+
+            spilled = self._spilled.get(capture_id)
+            if spilled is None:
+                self._stats["misses"] += 1
+                return None
+            path, media_type, _ = spilled
+            try:
+                with open(path, "rb") as f:
+                    body = f.read()
+            except OSError:
+                self._spilled.pop(capture_id, None)
+                self._stats["misses"] += 1
+                return None
+            self._stats["spill_hits"] += 1
+            if self.delete_on_read:
+                del self._spilled[capture_id]
+                self._remove_file(path)
+            return body, media_type
+
+    def stats(self):
+        with self._lock:
+            self._expire()
+            return {
+                **self._stats,
+                "items": len(self._items),
+                "bytes": self._bytes,
+                "spilled_items": len(self._spilled) + len(self._spilling),
+                "max_items": self.max_items,
+                "max_bytes": self.max_bytes,
+                "ttl": self.ttl,
+            }
+
+    # ---------- 内部方法（调用方持有锁） ----------
+
+    def _evict_oldest(self):
+        """从内存中移除最旧的条目，返回 (id, 条目)，由 put 在锁外决定是否写盘"""
+        capture_id, item = self._items.popitem(last=False)
+        self._bytes -= len(item[0])
+        self._stats["evicted_lru"] += 1
+        return capture_id, item
+
+    def _expire(self):
+        if not self.ttl:
+            return
+        deadline = time.time() - self.ttl
+        for capture_id, (body, _, created) in list(self._items.items()):
+            if created < deadline:
+                del self._items[capture_id]
+                self._bytes -= len(body)
+                self._stats["evicted_ttl"] += 1
+        for capture_id, (path, _, created) in list(self._spilled.items()):
+            if created < deadline:
+                del self._spilled[capture_id]
+                self._remove_file(path)
+                self._stats["evicted_ttl"] += 1
+
+    @staticmethod
+    def _remove_file(path):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
@@ -0,0 +1,196 @@
+"""进程与窗口生命周期事件：在被控端 VM 上产生，按订阅过滤后推送给控制端（/events，SSE）
+
+事件来源：
+- 进程：ProcessTable 每次增量刷新得到的新增 / 退出进程（process_spawn / process_exit）
+- 窗口：WindowIndex 每次重建时与上一次快照比较得到的打开 / 关闭（window_open / window_close）
+LifecycleMonitor 在有订阅者时驱动两者刷新；窗口事件钩子（SetWinEventHook）会立即唤醒它。
+
+订阅过滤：给定 exe 路径和/或 pid 列表，订阅者跟踪“该 exe 的进程 + 给定 pid + 它们的全部子孙”；
+跟踪集合中的进程派生的子进程自动加入，退出的进程自动移除。
+"""
+import json
+import queue
+import threading
+import time
+
+SSE_MEDIA_TYPE = "text/event-stream"
+
+
+class Subscription:
+    """一个订阅者：过滤条件、跟踪中的 pid 集合与有界事件队列"""
+
+    def __init__(self, norm_exe=None, pids=(), maxsize=1024):
+        self.norm_exe = norm_exe
+        self.tracked = set(pids)
+        self.exited = set()  # 已退出的跟踪进程：其窗口关闭事件可能晚于进程退出事件到达
+        self.queue = queue.Queue(maxsize=maxsize)
+        self.dropped = 0
+
+    def matches(self, event):
+        """判断事件是否属于本订阅；进程事件同时更新跟踪集合（调用方持有 hub 锁）"""
+        kind = event["type"]
+        pid = event["pid"]
+        if kind == "process_spawn":
+            if pid in self.tracked or event.get("ppid") in self.tracked or \
+                    (self.norm_exe and event.get("norm_exe") == self.norm_exe):
+                self.tracked.add(pid)
+                return True
+            return False
+        if kind == "process_exit":
+            if pid in self.tracked:
+                self.tracked.discard(pid)
+                self.exited.add(pid)
+                return True
+            return False
+        if kind == "window_close":
+            return pid in self.tracked or pid in self.exited
+        return pid in self.tracked
+
+    def put(self, event):
+        try:
+            self.queue.put_nowait(event)
+        except queue.Full:
+            self.dropped += 1
+
+    def get(self, timeout=None):
+        """取下一个事件，超时返回 None"""
+        try:
+            return self.queue.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+
+class EventHub:
+    def __init__(self):
+        self._subscriptions = set()
+        self._lock = threading.Lock()
+        self.wakeup = threading.Event()
+        self.published = 0
+
+    def subscribe(self, norm_exe=None, pids=()):
+        subscription = Subscription(norm_exe, pids)
+        with self._lock:
+            self._subscriptions.add(subscription)
+        self.wakeup.set()
+        return subscription
+
+    def track(self, subscription, pids):
+        """把已存在的进程加入订阅的跟踪集合（先订阅再补充，避免两步之间的派生事件丢失）"""
+        with self._lock:
+            subscription.tracked |= set(pids)
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            self._subscriptions.discard(subscription)
+
+    def has_subscribers(self):
+        return bool(self._subscriptions)
+
+    def publish(self, event):
+        event.setdefault("time", time.time())
+        with self._lock:
+            self.published += 1
+            for subscription in self._subscriptions:
+                if subscription.matches(event):
+                    # 推送时去掉内部字段
+                    subscription.put({key: value for key, value in event.items() if key != "norm_exe"})
+
+    def stats(self):
+        with self._lock:
+            return {
+                "subscribers": len(self._subscriptions),
+                "published": self.published,
+                "dropped": sum(subscription.dropped for subscription in self._subscriptions),
+            }
+
+
+def process_event(kind, proc):
+    return {"type": kind, "pid": proc.pid, "ppid": proc.ppid, "name": proc.name, "exe": proc.exe,
+            "norm_exe": proc.norm_exe}
+
+
+def window_event(kind, window):
+    return {"type": kind, "pid": window.pid, "hwnd": window.hwnd, "title": window.title}
+
+
+def parse_pids(text):
+    """逗号分隔的 pid 列表（/events 的 pids 参数）；含非正整数时抛 ValueError"""
+    pids = []
+    for part in (text or "").split(","):
+        part = part.strip()
+        if not part:
+            continue
+        if not part.isdigit() or int(part) <= 0:
+            raise ValueError(f"Invalid pid {part!r} in pids={text!r} (expected comma-separated positive integers)")
+        pids.append(int(part))
+    return pids
+
+
+def format_sse(event):
+    """一条 SSE 消息：event 行为事件类型，data 行为 JSON"""
+    return f"event: {event['type']}\ndata: {json.dumps(event, ensure_ascii=False)}\n\n"
+
+
+def iter_sse(lines):
+    """解析 SSE 文本行（str 或 bytes），逐个产出事件 dict；注释行（心跳）忽略"""
+    data = []
+    for line in lines:
+        if isinstance(line, bytes):
+            line = line.decode("utf-8")
+        if not line:
+            if data:
+                yield json.loads("\n".join(data))
+                data = []
+        elif line.startswith("data:"):
+            data.append(line[5:].lstrip())
+
+
+class LifecycleMonitor:
+    """把 ProcessTable / WindowIndex 的变化转成事件发布到 EventHub
+
+    有订阅者时每 interval 秒刷新一次进程表与窗口索引，窗口事件钩子触发时立即刷新；
+    其他接口的查询触发的刷新同样会产生事件，不会漏掉。
+    """
+
+    def __init__(self, hub, processes, windows, interval=0.25):
+        self.hub = hub
+        self.processes = processes
+        self.windows = windows
+        self.interval = interval
+        self._stop = threading.Event()
+        processes.listeners.append(self._on_processes)
+        windows.listeners.append(self._on_windows)
+        windows.on_invalidate = hub.wakeup.set
+
+    def _on_processes(self, spawned, exited):
+        for proc in spawned:
+            self.hub.publish(process_event("process_spawn", proc))
+        for proc in exited:
+            self.hub.publish(process_event("process_exit", proc))
+
+    def _on_windows(self, opened, closed):
+        for window in opened:
+            self.hub.publish(window_event("window_open", window))
+        for window in closed:
+            self.hub.publish(window_event("window_close", window))
+
+    def start(self):
+        thread = threading.Thread(target=self._run, name="lifecycle-monitor", daemon=True)
+        thread.start()
+        return thread
+
+    def stop(self):
+        self._stop.set()
+        self.hub.wakeup.set()
+
+    def _run(self):
+        while not self._stop.is_set():
+            self.hub.wakeup.wait(self.interval if self.hub.has_subscribers() else None)
+            self.hub.wakeup.clear()
+            if self._stop.is_set() or not self.hub.has_subscribers():
+                continue
+            try:
+                self.processes.refresh()
+                self.windows.snapshot()
+            except Exception as e:
+                print(f"Lifecycle monitor refresh failed: {e}")
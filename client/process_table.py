@@ -0,0 +1,251 @@
+"""进程表：增量维护的 exe 路径 -> pid 与 pid -> 子孙进程 索引
+
+替代每次请求都遍历全部进程并对每个 exe 调用 os.path.samefile 的做法：
+- 刷新时只比较 pid 集合的差异，新出现的进程读一次信息，消失的进程从索引中删除
+- 路径规范化（realpath + normcase）结果缓存，同一路径只做一次文件系统访问
+- exe -> pids 直接查表；pid -> 子孙进程按需计算并缓存，进程集合变化时整体失效
+
+Windows 的 ppid 可能指向已退出后被复用的 pid，建立父子关系时要求父进程不晚于子进程创建。
+两次刷新之间 pid 也可能被复用（集合差异看不出来），因此按 exe / 子孙查询时会重新读取返回的每个 pid 的
+create_time，与表中不一致即视为旧进程退出、新进程出现，替换该条目后再作答，避免把无关进程当作目标（如强杀）。
+"""
+import os
+import threading
+import time
+
+import psutil
+
+
+class ProcessInfo:
+    __slots__ = ("pid", "ppid", "name", "exe", "norm_exe", "create_time")
+
+    def __init__(self, pid, ppid, name, exe, norm_exe, create_time):
+        self.pid = pid
+        self.ppid = ppid
+        self.name = name
+        self.exe = exe
+        self.norm_exe = norm_exe
+        self.create_time = create_time
+
+    def to_dict(self):
+        return {"pid": self.pid, "ppid": self.ppid, "name": self.name, "exe": self.exe,
+                "create_time": self.create_time}
+
+
+def _read_process(pid):
+    """读取单个进程的信息；进程已退出时返回 None，无权限读取的字段为 None"""
+    try:
+        proc = psutil.Process(pid)
+        with proc.oneshot():
+            info = {"ppid": proc.ppid(), "name": proc.name(), "create_time": proc.create_time()}
+            try:
+                info["exe"] = proc.exe() or None
+            except (psutil.AccessDenied, psutil.ZombieProcess, OSError):
+                info["exe"] = None
+        return info
+    except (psutil.NoSuchProcess, psutil.AccessDenied, psutil.ZombieProcess):
+        return None
+
+
+class ProcessTable:
+    """min_interval 秒内的重复查询复用上一次刷新结果；list_pids / read_process 可替换，便于测试"""
+
+    def __init__(self, min_interval=0.1, list_pids=psutil.pids, read_process=_read_process):
+        self.min_interval = min_interval
+        self.list_pids = list_pids
+        self.read_process = read_process
+        self._procs = {}          # pid -> ProcessInfo
+        self._by_exe = {}         # 规范化 exe -> {pid}
+        self._children = {}       # pid -> {子进程 pid}
+        self._descendants = {}    # pid -> frozenset，进程集合变化时清空
+        self._norm_cache = {}     # 原始路径 -> 规范化路径
+        self._refreshed = 0.0
+        self._lock = threading.RLock()
+        self.listeners = []       # 每次刷新后以 (新增 ProcessInfo 列表（按创建时间排序）, 退出 ProcessInfo 列表) 调用
+        self._stats = {"refreshes": 0, "spawned": 0, "exited": 0, "norm_misses": 0, "reused": 0,
+                       "refresh_ms": 0.0}
+
+    # ---------- 路径规范化 ----------
+
+    def normalize(self, path):
+        if not path:
+            return None
+        norm = self._norm_cache.get(path)
+        if norm is None:
+            self._stats["norm_misses"] += 1
+            try:
+                norm = os.path.normcase(os.path.realpath(path))
+            except OSError:
+                norm = os.path.normcase(os.path.abspath(path))
+            self._norm_cache[path] = norm
+        return norm
+
+    # ---------- 增量刷新 ----------
+
+    def refresh(self, force=False):
+        """比较 pid 集合差异并更新索引，返回 (新增 pid 集合, 退出 pid 集合)"""
+        with self._lock:
+            if not force and time.monotonic() - self._refreshed < self.min_interval:
+                return set(), set()
+            t0 = time.perf_counter()
+            current = set(self.list_pids())
+            known = set(self._procs)
+            exited = known - current
+            spawned = current - known
+
+            exited_procs = [self._remove(pid) for pid in exited]
+            added = set()
+            for pid in spawned:
+                info = self.read_process(pid)
+                if info is not None:
+                    self._add(pid, info)
+                    added.add(pid)
+            # 全部读完后再挂父子关系：同一次刷新中子进程可能先于父进程被读到
+            for pid in added:
+                self._link(self._procs[pid])
+            if exited or added:
+                self._descendants.clear()
+
+            self._refreshed = time.monotonic()
+            self._stats["refreshes"] += 1
+            self._stats["spawned"] += len(added)
+            self._stats["exited"] += len(exited)
+            self._stats["refresh_ms"] += (time.perf_counter() - t0) * 1000
+            # 首次加载不算“新增”，不通知监听者
+            if known:
+                self._notify([self._procs[pid] for pid in added], exited_procs)
+            return added, exited
+
+    def _notify(self, spawned_procs, exited_procs):
+        if not (spawned_procs or exited_procs):
+            return
+        # 按创建时间排序：订阅方只在父进程已被跟踪时才跟踪子进程，父进程必须先于子进程发布
+        spawned_procs = sorted(spawned_procs, key=lambda proc: (proc.create_time or 0.0, proc.pid))
+        for listener in self.listeners:
+            listener(spawned_procs, exited_procs)
+
+    def _verify(self, pids):
+        """重新读取 pids 的 create_time：已退出的删除，被复用的替换为新进程；返回是否有变化"""
+        spawned_procs, exited_procs = [], []
+        for pid in pids:
+            old = self._procs.get(pid)
+            if old is None:
+                continue
+            info = self.read_process(pid)
+            if info is not None and info["create_time"] == old.create_time:
+                continue
+            exited_procs.append(self._remove(pid))
+            if info is not None:
+                self._add(pid, info)
+                new = self._procs[pid]
+                self._link(new)
+                # 已在表中的、由复用后的新进程派生的子进程
+                for proc in self._procs.values():
+                    if proc.ppid == pid and proc.pid != pid:
+                        self._link(proc)
+                spawned_procs.append(new)
+        if not exited_procs:
+            return False
+        self._descendants.clear()
+        self._stats["reused"] += len(spawned_procs)
+        self._stats["spawned"] += len(spawned_procs)
+        self._stats["exited"] += len(exited_procs)
+        self._notify(spawned_procs, exited_procs)
+        return True
+
+    def _add(self, pid, info):
+        proc = ProcessInfo(pid, info["ppid"], info["name"], info["exe"], self.normalize(info["exe"]),
+                           info["create_time"])
+        self._procs[pid] = proc
+        if proc.norm_exe:
+            self._by_exe.setdefault(proc.norm_exe, set()).add(pid)
+
+    def _link(self, proc):
+        parent = self._procs.get(proc.ppid)
+        if parent is not None and parent.pid != proc.pid and parent.create_time <= proc.create_time:
+            self._children.setdefault(parent.pid, set()).add(proc.pid)
+
+    def _remove(self, pid):
+        proc = self._procs.pop(pid)
+        if proc.norm_exe:
+            pids = self._by_exe.get(proc.norm_exe)
+            if pids is not None:
+                pids.discard(pid)
+                if not pids:
+                    del self._by_exe[proc.norm_exe]
+        siblings = self._children.get(proc.ppid)
+        if siblings is not None:
+            siblings.discard(pid)
+        self._children.pop(pid, None)
+        return proc
+
+    # ---------- 查询 ----------
+
+    def _exe_pids(self, path):
+        norm = self.normalize(path)
+        self._verify(list(self._by_exe.get(norm, ())))
+        return self._by_exe.get(norm, ())
+
+    def pids_for_exe(self, path):
+        """运行该可执行文件的全部 pid"""
+        self.refresh()
+        with self._lock:
+            return set(self._exe_pids(path))
+
+    def processes_for_exe(self, path):
+        self.refresh()
+        with self._lock:
+            return [self._procs[pid].to_dict() for pid in self._exe_pids(path)]
+
+    def info(self, pid):
+        self.refresh()
+        with self._lock:
+            self._verify([pid])
+            proc = self._procs.get(pid)
+            return proc.to_dict() if proc else None
+
+    def _walk(self, pid):
+        cached = self._descendants.get(pid)
+        if cached is None:
+            found = set()
+            stack = [pid]
+            while stack:
+                for child in self._children.get(stack.pop(), ()):
+                    if child not in found:
+                        found.add(child)
+                        stack.append(child)
+            cached = self._descendants[pid] = frozenset(found)
+        return cached
+
+    def _checked_descendants(self, pid):
+        # 替换被复用的 pid 会改变父子关系，重新计算直到结果稳定
+        while self._verify([pid, *self._walk(pid)]):
+            pass
+        return self._walk(pid)
+
+    def descendants(self, pid):
+        """pid 的全部子孙进程（不含自身）；树结构缓存到下一次进程集合变化，返回前核对其中的 pid 未被复用"""
+        self.refresh()
+        with self._lock:
+            return self._checked_descendants(pid)
+
+    def related(self, pids):
+        """pids 中仍存活的进程及其全部子孙"""
+        self.refresh()
+        with self._lock:
+            result = set()
+            for pid in pids:
+                if pid in self._procs:
+                    found = self._checked_descendants(pid)
+                    if pid in self._procs:
+                        result.add(pid)
+                        result |= found
+            return result
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats["processes"] = len(self._procs)
+            stats["exes"] = len(self._by_exe)
+            stats["refresh_ms"] = round(stats["refresh_ms"], 3)
+            return stats
@@ -0,0 +1,105 @@
+"""截图的抓取、裁剪、缩放与内存编码
+
+坐标变换：截图裁剪到窗口并缩放后，屏幕坐标 (x, y) 对应图像坐标
+    ((x - offset_x) * scale_x, (y - offset_y) * scale_y)
+transform 以 dict 形式随 /screenshot 与 /capture 返回，控制端用 tree_format.transform_rects 换算 UI 树中的矩形。
+"""
+import io
+
+IMAGE_FORMATS = ("png", "webp", "raw")
+MEDIA_TYPES = {
+    "png": "image/png",
+    "webp": "image/webp",
+    "raw": "application/octet-stream",  # RGB24，行优先，尺寸见返回的 width/height；只用于传输，落盘前转 PNG
+}
+
+
+def grab(bbox=None):
+    """抓取整个桌面或 bbox=(left, top, right, bottom) 范围"""
+    from PIL import ImageGrab
+    return ImageGrab.grab(bbox=bbox)
+
+
+def window_bbox(window):
+    """窗口的 BoundingRectangle（左上角截断到 0）；面积为 0（如最小化）时返回 None"""
+    rect = window.BoundingRectangle
+    left, top, right, bottom = max(rect.left, 0), max(rect.top, 0), rect.right, rect.bottom
+    if right <= left or bottom <= top:
+        return None
+    return (left, top, right, bottom)
+
+
+def target_size(width, height, target_width=None, target_height=None, keep_aspect=True):
+    """按训练分辨率计算输出尺寸；keep_aspect 时等比缩放到不超过目标框"""
+    if not target_width and not target_height:
+        return width, height
+    if not keep_aspect and target_width and target_height:
+        return target_width, target_height
+    scales = []
+    if target_width:
+        scales.append(target_width / width)
+    if target_height:
+        scales.append(target_height / height)
+    scale = min(scales)
+    return max(1, round(width * scale)), max(1, round(height * scale))
+
+
+def encode_image(image, fmt="png", compress_level=6, lossless=True, quality=80):
+    """在内存中编码，返回 bytes"""
+    if fmt == "raw":
+        return image.convert("RGB").tobytes()
+    buf = io.BytesIO()
+    if fmt == "png":
+        image.save(buf, format="PNG", compress_level=compress_level)
+    elif fmt == "webp":
+        image.save(buf, format="WEBP", lossless=lossless, quality=quality)
+    else:
+        raise ValueError(f"Unknown image format: {fmt} (expected one of {IMAGE_FORMATS})")
+    return buf.getvalue()
+
+
+def persistable(body, fmt, width, height, compress_level=1):
+    """落盘前调用：raw 只用于传输（没有尺寸信息，dedup / overlay / shards 都无法解码），转成 PNG
+
+    返回 (bytes, 格式)；其余格式原样返回。
+    """
+    if fmt != "raw":
+        return body, fmt
+    from PIL import Image
+    image = Image.frombytes("RGB", (width, height), bytes(body))
+    return encode_image(image, "png", compress_level=compress_level), "png"
+
+
+def grab_for(options, window=None):
+    """按选项抓取原始帧，返回 (image, bbox)；crop_to_window 为真但窗口缺失或不可见时退化为全屏"""
+    bbox = window_bbox(window) if options.crop_to_window and window is not None else None
+    return grab(bbox), bbox
+
+
+def encode_capture(image, bbox, options):
+    """缩放并在内存中编码，返回 (bytes, info)；info 含 format/media_type/width/height/transform
+
+    options 需有 format/compress_level/lossless/quality/target_width/target_height/keep_aspect 属性。
+    """
+    offset_x, offset_y = (bbox[0], bbox[1]) if bbox else (0, 0)
+    width, height = target_size(image.width, image.height,
+                                options.target_width, options.target_height, options.keep_aspect)
+    scale_x, scale_y = width / image.width, height / image.height
+    if (width, height) != image.size:
+        from PIL import Image
+        image = image.resize((width, height), Image.LANCZOS)
+
+    body = encode_image(image, options.format, options.compress_level, options.lossless, options.quality)
+    return body, {
+        "format": options.format,
+        "media_type": MEDIA_TYPES[options.format],
+        "width": width,
+        "height": height,
+        "transform": {"offset_x": offset_x, "offset_y": offset_y, "scale_x": scale_x, "scale_y": scale_y},
+    }
+
+
+def capture_image(options, window=None):
+    """抓图并编码，返回 (bytes, info)"""
+    image, bbox = grab_for(options, window)
+    return encode_capture(image, bbox, options)
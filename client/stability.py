@@ -0,0 +1,66 @@
+"""等待界面稳定：轮询 UI 树结构与屏幕内容，二者在静默期内都不再变化即返回
+
+取代各处写死的 sleep：快的应用不用白等，慢的应用也不会在加载一半时被采集。
+本模块只依赖标准库，探针（取树 / 抓屏）由调用方传入，便于在非 Windows 环境测试；签名与哈希见 state_hash.py。
+"""
+import time
+
+from state_hash import hamming
+
+
+def poll(probe, timeout=10.0, interval=0.2):
+    """反复调用 probe() 直到返回真值或超时，返回最后一次结果"""
+    deadline = time.monotonic() + timeout
+    while True:
+        result = probe()
+        if result or time.monotonic() >= deadline:
+            return result
+        time.sleep(interval)
+
+
+def wait_stable(tree_probe=None, screen_probe=None, quiet=1.0, timeout=15.0, interval=0.2,
+                screen_tolerance=2):
+    """两个探针的结果连续 quiet 秒不变即视为稳定；最晚在 timeout 秒时返回
+
+    - tree_probe() 返回结构签名（见 state_hash.nodes_signature），窗口尚不存在时返回 None
+    - screen_probe() 返回屏幕感知哈希（int）；汉明距离不超过 screen_tolerance 视为未变（容忍光标闪烁）
+    - 探针为 None 时不检查对应一项；探针返回 None 视为“尚未就绪”，不会判定为稳定
+
+    返回 {stable, elapsed, settled_after, samples, changes}；settled_after 为最后一次变化距开始的秒数。
+    """
+    start = time.monotonic()
+    deadline = start + timeout
+    last_tree = last_screen = None
+    last_ready = False
+    last_change = start
+    samples = changes = 0
+    stable = False
+    while True:
+        tree = tree_probe() if tree_probe else ""
+        screen = screen_probe() if screen_probe else 0
+        now = time.monotonic()
+        samples += 1
+
+        ready = tree is not None and screen is not None
+        changed = (not ready or not last_ready or tree != last_tree
+                   or hamming(screen, last_screen) > screen_tolerance)
+        if changed:
+            last_change = now
+            if samples > 1:
+                changes += 1
+        last_tree, last_screen, last_ready = tree, screen, ready
+
+        if ready and now - last_change >= quiet:
+            stable = True
+            break
+        if now >= deadline:
+            break
+        time.sleep(max(0.0, min(interval, deadline - now)))
+
+    return {
+        "stable": stable,
+        "elapsed": round(time.monotonic() - start, 3),
+        "settled_after": round(last_change - start, 3),
+        "samples": samples,
+        "changes": changes,
+    }
@@ -0,0 +1,57 @@
+"""界面状态哈希，被控端（等待稳定）与控制端（采集去重）共用，保证两边对“同一状态”的判断一致
+
+- UI 树结构签名：按先序覆盖每个节点的深度、类型、automation_id、名称与矩形；
+  扁平记录（NDJSON / extract_records）、嵌套 dict 与 ColumnarTree 对同一棵树得到相同的值
+- 截图差分哈希（dHash）：缩放到 (hash_size+1) x hash_size 灰度图，比较水平相邻像素，返回 int
+
+除 dHash 需要 PIL（按需导入）外只依赖标准库。
+"""
+import hashlib
+import io
+
+from tree_format import ColumnarTree, iter_tree
+
+
+def node_key(node):
+    rect = node.get("rect") or {}
+    return (f"{node.get('depth')}|{node.get('control_type')}|{node.get('automation_id')}|{node.get('name')}|"
+            f"{rect.get('left')},{rect.get('top')},{rect.get('right')},{rect.get('bottom')}\n")
+
+
+def nodes_signature(nodes):
+    """先序的节点 / 记录序列 -> 结构签名（sha1 十六进制）"""
+    digest = hashlib.sha1()
+    for node in nodes:
+        digest.update(node_key(node).encode("utf-8"))
+    return digest.hexdigest()
+
+
+def tree_signature(ui_tree):
+    """嵌套 dict 或 ColumnarTree -> 结构签名"""
+    if isinstance(ui_tree, ColumnarTree):
+        return nodes_signature(ui_tree.node(i) for i in range(len(ui_tree)))
+    return nodes_signature(iter_tree(ui_tree))
+
+
+def dhash(image, hash_size=8):
+    """PIL 图像的差分哈希"""
+    from PIL import Image
+    small = image.convert("L").resize((hash_size + 1, hash_size), Image.BILINEAR)
+    pixels = small.tobytes()
+    value = 0
+    for row in range(hash_size):
+        offset = row * (hash_size + 1)
+        for col in range(hash_size):
+            value = (value << 1) | (pixels[offset + col] > pixels[offset + col + 1])
+    return value
+
+
+def dhash_bytes(img_bytes, hash_size=8):
+    """编码后图像字节（png / webp 等）的差分哈希"""
+    from PIL import Image
+    with Image.open(io.BytesIO(img_bytes)) as image:
+        return dhash(image, hash_size)
+
+
+def hamming(a, b):
+    return bin(a ^ b).count("1")
@@ -0,0 +1,93 @@
+"""批量结束进程：先一次性请求全部窗口优雅关闭，在统一截止时间内等待真实退出，只对残留进程强杀进程树
+
+取代逐个 pid 的 Close() + sleep(1) + WM_CLOSE + sleep(1) + taskkill：
+关闭一个带十个辅助进程的应用只花一个截止时间，而不是十倍的固定等待。
+"""
+import os
+import time
+
+import psutil
+
+PROTECTED_PIDS = frozenset({os.getpid()})
+
+
+def _collect(pids, tree):
+    """返回 ({pid: Process}, 结果 dict)；不存在或受保护的 pid 直接写入结果"""
+    procs = {}
+    results = {}
+    for pid in pids:
+        if pid in PROTECTED_PIDS:
+            results[pid] = {"pid": pid, "status": "skipped", "message": "Refusing to close server process"}
+            continue
+        try:
+            proc = psutil.Process(pid)
+            procs[pid] = proc
+            if tree:
+                for child in proc.children(recursive=True):
+                    if child.pid not in PROTECTED_PIDS:
+                        procs.setdefault(child.pid, child)
+        except (psutil.NoSuchProcess, psutil.AccessDenied):
+            results[pid] = {"pid": pid, "status": "not_running", "message": "No such process"}
+    return procs, results
+
+
+def terminate(pids, deadline=5.0, graceful=True, tree=True, close_windows=None, kill_reserve=1.0):
+    """结束 pids（tree 为真时连同子孙），返回 {"results": [...], "elapsed": 秒}
+
+    - close_windows(pids)：向这些进程的窗口发送关闭请求，返回实际收到请求的 pid 集合
+    - 优雅阶段最多等到 deadline - kill_reserve；之后仍存活的进程（及其子孙）被强杀，剩余时间内等待其退出
+    - 每个 pid 的结果含 status（exited / killed / failed / skipped / not_running）、method 与 elapsed（距开始的秒数）
+    """
+    start = time.monotonic()
+    procs, results = _collect(pids, tree)
+    exited_at = {}
+
+    def on_exit(proc):
+        exited_at[proc.pid] = time.monotonic() - start
+
+    closed = set()
+    if graceful and procs and close_windows:
+        try:
+            closed = set(close_windows(set(procs)))
+        except Exception as e:
+            print(f"Graceful close failed: {e}")
+
+    alive = list(procs.values())
+    if graceful and closed:
+        grace = max(0.0, deadline - kill_reserve)
+        _, alive = psutil.wait_procs(alive, timeout=grace, callback=on_exit)
+    graceful_exits = set(exited_at)
+
+    if alive:
+        # 只强杀残留进程；它们的子孙可能是优雅阶段之后才派生的，一并收集
+        survivors = {proc.pid: proc for proc in alive}
+        for proc in alive:
+            try:
+                for child in proc.children(recursive=True):
+                    if child.pid not in PROTECTED_PIDS:
+                        survivors.setdefault(child.pid, child)
+            except (psutil.NoSuchProcess, psutil.AccessDenied):
+                pass
+        for proc in survivors.values():
+            try:
+                proc.kill()
+            except psutil.NoSuchProcess:
+                pass
+            except psutil.AccessDenied as e:
+                print(f"Kill denied for PID {proc.pid}: {e}")
+        remaining = max(kill_reserve, deadline - (time.monotonic() - start))
+        _, alive = psutil.wait_procs(list(survivors.values()), timeout=remaining, callback=on_exit)
+        procs.update(survivors)
+
+    still_alive = {proc.pid for proc in alive}
+    for pid, proc in procs.items():
+        if pid in still_alive:
+            results[pid] = {"pid": pid, "status": "failed", "method": "kill",
+                            "message": "Still running after deadline", "elapsed": None}
+        elif pid in graceful_exits:
+            results[pid] = {"pid": pid, "status": "exited", "method": "graceful" if pid in closed else "with_parent",
+                            "elapsed": round(exited_at[pid], 3)}
+        else:
+            results[pid] = {"pid": pid, "status": "killed", "method": "kill",
+                            "elapsed": round(exited_at.get(pid, time.monotonic() - start), 3)}
+    return {"results": list(results.values()), "elapsed": round(time.monotonic() - start, 3)}
@@ -0,0 +1,605 @@
+"""UI 树的传输/存储格式，控制端与被控端共用，只依赖标准库
+
+NDJSON 流（/get_ui_tree/stream）：
+- 首行：{"status": "ok", "app_name": ..., "root_tag": "Main", ...}
+- 之后每行一个节点：{"id", "parent_id", "depth", name/control_type/...}，按先序排列，父节点总在子节点之前
+- 末行：{"status": "done", "count": N, ...}；中途出错时为 {"status": "error", "error": ...}
+
+节点的 app_name 与 page_tag 不逐行传输，由 TreeAssembler 按头信息与 depth 还原。
+
+v2 列式格式（ColumnarTree）：父节点下标数组 + int32 矩形列 + 控件类型/字符串去重表 + 布尔位域，
+带二进制编码，可用于传输（/get_ui_tree 的 format="v2"）与落盘（*.uit）。
+
+增量（TreeHistory / TreeSync）：按 Merkle 子树哈希比较新旧两棵树，只传输变化的节点。
+"""
+import copy
+import hashlib
+import json
+import struct
+import sys
+import threading
+from array import array
+from collections import OrderedDict
+
+NODE_FIELDS = ("name", "control_type", "automation_id", "is_enabled", "is_offscreen", "rect", "clickable", "focusable")
+
+
+def dump_line(obj) -> str:
+    return json.dumps(obj, ensure_ascii=False, separators=(",", ":")) + "\n"
+
+
+class TreeAssembler:
+    """把扁平节点记录逐条拼回与 extract_ui 相同结构的嵌套树，可边接收边拼装"""
+
+    def __init__(self, app_name="App", root_tag="Main"):
+        self.app_name = app_name
+        self.root_tag = root_tag
+        self.root = None
+        self.count = 0
+        self._nodes = {}
+        self._tags = {}
+
+    def _page_tag(self, depth):
+        # page_tag 只取决于深度：Main_0、Main_0_1、Main_0_1_2 ...
+        tag = self._tags.get(depth)
+        if tag is None:
+            tag = self.root_tag + "".join(f"_{d}" for d in range(depth + 1))
+            self._tags[depth] = tag
+        return tag
+
+    def add(self, record):
+        """加入一条节点记录并返回拼好的节点 dict（其 children 会随后续记录增长）"""
+        node = {
+            "app_name": self.app_name,
+            "page_tag": self._page_tag(record["depth"]),
+            "name": record["name"],
+            "control_type": record["control_type"],
+            "automation_id": record["automation_id"],
+            "is_enabled": record["is_enabled"],
+            "is_offscreen": record["is_offscreen"],
+            "depth": record["depth"],
+            "rect": record["rect"],
+            "clickable": record["clickable"],
+            "focusable": record["focusable"],
+            "children": []
+        }
+        for marker in ("truncated", "timed_out"):  # 限时提取的部分树标记（见 ui_tree.extract_budgeted）
+            if record.get(marker):
+                node[marker] = True
+        parent_id = record.get("parent_id")
+        if parent_id is None:
+            self.root = node
+        else:
+            self._nodes[parent_id]["children"].append(node)
+        self._nodes[record["id"]] = node
+        self.count += 1
+        return node
+
+
+def iter_tree(tree):
+    """非递归先序遍历嵌套树，逐个产出节点 dict（跳过 None 子节点）"""
+    stack = [tree] if tree else []
+    while stack:
+        node = stack.pop()
+        yield node
+        stack.extend(child for child in reversed(node.get("children") or []) if child)
+
+
+def map_rect(rect, transform):
+    """把屏幕坐标矩形换算到裁剪/缩放后的图像坐标（transform 见 screen.py）"""
+    ox, oy = transform["offset_x"], transform["offset_y"]
+    sx, sy = transform["scale_x"], transform["scale_y"]
+    return {
+        "left": round((rect["left"] - ox) * sx),
+        "top": round((rect["top"] - oy) * sy),
+        "right": round((rect["right"] - ox) * sx),
+        "bottom": round((rect["bottom"] - oy) * sy),
+    }
+
+
+def unmap_point(x, y, transform):
+    """map_rect 的逆变换：图像坐标中的点换算回屏幕坐标（点击时使用）"""
+    return (round(x / transform["scale_x"] + transform["offset_x"]),
+            round(y / transform["scale_y"] + transform["offset_y"]))
+
+
+def transform_rects(tree, transform):
+    """原地把整棵树（嵌套 dict 或 ColumnarTree）的 rect 与 clickable 换算到图像坐标，返回 tree"""
+    ox, oy = transform["offset_x"], transform["offset_y"]
+    sx, sy = transform["scale_x"], transform["scale_y"]
+    if isinstance(tree, ColumnarTree):
+        for xs, ys in ((tree.left, tree.top), (tree.right, tree.bottom), (tree.click_x, tree.click_y)):
+            for i in range(len(tree)):
+                xs[i] = round((xs[i] - ox) * sx)
+                ys[i] = round((ys[i] - oy) * sy)
+        return tree
+    for node in iter_tree(tree):
+        node["rect"] = map_rect(node["rect"], transform)
+        clickable = node.get("clickable")
+        if clickable is not None:
+            node["clickable"] = [round((clickable[0] - ox) * sx), round((clickable[1] - oy) * sy), clickable[2]]
+    return tree
+
+
+def iter_ndjson(lines):
+    """逐行解析 NDJSON（str 或 bytes），跳过空行"""
+    for line in lines:
+        if line and line.strip():
+            yield json.loads(line)
+
+
+def read_ndjson_tree(lines, on_node=None):
+    """边读边拼装 NDJSON 流，返回 (tree, header, trailer)
+
+    on_node(node) 在每个节点到达时被调用（参数为已拼装的节点 dict，不含尚未到达的子节点），
+    可用于在提取尚未结束时就开始过滤/写出。流中出现错误行时抛出 ValueError。
+    """
+    header = trailer = None
+    assembler = None
+    for obj in iter_ndjson(lines):
+        if "id" in obj:
+            if assembler is None:
+                raise ValueError("UI tree stream is missing its header line")
+            node = assembler.add(obj)
+            if on_node:
+                on_node(node)
+        elif obj.get("status") == "error":
+            raise ValueError(obj.get("error", "Unknown error"))
+        elif header is None:
+            header = obj
+            assembler = TreeAssembler(obj.get("app_name", "App"), obj.get("root_tag", "Main"))
+        else:
+            trailer = obj
+    if trailer is None:
+        raise ValueError("UI tree stream ended before its trailer line")
+    return (assembler.root if assembler else None), header, trailer
+
+
+# ---------- v2：列式（struct-of-arrays）格式 ----------
+
+FLAG_ENABLED = 1
+FLAG_OFFSCREEN = 2
+FLAG_FOCUSABLE = 4
+FLAG_HAS_CLICKABLE = 8   # clickable 不为 None（服务端裁剪时非点击类型为 None）
+FLAG_CLICKABLE_OK = 16   # GetClickablePoint 的第三项
+FLAG_ENABLED_UNKNOWN = 32    # is_enabled 为 None（读取失败 / 限时提取中超时），与 False 区分
+FLAG_FOCUSABLE_UNKNOWN = 64  # focusable 为 None
+
+NO_STRING = 0xFFFFFFFF   # 字符串表中表示 None
+V2_MAGIC = b"UIT2"
+V2_VERSION = 2
+V2_MEDIA_TYPE = "application/x-ui-tree-v2"
+
+# 列名 -> array typecode；二进制格式按此顺序、小端存放
+V2_COLUMNS = (
+    ("parent", "i"),       # 父节点下标，根为 -1；先序排列，父节点下标总小于子节点
+    ("depth", "H"),
+    ("left", "i"),
+    ("top", "i"),
+    ("right", "i"),
+    ("bottom", "i"),
+    ("click_x", "i"),
+    ("click_y", "i"),
+    ("type_idx", "H"),     # -> types
+    ("name_idx", "I"),     # -> strings
+    ("aid_idx", "I"),      # -> strings（automation_id）
+    ("flags", "B"),
+)
+_KNOWN_KEYS = {"app_name", "page_tag", "depth", "rect", "children"} | set(NODE_FIELDS)
+
+
+class ColumnarTree:
+    """UI 树的 v2 列式表示：每个字段一列，字符串与控件类型去重为表，布尔量压进 flags 位域
+
+    与嵌套 JSON 可无损互转：app_name/page_tag 只在与默认推导值不同的节点上单独记录，
+    未知的额外字段原样保存在 extras 中。
+    """
+
+    def __init__(self, app_name="App", root_tag="Main"):
+        self.app_name = app_name
+        self.root_tag = root_tag
+        self.types = []
+        self.strings = []
+        self.extras = {}
+        for column, typecode in V2_COLUMNS:
+            setattr(self, column, array(typecode))
+        self._type_ids = {}
+        self._string_ids = {}
+        self._tags = {}
+
+    def __len__(self):
+        return len(self.parent)
+
+    # ----- 构建 -----
+
+    def _intern_type(self, value):
+        idx = self._type_ids.get(value)
+        if idx is None:
+            idx = self._type_ids[value] = len(self.types)
+            self.types.append(value)
+        return idx
+
+    def _intern_string(self, value):
+        if value is None:
+            return NO_STRING
+        idx = self._string_ids.get(value)
+        if idx is None:
+            idx = self._string_ids[value] = len(self.strings)
+            self.strings.append(value)
+        return idx
+
+    def _page_tag(self, depth):
+        tag = self._tags.get(depth)
+        if tag is None:
+            tag = self.root_tag + "".join(f"_{d}" for d in range(depth + 1))
+            self._tags[depth] = tag
+        return tag
+
+    def append(self, record, parent=-1):
+        """追加一个节点（NDJSON 节点记录或去掉 children 的嵌套节点），返回其下标"""
+        idx = len(self.parent)
+        rect = record["rect"]
+        clickable = record.get("clickable")
+        flags = 0
+        if record.get("is_enabled"):
+            flags |= FLAG_ENABLED
+        elif record.get("is_enabled") is None:
+            flags |= FLAG_ENABLED_UNKNOWN
+        if record.get("is_offscreen"):
+            flags |= FLAG_OFFSCREEN
+        if record.get("focusable"):
+            flags |= FLAG_FOCUSABLE
+        elif record.get("focusable") is None:
+            flags |= FLAG_FOCUSABLE_UNKNOWN
+        if clickable is not None:
+            flags |= FLAG_HAS_CLICKABLE
+            if clickable[2]:
+                flags |= FLAG_CLICKABLE_OK
+        self.parent.append(parent)
+        self.depth.append(record["depth"])
+        self.left.append(rect["left"])
+        self.top.append(rect["top"])
+        self.right.append(rect["right"])
+        self.bottom.append(rect["bottom"])
+        self.click_x.append(clickable[0] if clickable is not None else 0)
+        self.click_y.append(clickable[1] if clickable is not None else 0)
+        self.type_idx.append(self._intern_type(record["control_type"]))
+        self.name_idx.append(self._intern_string(record["name"]))
+        self.aid_idx.append(self._intern_string(record["automation_id"]))
+        self.flags.append(flags)
+
+        extra = {key: value for key, value in record.items()
+                 if key not in _KNOWN_KEYS and key not in ("id", "parent_id")}
+        if record.get("app_name", self.app_name) != self.app_name:
+            extra["app_name"] = record["app_name"]
+        if record.get("page_tag", self._page_tag(record["depth"])) != self._page_tag(record["depth"]):
+            extra["page_tag"] = record["page_tag"]
+        if extra:
+            self.extras[idx] = extra
+        return idx
+
+    @classmethod
+    def from_tree(cls, tree, root_tag="Main"):
+        """从 extract_ui / *_layout.json 的嵌套 dict 转换"""
+        columns = cls(tree.get("app_name", "App") if tree else "App", root_tag)
+        stack = [(tree, -1)] if tree else []
+        while stack:
+            node, parent = stack.pop()
+            idx = columns.append(node, parent)
+            for child in reversed(node.get("children") or []):
+                if child:
+                    stack.append((child, idx))
+        return columns
+
+    @classmethod
+    def from_records(cls, records, app_name="App", root_tag="Main"):
+        """从 NDJSON 节点记录（先序、id 连续）转换"""
+        columns = cls(app_name, root_tag)
+        for record in records:
+            parent_id = record.get("parent_id")
+            columns.append(record, -1 if parent_id is None else parent_id)
+        return columns
+
+    # ----- 读取 -----
+
+    def rect(self, i):
+        return {"left": self.left[i], "top": self.top[i], "right": self.right[i], "bottom": self.bottom[i]}
+
+    def control_type(self, i):
+        return self.types[self.type_idx[i]]
+
+    def name(self, i):
+        return self._string(self.name_idx[i])
+
+    def clickable(self, i):
+        flags = self.flags[i]
+        if not flags & FLAG_HAS_CLICKABLE:
+            return None
+        return [self.click_x[i], self.click_y[i], bool(flags & FLAG_CLICKABLE_OK)]
+
+    def _string(self, idx):
+        return None if idx == NO_STRING else self.strings[idx]
+
+    def node(self, i):
+        """第 i 个节点的 dict（与嵌套格式字段一致，但不含 children）"""
+        flags = self.flags[i]
+        extra = self.extras.get(i, {})
+        node = {
+            "app_name": extra.get("app_name", self.app_name),
+            "page_tag": extra.get("page_tag", self._page_tag(self.depth[i])),
+            "name": self.name(i),
+            "control_type": self.control_type(i),
+            "automation_id": self._string(self.aid_idx[i]),
+            "is_enabled": None if flags & FLAG_ENABLED_UNKNOWN else bool(flags & FLAG_ENABLED),
+            "is_offscreen": bool(flags & FLAG_OFFSCREEN),
+            "depth": self.depth[i],
+            "rect": self.rect(i),
+            "clickable": self.clickable(i),
+            "focusable": None if flags & FLAG_FOCUSABLE_UNKNOWN else bool(flags & FLAG_FOCUSABLE),
+        }
+        for key, value in extra.items():
+            if key not in ("app_name", "page_tag"):
+                node[key] = value
+        return node
+
+    def to_tree(self):
+        """还原为嵌套 dict（与 *_layout.json 相同结构）"""
+        nodes = []
+        for i in range(len(self)):
+            node = self.node(i)
+            node["children"] = []
+            nodes.append(node)
+            if self.parent[i] >= 0:
+                nodes[self.parent[i]]["children"].append(node)
+        return nodes[0] if nodes else None
+
+    def select(self, types=None, visible_only=True, nonempty=True):
+        """按列筛选节点下标：类型在 types 中、不在屏幕外、矩形面积大于 0"""
+        type_ids = None
+        if types is not None:
+            types = set(types)
+            type_ids = {idx for idx, name in enumerate(self.types) if name in types}
+        left, top, right, bottom, flags, type_idx = (
+            self.left, self.top, self.right, self.bottom, self.flags, self.type_idx)
+        selected = []
+        for i in range(len(self)):
+            if type_ids is not None and type_idx[i] not in type_ids:
+                continue
+            if visible_only and flags[i] & FLAG_OFFSCREEN:
+                continue
+            if nonempty and (right[i] <= left[i] or bottom[i] <= top[i]):
+                continue
+            selected.append(i)
+        return selected
+
+    # ----- 二进制编码 -----
+
+    def to_bytes(self):
+        """magic(4) + version(u16) + 节点数(u32) + 元信息长度(u32) + 元信息 JSON + 各列小端原始数据"""
+        meta = json.dumps({
+            "app_name": self.app_name,
+            "root_tag": self.root_tag,
+            "types": self.types,
+            "strings": self.strings,
+            "extras": {str(i): extra for i, extra in self.extras.items()},
+        }, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+        chunks = [V2_MAGIC, struct.pack("<HII", V2_VERSION, len(self), len(meta)), meta]
+        for column, _ in V2_COLUMNS:
+            values = getattr(self, column)
+            if sys.byteorder == "big":
+                values = array(values.typecode, values)
+                values.byteswap()
+            chunks.append(values.tobytes())
+        return b"".join(chunks)
+
+    @classmethod
+    def from_bytes(cls, data):
+        data = memoryview(data)
+        if bytes(data[:4]) != V2_MAGIC:
+            raise ValueError("Not a v2 UI tree (bad magic)")
+        version, count, meta_len = struct.unpack_from("<HII", data, 4)
+        if version != V2_VERSION:
+            raise ValueError(f"Unsupported UI tree version: {version}")
+        offset = 4 + struct.calcsize("<HII")
+        meta = json.loads(bytes(data[offset:offset + meta_len]).decode("utf-8"))
+        offset += meta_len
+
+        columns = cls(meta["app_name"], meta["root_tag"])
+        columns.types = meta["types"]
+        columns.strings = meta["strings"]
+        columns.extras = {int(i): extra for i, extra in meta["extras"].items()}
+        for column, typecode in V2_COLUMNS:
+            values = array(typecode)
+            size = values.itemsize * count
+            values.frombytes(data[offset:offset + size])
+            if sys.byteorder == "big":
+                values.byteswap()
+            setattr(columns, column, values)
+            offset += size
+        columns._type_ids = {name: idx for idx, name in enumerate(columns.types)}
+        columns._string_ids = {value: idx for idx, value in enumerate(columns.strings)}
+        return columns
+
+    def save(self, path):
+        with open(path, "wb") as f:
+            f.write(self.to_bytes())
+
+    @classmethod
+    def load(cls, path):
+        with open(path, "rb") as f:
+            return cls.from_bytes(f.read())
+
+
+# ---------- 增量：Merkle 子树哈希与差量 ----------
+#
+# 节点在兄弟间的键为 "control_type|automation_id|name"（重名时追加 #n），路径为从根到该节点的键列表。
+# 键字段变化的节点按“删除 + 新增”处理，其余字段变化记为 changed。
+# delta = {
+#     "changed": [{"path": [...], "fields": {...}}],        # 不含 children 的自身字段
+#     "added":   [{"path": 父路径, "key": 键, "node": 子树}],
+#     "removed": [路径, ...],
+#     "order":   [{"path": 父路径, "keys": [新的子节点键顺序]}], # 子节点集合或顺序变化的父节点
+# }
+
+def _own_fields(node):
+    return {key: value for key, value in node.items() if key != "children"}
+
+
+def _digest(obj):
+    data = json.dumps(obj, ensure_ascii=False, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha1(data.encode("utf-8")).hexdigest()
+
+
+def child_keys(children):
+    keys = []
+    seen = {}
+    for child in children:
+        key = f"{child.get('control_type')}|{child.get('automation_id')}|{child.get('name')}"
+        count = seen.get(key, 0)
+        seen[key] = count + 1
+        keys.append(key if count == 0 else f"{key}#{count}")
+    return keys
+
+
+def merkle_hashes(tree):
+    """非递归后序计算每个节点的 (子树哈希, 自身字段哈希)，以 id(node) 为键；根的子树哈希即版本号"""
+    hashes = {}
+    stack = [(tree, False)] if tree else []
+    while stack:
+        node, expanded = stack.pop()
+        children = [child for child in node.get("children") or [] if child]
+        if not expanded:
+            stack.append((node, True))
+            stack.extend((child, False) for child in children)
+            continue
+        own = _digest(_own_fields(node))
+        subtree = hashlib.sha1(own.encode("ascii"))
+        for key, child in zip(child_keys(children), children):
+            subtree.update(key.encode("utf-8"))
+            subtree.update(hashes[id(child)][0].encode("ascii"))
+        hashes[id(node)] = (subtree.hexdigest(), own)
+    return hashes
+
+
+def tree_version(tree, hashes=None):
+    hashes = hashes or merkle_hashes(tree)
+    return hashes[id(tree)][0] if tree else None
+
+
+def diff_trees(old, new, old_hashes=None, new_hashes=None):
+    """计算 old -> new 的差量；子树哈希相同的部分直接跳过"""
+    old_hashes = old_hashes or merkle_hashes(old)
+    new_hashes = new_hashes or merkle_hashes(new)
+    delta = {"changed": [], "added": [], "removed": [], "order": []}
+    stack = [(old, new, [])]
+    while stack:
+        old_node, new_node, path = stack.pop()
+        old_hash, old_own = old_hashes[id(old_node)]
+        new_hash, new_own = new_hashes[id(new_node)]
+        if old_hash == new_hash:
+            continue
+        if old_own != new_own:
+            delta["changed"].append({"path": path, "fields": _own_fields(new_node)})
+
+        old_children = [child for child in old_node.get("children") or [] if child]
+        new_children = [child for child in new_node.get("children") or [] if child]
+        old_keys, new_keys = child_keys(old_children), child_keys(new_children)
+        old_by_key = dict(zip(old_keys, old_children))
+        new_key_set = set(new_keys)
+        for key, child in zip(new_keys, new_children):
+            if key in old_by_key:
+                stack.append((old_by_key[key], child, path + [key]))
+            else:
+                delta["added"].append({"path": path, "key": key, "node": child})
+        for key in old_keys:
+            if key not in new_key_set:
+                delta["removed"].append(path + [key])
+        if new_keys != old_keys:
+            delta["order"].append({"path": path, "keys": new_keys})
+    return delta
+
+
+def apply_patch(old, delta):
+    """在 old 的副本上应用差量，返回新树（old 本身不被修改）"""
+    tree = copy.deepcopy(old)
+    index = {(): tree}
+    stack = [(tree, ())]
+    while stack:
+        node, path = stack.pop()
+        children = [child for child in node.get("children") or [] if child]
+        for key, child in zip(child_keys(children), children):
+            index[path + (key,)] = child
+            stack.append((child, path + (key,)))
+
+    for change in delta["changed"]:
+        node = index[tuple(change["path"])]
+        children = node.get("children", [])
+        node.clear()
+        node.update(copy.deepcopy(change["fields"]))
+        node["children"] = children
+    added = {}
+    for add in delta["added"]:
+        added[(tuple(add["path"]), add["key"])] = copy.deepcopy(add["node"])
+    for order in delta["order"]:
+        path = tuple(order["path"])
+        parent = index[path]
+        parent["children"] = [added[(path, key)] if (path, key) in added else index[path + (key,)]
+                              for key in order["keys"]]
+    return tree
+
+
+class TreeHistory:
+    """服务端保留最近若干个版本的树，供客户端按已持有的版本号请求差量"""
+
+    def __init__(self, max_versions=32):
+        self.max_versions = max_versions
+        self._trees = OrderedDict()  # version -> (tree, hashes)
+        self._lock = threading.Lock()
+
+    def record(self, tree, since=None):
+        """登记新树，返回 (version, delta)；since 未知（已淘汰或从未见过）时 delta 为 None"""
+        hashes = merkle_hashes(tree)
+        version = tree_version(tree, hashes)
+        with self._lock:
+            base = self._trees.get(since) if since else None
+            self._trees[version] = (tree, hashes)
+            self._trees.move_to_end(version)
+            while len(self._trees) > self.max_versions:
+                self._trees.popitem(last=False)
+        if base is None:
+            return version, None
+        return version, diff_trees(base[0], tree, base[1], hashes)
+
+
+class TreeSync:
+    """控制端：保存最近一次收到的完整树及其版本号，用差量重建新树"""
+
+    def __init__(self):
+        self.version = None
+        self.tree = None
+
+    def update(self, version, ui_tree=None, base=None, delta=None):
+        """收到完整树或差量后调用，返回新的完整树"""
+        if delta is not None:
+            if base != self.version:
+                raise ValueError(f"Delta base {base} does not match held version {self.version}")
+            ui_tree = apply_patch(self.tree, delta)
+        self.version, self.tree = version, ui_tree
+        return ui_tree
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Convert UI trees between *_layout.json and the v2 columnar format")
+    parser.add_argument("src", help="*_layout.json or *.uit")
+    parser.add_argument("dst", help="*.uit or *_layout.json")
+    args = parser.parse_args()
+
+    if args.src.endswith(".json"):
+        with open(args.src, "r", encoding="utf-8") as f:
+            ColumnarTree.from_tree(json.load(f)).save(args.dst)
+    else:
+        with open(args.dst, "w", encoding="utf-8") as f:
+            json.dump(ColumnarTree.load(args.src).to_tree(), f, ensure_ascii=False, indent=2)
+    print(f"{args.src} -> {args.dst}")
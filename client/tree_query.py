@@ -0,0 +1,309 @@
+"""UI 树选择器查询：一次建索引，按类 CSS / XPath 的选择器取节点，耗时与匹配数量成正比而不是整树扫描
+
+选择器语法：
+    ButtonControl[name="确定"]                 类型 + 属性；类型可省略 Control 后缀（Button），* 表示任意类型
+    PaneControl[automation_id="main"] Button   空格：后代
+    ListControl > ListItemControl              >：子节点
+    /WindowControl > PaneControl               以 / 开头：第一步必须是根节点
+    Button:visible:enabled, Hyperlink          伪类 visible / offscreen / enabled / clickable / focusable；逗号分隔多个选择器
+属性运算：=（相等） !=  ^=（前缀） $=（后缀） *=（包含） ~=（正则 search）。属性名为节点字段
+（name、automation_id、control_type、depth、is_enabled ...），别名 aid / id -> automation_id，type -> control_type。
+值可加引号；name / automation_id / control_type 总按字符串比较（*[name=123] 匹配名称 "123"），
+其他字段（depth、is_enabled ...）不加引号的 true / false / 数字按对应类型比较；不加引号的 null / none 表示缺失。
+
+索引：control_type、name、automation_id 的值 -> 先序下标列表，以及类型路径（"WindowControl/PaneControl/..."）-> 下标。
+每一步的候选取自最小的一个索引列表；先序排列下 i 的子树为 [i, end[i])，后代判断为区间查找（bisect），
+子节点判断查 parent。/A > B > C 这类只含类型的绝对路径直接查类型路径索引。
+本模块只依赖标准库，控制端与被控端共用。
+"""
+import bisect
+import re
+from functools import lru_cache
+
+from tree_format import ColumnarTree
+
+ATTR_ALIASES = {"aid": "automation_id", "id": "automation_id", "type": "control_type"}
+INDEXED = ("control_type", "name", "automation_id")
+TEXT_FIELDS = frozenset(INDEXED)  # 字符串字段：不加引号的值不做类型转换
+PSEUDOS = {
+    "visible": lambda node: not node.get("is_offscreen"),
+    "offscreen": lambda node: bool(node.get("is_offscreen")),
+    "enabled": lambda node: bool(node.get("is_enabled")),
+    "clickable": lambda node: bool(node.get("clickable")) and bool(node["clickable"][2]),
+    "focusable": lambda node: bool(node.get("focusable")),
+}
+
+
+class SelectorError(ValueError):
+    pass
+
+
+# ---------- 解析 ----------
+
+class Step:
+    __slots__ = ("combinator", "ctype", "attrs", "pseudos")
+
+    def __init__(self, combinator):
+        self.combinator = combinator  # " "（后代）/ ">"（子）/ "/"（根）
+        self.ctype = None
+        self.attrs = []  # [(字段, 运算, 值)]
+        self.pseudos = []
+
+
+_IDENT = re.compile(r"[A-Za-z_*][\w.*-]*")
+_OP = re.compile(r"\s*(!=|\^=|\$=|\*=|~=|=)\s*")
+_VALUE = re.compile(r'"((?:[^"\\]|\\.)*)"|\'((?:[^\'\\]|\\.)*)\'|([^\]\s]+)')
+
+
+def _literal(quoted, bare, text=False):
+    if quoted is not None:
+        return re.sub(r"\\(.)", r"\1", quoted)
+    lowered = bare.lower()
+    if lowered in ("null", "none"):
+        return None
+    if text:
+        return bare
+    if lowered in ("true", "false"):
+        return lowered == "true"
+    try:
+        return int(bare)
+    except ValueError:
+        return bare
+
+
+@lru_cache(maxsize=256)
+def parse(selector):
+    """选择器字符串 -> [[Step, ...], ...]（逗号分隔的每个选择器一组）"""
+    groups, steps = [], []
+    pos, n = 0, len(selector)
+    combinator = " "
+    while True:
+        start = pos
+        while pos < n and selector[pos].isspace():
+            pos += 1
+        if pos >= n or selector[pos] == ",":
+            if not steps:
+                raise SelectorError(f"Empty selector at {pos}: {selector!r}")
+            if combinator != " ":
+                raise SelectorError(f"Dangling '{combinator}' at {pos}: {selector!r}")
+            groups.append(steps)
+            if pos >= n:
+                return groups
+            steps, combinator, pos = [], " ", pos + 1
+            continue
+        if selector[pos] == ">":
+            if not steps or combinator != " ":
+                raise SelectorError(f"Unexpected '>' at {pos}: {selector!r}")
+            combinator, pos = ">", pos + 1
+            continue
+        if selector[pos] == "/":
+            if steps:
+                raise SelectorError(f"'/' is only allowed at the start: {selector!r}")
+            combinator, pos = "/", pos + 1
+            continue
+        if steps and pos == start and combinator == " ":
+            raise SelectorError(f"Missing combinator at {pos}: {selector!r}")
+
+        step = Step(combinator)
+        match = _IDENT.match(selector, pos)
+        star = bool(match) and match.group() == "*"
+        if match:
+            step.ctype = None if star else match.group()
+            pos = match.end()
+        while pos < n and selector[pos] in "[:":
+            if selector[pos] == ":":
+                match = _IDENT.match(selector, pos + 1)
+                if not match or match.group() not in PSEUDOS:
+                    raise SelectorError(f"Unknown pseudo-class at {pos}: {selector!r}")
+                step.pseudos.append(match.group())
+                pos = match.end()
+                continue
+            match = _IDENT.match(selector, pos + 1)
+            op = match and _OP.match(selector, match.end())
+            value = op and _VALUE.match(selector, op.end())
+            if not value or value.end() >= n or selector[value.end()] != "]":
+                raise SelectorError(f"Bad attribute filter at {pos}: {selector!r}")
+            attr = ATTR_ALIASES.get(match.group(), match.group())
+            quoted = value.group(1) if value.group(1) is not None else value.group(2)
+            literal = _literal(quoted, value.group(3), attr in TEXT_FIELDS)
+            if op.group(1) == "~=":
+                literal = re.compile(str(literal))
+            step.attrs.append((attr, op.group(1), literal))
+            pos = value.end() + 1
+        if step.ctype is None and not step.attrs and not step.pseudos and not star:
+            raise SelectorError(f"Expected a step at {pos}: {selector!r}")
+        steps.append(step)
+        combinator = " "
+
+
+def _test(value, op, expected):
+    if op == "=":
+        return value == expected
+    if op == "!=":
+        return value != expected
+    if value is None:
+        return False
+    if op == "~=":
+        return expected.search(str(value)) is not None
+    value, expected = str(value), str(expected)
+    if op == "^=":
+        return value.startswith(expected)
+    if op == "$=":
+        return value.endswith(expected)
+    return expected in value  # *=
+
+
+# ---------- 索引与求值 ----------
+
+class TreeQuery:
+    """对一棵 UI 树（嵌套 dict、ColumnarTree 或 NDJSON 先序记录列表）建索引并执行选择器"""
+
+    def __init__(self, tree):
+        if isinstance(tree, ColumnarTree):
+            nodes = [tree.node(i) for i in range(len(tree))]
+            parent = list(tree.parent)
+        elif isinstance(tree, list):
+            nodes = [{key: value for key, value in record.items() if key not in ("id", "parent_id")}
+                     for record in tree]
+            parent = [-1 if record.get("parent_id") is None else record["parent_id"] for record in tree]
+        else:
+            nodes, parent = [], []
+            stack = [(tree, -1)] if tree else []
+            while stack:
+                node, up = stack.pop()
+                nodes.append({key: value for key, value in node.items() if key != "children"})
+                parent.append(up)
+                me = len(nodes) - 1
+                stack.extend((child, me) for child in reversed(node.get("children") or []) if child)
+        self.nodes = nodes
+        self.parent = parent
+        self.end = list(range(1, len(nodes) + 1))
+        for i in range(len(nodes) - 1, 0, -1):
+            up = parent[i]
+            if up >= 0 and self.end[i] > self.end[up]:
+                self.end[up] = self.end[i]
+
+        self.index = {field: {} for field in INDEXED}
+        self.paths = {}
+        self._path = []
+        for i, node in enumerate(nodes):
+            for field in INDEXED:
+                self.index[field].setdefault(node.get(field), []).append(i)
+            up = parent[i]
+            path = (self._path[up] + "/" if up >= 0 else "") + str(node.get("control_type"))
+            self._path.append(path)
+            self.paths.setdefault(path, []).append(i)
+
+    def __len__(self):
+        return len(self.nodes)
+
+    def path(self, i):
+        """从根到 i 的类型路径，如 WindowControl/PaneControl/ButtonControl"""
+        return self._path[i]
+
+    def _resolve_type(self, ctype):
+        if ctype in self.index["control_type"] or ctype.endswith("Control"):
+            return ctype
+        return ctype + "Control"
+
+    def _candidates(self, step):
+        """由索引给出该步的候选（先序有序），再按其余条件过滤"""
+        lists = []
+        ctype = self._resolve_type(step.ctype) if step.ctype else None
+        if ctype:
+            lists.append(self.index["control_type"].get(ctype, []))
+        for attr, op, value in step.attrs:
+            if op == "=" and attr in INDEXED:
+                if attr == "control_type" and isinstance(value, str):
+                    value = self._resolve_type(value)
+                lists.append(self.index[attr].get(value, []))
+        if lists:
+            base = min(lists, key=len)
+        else:
+            base = range(len(self.nodes))
+        nodes = self.nodes
+        out = []
+        for i in base:
+            node = nodes[i]
+            if ctype and node.get("control_type") != ctype:
+                continue
+            if any(not _test(node.get(attr), op, value) for attr, op, value in step.attrs):
+                continue
+            if any(not PSEUDOS[pseudo](node) for pseudo in step.pseudos):
+                continue
+            out.append(i)
+        return out
+
+    def _apply(self, context, step):
+        candidates = self._candidates(step)
+        if step.combinator == "/":
+            return [i for i in candidates if self.parent[i] < 0]
+        if context is None:
+            return candidates
+        if step.combinator == ">":
+            parents = set(context)
+            return [i for i in candidates if self.parent[i] in parents]
+        # 后代：把上下文合并成互不相交的子树区间，候选落在某个区间内（不含区间起点本身）即匹配
+        starts, ends = [], []
+        for i in context:
+            if ends and i < ends[-1]:
+                continue  # 已被前一个区间包含
+            starts.append(i)
+            ends.append(self.end[i])
+        out = []
+        for i in candidates:
+            k = bisect.bisect_right(starts, i) - 1
+            if k >= 0 and starts[k] < i < ends[k]:
+                out.append(i)
+        return out
+
+    def _by_path(self, steps):
+        """/A > B > C 且前面各步只有类型时直接查类型路径索引，不逐步求值；不适用时返回 None"""
+        if steps[0].combinator != "/" or any(step.combinator == " " for step in steps[1:]):
+            return None
+        if any(not step.ctype or step.attrs or step.pseudos for step in steps[:-1]) or not steps[-1].ctype:
+            return None
+        hits = self.paths.get("/".join(self._resolve_type(step.ctype) for step in steps), [])
+        last = steps[-1]
+        return [i for i in hits if all(_test(self.nodes[i].get(attr), op, value) for attr, op, value in last.attrs)
+                and all(PSEUDOS[pseudo](self.nodes[i]) for pseudo in last.pseudos)]
+
+    def select(self, selector, limit=None):
+        """返回匹配节点的先序下标（去重、有序）"""
+        matched = set()
+        for steps in parse(selector):
+            by_path = self._by_path(steps)
+            if by_path is not None:
+                matched.update(by_path)
+                continue
+            context = None
+            for step in steps:
+                context = self._apply(context, step)
+                if not context:
+                    break
+            matched.update(context or ())
+        result = sorted(matched)
+        return result[:limit] if limit else result
+
+    def node(self, i, with_path=True):
+        """第 i 个节点（不含 children），附 id / parent_id / path"""
+        node = dict(self.nodes[i], id=i, parent_id=self.parent[i] if self.parent[i] >= 0 else None)
+        if with_path:
+            node["path"] = self._path[i]
+        return node
+
+    def query(self, selector, limit=None):
+        return [self.node(i) for i in self.select(selector, limit)]
+
+    def subtree(self, i):
+        """以 i 为根的嵌套子树（与 *_layout.json 相同结构）"""
+        built = {}
+        root = None
+        for j in range(i, self.end[i]):
+            node = dict(self.nodes[j], children=[])
+            built[j] = node
+            if j == i:
+                root = node
+            else:
+                built[self.parent[j]]["children"].append(node)
+        return root
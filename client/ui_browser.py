@@ -0,0 +1,226 @@
+"""UI 树懒加载浏览：先取顶部几层，再按需展开任意节点、批量读取属性，只为实际浏览到的部分付出跨进程调用
+
+节点句柄为 RuntimeId 路径："<窗口句柄>/<rid>/<rid>/..."，每段是一个控件的 RuntimeId（用 . 连接），
+窗口根节点的句柄就是 "<窗口句柄>"。句柄 -> 控件对象 的缓存有条数上限（LRU）与 TTL：
+- 命中时先做存活检查（重新读取 RuntimeId，与句柄末段比较；控件已销毁时读取会抛异常）
+- 未命中、已淘汰或已失效时，从最近的仍存活的祖先开始逐层按 RuntimeId 找回；找不到即句柄失效（HandleError）
+因此句柄可以长期保存，缓存只影响速度，不影响正确性。
+"""
+import threading
+import time
+from collections import OrderedDict
+
+from ui_tree import FIELDS, LiveProvider
+
+BROWSE_FIELDS = ("name", "control_type", "automation_id", "is_enabled", "is_offscreen", "rect")
+
+
+class HandleError(KeyError):
+    """句柄对应的窗口或控件已不存在（格式错误的句柄抛 ValueError）"""
+
+
+def format_handle(parent, runtime_id):
+    return f"{parent}/{'.'.join(str(part) for part in runtime_id)}"
+
+
+def parse_handle(handle):
+    """返回 (窗口句柄, [RuntimeId, ...])"""
+    try:
+        head, *segments = handle.split("/")
+        return int(head), [tuple(int(part) for part in segment.split(".")) for segment in segments]
+    except (AttributeError, ValueError):
+        raise ValueError(f"Malformed handle: {handle!r}")
+
+
+class HandleCache:
+    """句柄 -> 控件 的有界缓存，以及 top / expand / properties 三个浏览操作
+
+    - root_for(hwnd)：返回窗口根控件，服务端为 uiautomation.ControlFromHandle
+    - alive(hwnd)：窗口是否仍存在（如 win32gui.IsWindow），窗口关闭后其全部句柄直接失效
+    - provider：逐属性读取（LiveProvider），只读取请求的字段
+    """
+
+    def __init__(self, root_for, alive=None, provider=None, max_handles=4096, ttl=300.0):
+        self.root_for = root_for
+        self.alive = alive or (lambda hwnd: True)
+        self.provider = provider or LiveProvider()
+        self.max_handles = max_handles
+        self.ttl = ttl
+        self._items = OrderedDict()  # handle -> (控件, 写入时间)
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "misses": 0, "stale": 0, "rewalks": 0, "rewalk_steps": 0,
+                       "evicted_lru": 0, "evicted_ttl": 0, "lost": 0, "nodes_read": 0}
+
+    # ---------- 缓存 ----------
+
+    def _put(self, handle, node):
+        with self._lock:
+            self._items[handle] = (node, time.monotonic())
+            self._items.move_to_end(handle)
+            while len(self._items) > self.max_handles:
+                self._items.popitem(last=False)
+                self._stats["evicted_lru"] += 1
+
+    def _get(self, handle):
+        with self._lock:
+            item = self._items.get(handle)
+            if item is None:
+                return None
+            if time.monotonic() - item[1] > self.ttl:
+                del self._items[handle]
+                self._stats["evicted_ttl"] += 1
+                return None
+            self._items.move_to_end(handle)
+            return item[0]
+
+    def _drop(self, handle):
+        with self._lock:
+            self._items.pop(handle, None)
+
+    def invalidate(self, hwnd=None):
+        """清掉某个窗口（省略时为全部）的句柄"""
+        with self._lock:
+            if hwnd is None:
+                self._items.clear()
+                return
+            prefix = f"{hwnd}/"
+            for handle in [h for h in self._items if h == str(hwnd) or h.startswith(prefix)]:
+                del self._items[handle]
+
+    def _check(self, node, runtime_id):
+        """存活检查：根节点（runtime_id 为 None）只要能读属性即可"""
+        try:
+            if runtime_id is None:
+                self.provider.read(node, ("control_type",))
+                return True
+            return self.provider.runtime_id(node) == runtime_id
+        except Exception:
+            return False
+
+    # ---------- 句柄解析 ----------
+
+    def resolve(self, handle):
+        """句柄 -> 存活的控件；找不到时抛 HandleError"""
+        hwnd, path = parse_handle(handle)
+        if not self.alive(hwnd):
+            self.invalidate(hwnd)
+            self._stats["lost"] += 1
+            raise HandleError(f"Window {hwnd} no longer exists")
+        prefixes = [str(hwnd)]
+        for runtime_id in path:
+            prefixes.append(format_handle(prefixes[-1], runtime_id))
+
+        # 从句柄本身往上找最近的已缓存且存活的祖先
+        start, node = -1, None
+        for k in range(len(prefixes) - 1, -1, -1):
+            cached = self._get(prefixes[k])
+            if cached is None:
+                continue
+            if self._check(cached, path[k - 1] if k else None):
+                start, node = k, cached
+                break
+            self._drop(prefixes[k])
+            self._stats["stale"] += 1
+        if start == len(prefixes) - 1:
+            self._stats["hits"] += 1
+            return node
+        self._stats["misses"] += 1
+        if node is None:
+            try:
+                node = self.root_for(hwnd)
+            except Exception as e:
+                raise HandleError(f"Window {hwnd} is not accessible: {e}")
+            start = 0
+            self._put(prefixes[0], node)
+
+        # 逐层按 RuntimeId 找回，沿途的兄弟节点顺便入缓存
+        self._stats["rewalks"] += 1
+        for k in range(start + 1, len(prefixes)):
+            wanted = path[k - 1]
+            found = None
+            try:
+                children = self.provider.children(node)
+            except Exception as e:
+                raise HandleError(f"Cannot list children of {prefixes[k - 1]}: {e}")
+            for child in children:
+                try:
+                    runtime_id = self.provider.runtime_id(child)
+                except Exception:
+                    continue
+                self._stats["rewalk_steps"] += 1
+                self._put(format_handle(prefixes[k - 1], runtime_id), child)
+                if runtime_id == wanted:
+                    found = child
+            if found is None:
+                self._stats["lost"] += 1
+                raise HandleError(f"Element {prefixes[k]} no longer exists")
+            node = found
+        return node
+
+    # ---------- 浏览 ----------
+
+    def _read(self, node, fields):
+        self._stats["nodes_read"] += 1
+        values = self.provider.read(node, fields)
+        if "clickable" in values and values["clickable"] is not None:
+            values["clickable"] = list(values["clickable"])
+        return values
+
+    def _describe(self, handle, node, depth, fields, max_children):
+        """节点及其 depth 层子孙；未展开的节点 children 为 None（需要时对其句柄调用 expand）"""
+        out = {"handle": handle, **self._read(node, fields), "children": None}
+        pending = [(out, node, depth)]
+        while pending:
+            entry, node, remaining = pending.pop()
+            if remaining <= 0:
+                continue
+            try:
+                children = self.provider.children(node)
+            except Exception as e:
+                entry["error"] = f"Cannot list children: {e}"
+                continue
+            entry["children"] = []
+            if max_children is not None and len(children) > max_children:
+                entry["more_children"] = len(children) - max_children
+                children = children[:max_children]
+            for child in children:
+                try:
+                    child_handle = format_handle(entry["handle"], self.provider.runtime_id(child))
+                    child_entry = {"handle": child_handle, **self._read(child, fields), "children": None}
+                except Exception as e:
+                    print(f"Error reading control {self.provider.describe(child)}: {e}")
+                    continue
+                self._put(child_handle, child)
+                entry["children"].append(child_entry)
+                pending.append((child_entry, child, remaining - 1))
+        return out
+
+    def top(self, hwnd, depth=2, fields=BROWSE_FIELDS, max_children=None):
+        """窗口根节点及其顶部 depth 层"""
+        root = self.root_for(hwnd)
+        self._put(str(hwnd), root)
+        return self._describe(str(hwnd), root, depth, fields, max_children)
+
+    def expand(self, handle, depth=1, fields=BROWSE_FIELDS, max_children=None):
+        """展开句柄对应的节点 depth 层"""
+        return self._describe(handle, self.resolve(handle), depth, fields, max_children)
+
+    def properties(self, handles, fields=FIELDS):
+        """批量读取属性：{句柄: 字段 dict}，失效的句柄为 {"error": ...}"""
+        out = {}
+        for handle in handles:
+            try:
+                out[handle] = self._read(self.resolve(handle), fields)
+            except HandleError as e:
+                out[handle] = {"error": str(e.args[0]), "stale": True}
+            except ValueError as e:
+                out[handle] = {"error": str(e)}
+            except Exception as e:
+                self._drop(handle)
+                out[handle] = {"error": f"Error reading properties: {e}"}
+        return out
+
+    def stats(self):
+        with self._lock:
+            size = len(self._items)
+        return {"handles": size, "max_handles": self.max_handles, "ttl": self.ttl, **self._stats}
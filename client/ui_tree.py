@@ -0,0 +1,677 @@
+"""UI 树提取：控件访问接口（ControlProvider）+ 与平台无关的建树逻辑
+
+- LiveProvider：逐属性跨进程读取（原 extract_ui 的做法），作为回退
+- CachedProvider：一次 UIA CacheRequest 预取整棵子树的全部属性
+- FakeProvider：基于 dict / layout.json 的假控件，便于在 Linux 上测试与压测
+- extract_budgeted：限时的广度优先提取，单次调用超时即放弃，返回部分树与按控件类型的耗时统计
+
+uiautomation 只在 Live/Cached 两个 provider 中按需导入，本模块在非 Windows 环境也可直接导入。
+"""
+import contextlib
+import json
+import queue
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future, TimeoutError as FutureTimeout
+
+from tree_format import TreeAssembler
+
+EXTRACT_MODES = ("cached", "live")
+
+FIELDS = ("name", "control_type", "automation_id", "is_enabled", "is_offscreen", "rect", "clickable", "focusable")
+# 用于裁剪判断的字段先读；节点确定保留后再读其余字段
+HEAD_FIELDS = ("control_type", "is_offscreen", "rect")
+BODY_FIELDS = ("name", "automation_id", "is_enabled", "focusable")
+
+
+def _rect_dict(rect):
+    return {
+        "left": rect.left,
+        "top": rect.top,
+        "right": rect.right,
+        "bottom": rect.bottom
+    }
+
+
+# ---------- 裁剪选项 ----------
+
+class PruneOptions:
+    """服务端裁剪选项；全部取默认值时输出与不裁剪完全一致
+
+    - max_depth：只展开到该深度（根为 0）
+    - include_types：只输出这些类型的节点（根节点总是保留）；其余节点仍会向下遍历，子孙挂到最近的保留祖先上
+    - exclude_types：命中的节点连同整棵子树都不读取、不输出
+    - drop_offscreen / drop_empty：丢弃屏幕外 / 面积为 0 的节点及其整棵子树
+    - clickable_types：只对这些类型调用 GetClickablePoint，其余节点的 clickable 为 None
+    """
+
+    def __init__(self, max_depth=None, include_types=None, exclude_types=None,
+                 drop_offscreen=False, drop_empty=False, clickable_types=None):
+        self.max_depth = max_depth
+        self.include_types = set(include_types) if include_types is not None else None
+        self.exclude_types = set(exclude_types or ())
+        self.drop_offscreen = drop_offscreen
+        self.drop_empty = drop_empty
+        self.clickable_types = set(clickable_types) if clickable_types is not None else None
+
+    def culls(self, head) -> bool:
+        """该节点及其子树是否整体丢弃"""
+        if head["control_type"] in self.exclude_types:
+            return True
+        if self.drop_offscreen and head["is_offscreen"]:
+            return True
+        if self.drop_empty:
+            rect = head["rect"]
+            if rect["right"] - rect["left"] <= 0 or rect["bottom"] - rect["top"] <= 0:
+                return True
+        return False
+
+    def keeps(self, control_type) -> bool:
+        return self.include_types is None or control_type in self.include_types
+
+    def expands(self, depth) -> bool:
+        return self.max_depth is None or depth < self.max_depth
+
+    def wants_clickable(self, control_type) -> bool:
+        return self.clickable_types is None or control_type in self.clickable_types
+
+
+NO_PRUNE = PruneOptions()
+
+
+# ---------- 控件访问接口 ----------
+
+class ControlProvider:
+    """build_tree 只通过该接口读取控件属性与子节点"""
+
+    def prepare(self, root):
+        """建树前的预处理（缓存模式下在此一次性预取），返回实际遍历的根节点"""
+        return root
+
+    def read(self, node, fields=FIELDS) -> dict:
+        """只读取 fields 中列出的字段（取值范围见 FIELDS）"""
+        raise NotImplementedError
+
+    def children(self, node) -> list:
+        raise NotImplementedError
+
+    def runtime_id(self, node) -> tuple:
+        """控件的 RuntimeId（同一控件存活期间不变），用于懒加载浏览的节点句柄"""
+        raise NotImplementedError
+
+    def describe(self, node) -> str:
+        """出错时用于日志的简短描述，自身不应抛异常"""
+        return repr(node)
+
+
+class LiveProvider(ControlProvider):
+    """逐属性读取 uiautomation.Control，每个属性一次跨进程调用"""
+
+    READERS = {
+        "name": lambda c: c.Name or "",
+        "control_type": lambda c: c.ControlTypeName or "",
+        "automation_id": lambda c: c.AutomationId,
+        "is_enabled": lambda c: c.IsEnabled,
+        "is_offscreen": lambda c: c.IsOffscreen,
+        "rect": lambda c: _rect_dict(c.BoundingRectangle),
+        "clickable": lambda c: c.GetClickablePoint(),
+        "focusable": lambda c: c.IsKeyboardFocusable,
+    }
+
+    def read(self, ctrl, fields=FIELDS) -> dict:
+        return {field: self.READERS[field](ctrl) for field in fields}
+
+    def children(self, ctrl) -> list:
+        return ctrl.GetChildren()
+
+    def runtime_id(self, ctrl) -> tuple:
+        return tuple(ctrl.GetRuntimeId())
+
+    def describe(self, ctrl) -> str:
+        try:
+            return ctrl.Name
+        except Exception:
+            return "<unknown>"
+
+
+class CachedProvider(ControlProvider):
+    """用一次 BuildUpdatedCache(TreeScope_Subtree) 预取整棵子树，之后只读本地缓存
+
+    - TreeFilter 固定为 RawViewCondition：以 IsOffscreen == False 作过滤条件时只会跳过屏幕外节点本身，
+      其屏幕上的子孙被挂到上层，与逐属性遍历（丢弃整棵子树）结果不同；drop_offscreen 统一由 iter_nodes 按子树裁剪
+    - 设置了 clickable_types 时不缓存 ClickablePoint，只对命中类型单独调用 GetClickablePoint
+    - max_depth 为 0 / 1 时 TreeScope 取 Element / Element|Children；CacheRequest 没有更细的深度限制，
+      也无法跳过某类型的整棵子树（TreeFilter 只跳过节点本身，子孙仍会被取回），
+      因此 max_depth >= 2 或设置了 exclude_types 时不使用缓存模式（见 cache_covers）
+    """
+
+    def __init__(self, prune=NO_PRUNE):
+        import uiautomation as uiauto
+        self._uiauto = uiauto
+        self._ia = uiauto._AutomationClient.instance().IUIAutomation
+        self._pid = uiauto.PropertyId
+        self._cache_clickable = prune.clickable_types is None
+        self._request = self._build_request(prune)
+        self.READERS = {
+            "name": lambda e: e.CachedName or "",
+            "control_type": lambda e: self._uiauto.ControlTypeNames.get(e.CachedControlType, ""),
+            "automation_id": lambda e: e.CachedAutomationId,
+            "is_enabled": lambda e: bool(e.CachedIsEnabled),
+            "is_offscreen": lambda e: bool(e.CachedIsOffscreen),
+            "rect": lambda e: _rect_dict(e.CachedBoundingRectangle),
+            "clickable": self._clickable_point,
+            "focusable": lambda e: bool(e.CachedIsKeyboardFocusable),
+        }
+
+    def _build_request(self, prune):
+        pid = self._pid
+        request = self._ia.CreateCacheRequest()
+        props = [
+            pid.NamePropertyId,
+            pid.ControlTypePropertyId,
+            pid.AutomationIdPropertyId,
+            pid.IsEnabledPropertyId,
+            pid.IsOffscreenPropertyId,
+            pid.BoundingRectanglePropertyId,
+            pid.IsKeyboardFocusablePropertyId,
+        ]
+        if self._cache_clickable:
+            props.append(pid.ClickablePointPropertyId)
+        for prop in props:
+            request.AddProperty(prop)
+        # 与 Control.GetChildren() 使用的 RawViewWalker 保持一致
+        request.TreeFilter = self._ia.RawViewCondition
+        scope = self._uiauto.TreeScope
+        if prune.max_depth == 0:
+            request.TreeScope = scope.Element
+        elif prune.max_depth == 1:
+            request.TreeScope = scope.Element | scope.Children
+        else:
+            request.TreeScope = scope.Subtree
+        return request
+
+    def prepare(self, root):
+        element = root.Element if hasattr(root, "Element") else root
+        return element.BuildUpdatedCache(self._request)
+
+    def read(self, element, fields=FIELDS) -> dict:
+        return {field: self.READERS[field](element) for field in fields}
+
+    def _clickable_point(self, element):
+        """与 Control.GetClickablePoint() 返回格式一致：(x, y, 是否可得)"""
+        try:
+            if not self._cache_clickable:
+                point, got = element.GetClickablePoint()
+                return (point.x, point.y, bool(got))
+            value = element.GetCachedPropertyValue(self._pid.ClickablePointPropertyId)
+            if value is not None and len(value) >= 2:
+                return (int(value[0]), int(value[1]), True)
+        except Exception:
+            pass
+        return (0, 0, False)
+
+    def children(self, element) -> list:
+        array = element.GetCachedChildren()
+        if not array:
+            return []
+        return [array.GetElement(i) for i in range(array.Length)]
+
+    def runtime_id(self, element) -> tuple:
+        return tuple(element.GetRuntimeId())
+
+    def describe(self, element) -> str:
+        try:
+            return element.CachedName
+        except Exception:
+            return "<unknown>"
+
+
+class FakeProvider(ControlProvider):
+    """以嵌套 dict（与 *_layout.json 同结构）模拟控件树，可选模拟每次跨进程调用的延迟
+
+    cached=False 时按 LiveProvider 的调用次数计费（每个字段 1 次 + 取子节点 1 次），
+    cached=True 时只在 prepare 计一次调用，对应 CachedProvider。
+    """
+
+    DEFAULTS = {
+        "name": "",
+        "control_type": "",
+        "automation_id": "",
+        "is_enabled": True,
+        "is_offscreen": False,
+        "clickable": None,
+        "focusable": False,
+    }
+
+    def __init__(self, call_delay=0.0, cached=False):
+        self.call_delay = call_delay
+        self.cached = cached
+        self.calls = 0
+
+    def _call(self, count=1):
+        self.calls += count
+        if self.call_delay:
+            time.sleep(self.call_delay * count)
+
+    def prepare(self, root):
+        if self.cached:
+            self._call()
+        return root
+
+    def read(self, node, fields=FIELDS) -> dict:
+        if not self.cached:
+            self._call(len(fields))
+        values = {}
+        for field in fields:
+            if field == "rect":
+                values[field] = dict(node.get("rect") or {"left": 0, "top": 0, "right": 0, "bottom": 0})
+            else:
+                values[field] = node.get(field, self.DEFAULTS[field])
+                if field in ("name", "control_type"):
+                    values[field] = values[field] or ""
+        return values
+
+    def children(self, node) -> list:
+        if not self.cached:
+            self._call()
+        return [child for child in node.get("children", []) if child]
+
+    def runtime_id(self, node) -> tuple:
+        if not self.cached:
+            self._call()
+        return tuple(node["runtime_id"]) if "runtime_id" in node else (id(node),)
+
+    def describe(self, node) -> str:
+        return node.get("name") or "<unnamed>"
+
+
+# ---------- 建树 ----------
+
+def iter_nodes(provider, root, prune=NO_PRUNE, depth=0):
+    """用显式栈做先序遍历，逐个产出扁平节点记录 {id, parent_id, depth, 字段...}
+
+    - 父节点记录总是先于子节点产出，id 从 0 连续编号，根节点 parent_id 为 None
+    - 被 include_types 跳过的节点不产出记录，其子孙的 parent_id 指向最近的保留祖先
+    - 读取属性失败时跳过该节点及其子树；取子节点失败时该节点按叶子处理
+    """
+    stack = [(root, depth, None, True)]
+    next_id = 0
+    while stack:
+        node, depth, parent_id, is_root = stack.pop()
+        try:
+            head = provider.read(node, HEAD_FIELDS)
+            if not is_root and prune.culls(head):
+                continue
+            control_type = head["control_type"]
+            keep = is_root or prune.keeps(control_type)
+            record = None
+            if keep:
+                body = provider.read(node, BODY_FIELDS)
+                clickable = provider.read(node, ("clickable",))["clickable"] if prune.wants_clickable(control_type) else None
+                record = {
+                    "id": next_id,
+                    "parent_id": parent_id,
+                    "depth": depth,
+                    "name": body["name"],
+                    "control_type": control_type,
+                    "automation_id": body["automation_id"],
+                    "is_enabled": body["is_enabled"],
+                    "is_offscreen": head["is_offscreen"],
+                    "rect": head["rect"],
+                    "clickable": clickable,
+                    "focusable": body["focusable"],
+                }
+                next_id += 1
+        except Exception as e:
+            print(f"Error extracting UI for control {provider.describe(node)}: {e}")
+            if is_root:
+                return
+            continue
+
+        if record:
+            yield record
+        if not prune.expands(depth):
+            continue
+        try:
+            children = provider.children(node)
+        except Exception as e:
+            print(f"Error listing children for control {provider.describe(node)}: {e}")
+            continue
+        child_parent = record["id"] if record else parent_id
+        for child in reversed(children):
+            stack.append((child, depth + 1, child_parent, False))
+
+
+def build_tree(provider, node, app_name='App', page_tag='Main', depth=0, prune=NO_PRUNE):
+    """按原 extract_ui 的输出格式构建嵌套 dict；根节点失败时返回 None"""
+    assembler = TreeAssembler(app_name, page_tag)
+    for record in iter_nodes(provider, node, prune, depth):
+        assembler.add(record)
+    return assembler.root
+
+
+def cache_covers(prune):
+    """缓存模式能否不取回被裁剪的部分：CacheRequest 只能限制到子节点一层，不能按类型跳过子树"""
+    return not prune.exclude_types and (prune.max_depth is None or prune.max_depth <= 1)
+
+
+def make_provider(mode, prune=NO_PRUNE):
+    if mode == "cached":
+        return CachedProvider(prune)
+    if mode == "live":
+        return LiveProvider()
+    raise ValueError(f"Unknown extract mode: {mode} (expected one of {EXTRACT_MODES})")
+
+
+def open_provider(ctrl, mode='cached', prune=NO_PRUNE):
+    """返回 (provider, 遍历根)；缓存模式预取失败时回退到逐属性遍历"""
+    if mode not in EXTRACT_MODES:
+        raise ValueError(f"Unknown extract mode: {mode} (expected one of {EXTRACT_MODES})")
+    if mode == "cached" and not cache_covers(prune):
+        # 预取整棵子树会把 max_depth 以下 / exclude_types 的子树也跨进程取回，改为逐属性遍历
+        print("max_depth >= 2 or exclude_types set, using live walk so pruned subtrees are never queried")
+    elif mode == "cached":
+        try:
+            provider = make_provider("cached", prune)
+            return provider, provider.prepare(ctrl)
+        except Exception as e:
+            print(f"Cached extraction failed, falling back to live walk: {e}")
+    return LiveProvider(), ctrl
+
+
+def extract_records(ctrl, mode='cached', prune=NO_PRUNE):
+    """提取 ctrl 为根的扁平节点记录列表；缓存模式失败或无结果时回退到逐属性遍历"""
+    provider, root = open_provider(ctrl, mode, prune)
+    records = list(iter_nodes(provider, root, prune))
+    if records or isinstance(provider, LiveProvider):
+        return records
+    print("Cached extraction returned nothing, falling back to live walk")
+    return list(iter_nodes(LiveProvider(), ctrl, prune))
+
+
+# ---------- 限时提取 ----------
+
+class CallTimeout(Exception):
+    pass
+
+
+class TimedCaller:
+    """在辅助线程上执行可能卡住的跨进程调用，超过 timeout 即放弃
+
+    COM 调用无法中断：被放弃的调用仍在原线程上跑完，之后该线程自行退出，后续调用换一个新线程。
+    initializer 为辅助线程进入的上下文管理器工厂（如 uiautomation.UIAutomationInitializerInThread）。
+    """
+
+    def __init__(self, initializer=None):
+        self.initializer = initializer
+        self.abandoned = 0
+        self._calls = None
+
+    def _run(self, calls):
+        with self.initializer() if self.initializer else contextlib.nullcontext():
+            while True:
+                item = calls.get()
+                if item is None:
+                    return
+                future, fn, args = item
+                if not future.set_running_or_notify_cancel():
+                    continue
+                try:
+                    future.set_result(fn(*args))
+                except BaseException as e:
+                    future.set_exception(e)
+
+    def call(self, timeout, fn, *args):
+        """timeout 为 None 时直接在当前线程调用"""
+        if timeout is None:
+            return fn(*args)
+        if self._calls is None:
+            self._calls = queue.Queue()
+            threading.Thread(target=self._run, args=(self._calls,), name="uia-call", daemon=True).start()
+        future = Future()
+        self._calls.put((future, fn, args))
+        try:
+            return future.result(timeout=max(timeout, 0.0))
+        except FutureTimeout:
+            future.cancel()
+            # 卡住的线程跑完这次调用后取到 None 退出
+            self._calls.put(None)
+            self._calls = None
+            self.abandoned += 1
+            raise CallTimeout(f"{getattr(fn, '__name__', fn)} exceeded {timeout:.3f}s")
+
+    def close(self):
+        if self._calls is not None:
+            self._calls.put(None)
+            self._calls = None
+
+
+def preorder(records):
+    """把父先于子的扁平记录（如广度优先的结果）重排为先序并重新编号，其余字段不变"""
+    children = {}
+    roots = []
+    for record in records:
+        if record["parent_id"] is None:
+            roots.append(record)
+        else:
+            children.setdefault(record["parent_id"], []).append(record)
+    ordered, new_ids = [], {}
+    stack = list(reversed(roots))
+    while stack:
+        record = stack.pop()
+        new_ids[record["id"]] = len(ordered)
+        parent_id = record["parent_id"]
+        ordered.append(dict(record, id=len(ordered), parent_id=None if parent_id is None else new_ids[parent_id]))
+        stack.extend(reversed(children.get(record["id"], ())))
+    return ordered
+
+
+def extract_budgeted(ctrl, mode='cached', prune=NO_PRUNE, budget=None, call_timeout=None, initializer=None):
+    """限时提取：广度优先，越靠近根的层越先取到；返回 (先序记录列表, 报告)
+
+    - budget：总时间预算（秒），用完即停止；缓存模式的一次性预取最多占用一半预算，超时回退逐属性遍历
+    - call_timeout：单次调用（读属性、GetClickablePoint、取子节点）的超时，超时的调用被放弃（见 TimedCaller）
+    - 记录上的标记：truncated 表示因预算用完有子节点或字段未取（未取的字段为 None）；timed_out 表示该节点的
+      某次调用超时，缺失的字段为 None，或有子节点因此缺失。预算用完后不再发起新调用，因此不会为此遗弃线程
+    - 报告：complete、elapsed、nodes、truncated / timed_out 计数、unvisited（预算用完时未访问的节点数）、
+      abandoned_threads，以及 timings：按控件类型汇总的节点数、调用耗时与超时次数（按总耗时降序）
+    """
+    t0 = time.perf_counter()
+    deadline = t0 + budget if budget is not None else None
+    caller = TimedCaller(initializer)
+    timings = {}
+
+    def remaining():
+        return None if deadline is None else deadline - time.perf_counter()
+
+    def expired():
+        return deadline is not None and time.perf_counter() >= deadline
+
+    def limit():
+        left = remaining()
+        if left is None:
+            return call_timeout
+        return left if call_timeout is None else min(call_timeout, left)
+
+    provider, root, used_mode = LiveProvider(), ctrl, "live"
+    if mode == "cached" and cache_covers(prune):
+        try:
+            cached = make_provider("cached", prune)
+            left = remaining()
+            root = caller.call(None if left is None else left / 2, cached.prepare, ctrl)
+            provider, used_mode = cached, "cached"
+        except CallTimeout:
+            print(f"Cached prefetch exceeded half of the {budget}s budget, falling back to live walk")
+        except Exception as e:
+            print(f"Cached extraction failed, falling back to live walk: {e}")
+    elif mode not in EXTRACT_MODES:
+        raise ValueError(f"Unknown extract mode: {mode} (expected one of {EXTRACT_MODES})")
+
+    records = []
+    counts = {"truncated": 0, "timed_out": 0}
+
+    def mark(record_id, key):
+        if record_id is not None and not records[record_id].get(key):
+            records[record_id][key] = True
+            counts[key] += 1
+
+    pending = deque([(root, 0, None, True)])
+    try:
+        while pending:
+            if expired():
+                break
+            node, depth, parent_id, is_root = pending.popleft()
+            spent, timeouts, control_type = 0.0, 0, "<unknown>"
+            record = None
+            try:
+                start = time.perf_counter()
+                try:
+                    head = caller.call(limit(), provider.read, node, HEAD_FIELDS)
+                finally:
+                    spent += time.perf_counter() - start
+                control_type = head["control_type"]
+                if not is_root and prune.culls(head):
+                    continue
+                if is_root or prune.keeps(control_type):
+                    record = {"id": len(records), "parent_id": parent_id, "depth": depth,
+                              "control_type": control_type, "is_offscreen": head["is_offscreen"], "rect": head["rect"]}
+                    records.append(record)
+                    record["clickable"] = None
+                    for fields in (BODY_FIELDS, ("clickable",) if prune.wants_clickable(control_type) else None):
+                        if fields is None:
+                            continue
+                        if expired():
+                            record.update(dict.fromkeys(fields))
+                            mark(record["id"], "truncated")
+                            continue
+                        start = time.perf_counter()
+                        try:
+                            record.update(caller.call(limit(), provider.read, node, fields))
+                        except CallTimeout:
+                            timeouts += 1
+                            record.update(dict.fromkeys(fields))
+                            mark(record["id"], "timed_out")
+                        finally:
+                            spent += time.perf_counter() - start
+            except CallTimeout:
+                # 读不到类型，节点连同子树缺失，记在最近的保留祖先上
+                timeouts += 1
+                if is_root:
+                    return [], _budget_report(t0, records, counts, pending, caller, timings, used_mode)
+                mark(parent_id, "timed_out")
+                continue
+            except Exception as e:
+                print(f"Error extracting UI for control {provider.describe(node)}: {e}")
+                if is_root:
+                    return [], _budget_report(t0, records, counts, pending, caller, timings, used_mode)
+                continue
+            finally:
+                stat = timings.setdefault(control_type, {"nodes": 0, "total_ms": 0.0, "max_ms": 0.0, "timeouts": 0})
+                stat["nodes"] += 1
+                stat["total_ms"] += spent * 1000
+                stat["max_ms"] = max(stat["max_ms"], spent * 1000)
+                stat["timeouts"] += timeouts
+
+            child_parent = record["id"] if record else parent_id
+            if not prune.expands(depth):
+                continue
+            if expired():
+                mark(child_parent, "truncated")
+                continue
+            start = time.perf_counter()
+            try:
+                children = caller.call(limit(), provider.children, node)
+            except CallTimeout:
+                timings[control_type]["timeouts"] += 1
+                mark(child_parent, "timed_out")
+                continue
+            except Exception as e:
+                print(f"Error listing children for control {provider.describe(node)}: {e}")
+                continue
+            finally:
+                elapsed_ms = (time.perf_counter() - start) * 1000
+                timings[control_type]["total_ms"] += elapsed_ms
+            pending.extend((child, depth + 1, child_parent, False) for child in children)
+
+        # 预算用完：队列中尚未访问的节点记在其最近的保留祖先上
+        for _, _, parent_id, _ in pending:
+            mark(parent_id, "truncated")
+        return preorder(records), _budget_report(t0, records, counts, pending, caller, timings, used_mode)
+    finally:
+        caller.close()
+
+
+def _budget_report(t0, records, counts, pending, caller, timings, mode):
+    complete = not pending and not counts["truncated"] and not counts["timed_out"] and bool(records)
+    ordered = sorted(timings.items(), key=lambda item: item[1]["total_ms"], reverse=True)
+    return {
+        "complete": complete,
+        "mode": mode,
+        "elapsed": round(time.perf_counter() - t0, 3),
+        "nodes": len(records),
+        "truncated": counts["truncated"],
+        "timed_out": counts["timed_out"],
+        "unvisited": len(pending),
+        "abandoned_threads": caller.abandoned,
+        "timings": {control_type: {"nodes": stat["nodes"], "total_ms": round(stat["total_ms"], 3),
+                                   "max_ms": round(stat["max_ms"], 3), "timeouts": stat["timeouts"]}
+                    for control_type, stat in ordered},
+    }
+
+
+def extract_tree(ctrl, app_name='App', mode='cached', prune=NO_PRUNE):
+    """提取 ctrl 为根的 UI 树（嵌套 dict）；根节点失败时返回 None"""
+    assembler = TreeAssembler(app_name)
+    for record in extract_records(ctrl, mode, prune):
+        assembler.add(record)
+    return assembler.root
+
+
+# ---------- 本地压测（假控件） ----------
+
+def _synthetic_tree(fanout, depth, _level=0, _index=0):
+    node = {
+        "name": f"node_{_level}_{_index}",
+        "control_type": "PaneControl" if _level < depth else "ButtonControl",
+        "automation_id": f"id_{_level}_{_index}",
+        "rect": {"left": _index, "top": _level, "right": _index + 10, "bottom": _level + 10},
+        "clickable": [_index + 5, _level + 5, True],
+        "children": [],
+    }
+    if _level < depth:
+        node["children"] = [_synthetic_tree(fanout, depth, _level + 1, i) for i in range(fanout)]
+    return node
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Benchmark tree building against a fake control provider")
+    parser.add_argument("--layout", help="Replay an existing *_layout.json instead of a synthetic tree")
+    parser.add_argument("--fanout", type=int, default=6)
+    parser.add_argument("--depth", type=int, default=5)
+    parser.add_argument("--call-delay", type=float, default=0.0, help="Simulated seconds per cross-process call")
+    parser.add_argument("--max-depth", type=int, default=None)
+    parser.add_argument("--include-types", nargs="*", default=None)
+    parser.add_argument("--clickable-types", nargs="*", default=None)
+    parser.add_argument("--drop-offscreen", action="store_true")
+    parser.add_argument("--drop-empty", action="store_true")
+    args = parser.parse_args()
+    bench_prune = PruneOptions(max_depth=args.max_depth, include_types=args.include_types,
+                               drop_offscreen=args.drop_offscreen, drop_empty=args.drop_empty,
+                               clickable_types=args.clickable_types)
+
+    if args.layout:
+        with open(args.layout, "r", encoding="utf-8") as f:
+            fake_root = json.load(f)
+    else:
+        fake_root = _synthetic_tree(args.fanout, args.depth)
+
+    for mode, provider in (("live", FakeProvider(args.call_delay)),
+                           ("cached", FakeProvider(args.call_delay, cached=True))):
+        t0 = time.perf_counter()
+        tree = build_tree(provider, provider.prepare(fake_root), "bench", prune=bench_prune)
+        elapsed = time.perf_counter() - t0
+        size = len(json.dumps(tree, ensure_ascii=False))
+        print(f"{mode:>6}: {elapsed * 1000:8.1f} ms, {provider.calls} calls, {size} bytes")
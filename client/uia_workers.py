@@ -0,0 +1,145 @@
+"""UIA 工作线程池：所有 COM/UIA 调用都在固定的、已初始化 COM 的线程上执行
+
+- 请求进入一个共享队列，空闲的工作线程依次取出执行；异步接口 await 结果，不占用 FastAPI 的线程池
+- 按窗口加锁：同一窗口的取树/截图串行，不同窗口可在多个工作线程上并行读取
+- 统计：队列深度、排队等待时间、执行时间、窗口锁等待时间
+
+一台 VM 因此可以同时服务多个控制端。
+"""
+import asyncio
+import contextlib
+import functools
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+
+class UIAWorkerPool:
+    """initializer 为每个工作线程进入的上下文管理器工厂（如 uiautomation.UIAutomationInitializerInThread）"""
+
+    def __init__(self, workers=4, initializer=None, max_queue=0):
+        self.size = workers
+        self.initializer = initializer
+        self._queue = queue.Queue(max_queue)
+        self._threads = []
+        self._start_lock = threading.Lock()
+        self._locks = {}  # key -> [RLock, 使用者计数]
+        self._locks_guard = threading.Lock()
+        self._busy = 0
+        self._stats_lock = threading.Lock()
+        self._stats = {"submitted": 0, "completed": 0, "failed": 0,
+                       "wait_ms_total": 0.0, "wait_ms_max": 0.0,
+                       "run_ms_total": 0.0, "run_ms_max": 0.0,
+                       "lock_waits": 0, "lock_wait_ms_total": 0.0, "lock_wait_ms_max": 0.0}
+
+    # ---------- 线程 ----------
+
+    def start(self):
+        with self._start_lock:
+            while len(self._threads) < self.size:
+                thread = threading.Thread(target=self._worker, name=f"uia-worker-{len(self._threads)}", daemon=True)
+                thread.start()
+                self._threads.append(thread)
+
+    def shutdown(self):
+        for _ in self._threads:
+            self._queue.put(None)
+        self._threads = []
+
+    def _worker(self):
+        context = self.initializer() if self.initializer else contextlib.nullcontext()
+        with context:
+            while True:
+                item = self._queue.get()
+                if item is None:
+                    return
+                future, fn, args, kwargs, queued_at = item
+                if not future.set_running_or_notify_cancel():
+                    continue
+                started = time.perf_counter()
+                with self._stats_lock:
+                    self._busy += 1
+                    self._record("wait_ms", (started - queued_at) * 1000)
+                try:
+                    result = fn(*args, **kwargs)
+                except BaseException as e:
+                    future.set_exception(e)
+                    failed = True
+                else:
+                    future.set_result(result)
+                    failed = False
+                with self._stats_lock:
+                    self._busy -= 1
+                    self._stats["failed" if failed else "completed"] += 1
+                    self._record("run_ms", (time.perf_counter() - started) * 1000)
+
+    def _record(self, name, value):
+        self._stats[f"{name}_total"] += value
+        self._stats[f"{name}_max"] = max(self._stats[f"{name}_max"], value)
+
+    # ---------- 提交 ----------
+
+    def submit(self, fn, *args, **kwargs):
+        """放入队列，返回 concurrent.futures.Future"""
+        if len(self._threads) < self.size:
+            self.start()
+        future = Future()
+        with self._stats_lock:
+            self._stats["submitted"] += 1
+        self._queue.put((future, fn, args, kwargs, time.perf_counter()))
+        return future
+
+    async def run(self, fn, *args, **kwargs):
+        return await asyncio.wrap_future(self.submit(fn, *args, **kwargs))
+
+    def endpoint(self, handler):
+        """把同步接口函数包装为在工作线程上执行的异步接口（保留签名，FastAPI 照常解析参数）"""
+        @functools.wraps(handler)
+        async def wrapper(*args, **kwargs):
+            return await self.run(handler, *args, **kwargs)
+        return wrapper
+
+    # ---------- 窗口锁 ----------
+
+    @contextlib.contextmanager
+    def window_lock(self, key):
+        """同一 key（窗口句柄）的操作串行；无人使用的锁随即释放"""
+        with self._locks_guard:
+            entry = self._locks.setdefault(key, [threading.RLock(), 0])
+            entry[1] += 1
+        t0 = time.perf_counter()
+        entry[0].acquire()
+        waited = (time.perf_counter() - t0) * 1000
+        with self._stats_lock:
+            self._stats["lock_waits"] += 1
+            self._record("lock_wait_ms", waited)
+        try:
+            yield
+        finally:
+            entry[0].release()
+            with self._locks_guard:
+                entry[1] -= 1
+                if entry[1] == 0:
+                    self._locks.pop(key, None)
+
+    def stats(self):
+        with self._stats_lock:
+            stats = dict(self._stats)
+            busy = self._busy
+        done = stats["completed"] + stats["failed"]
+        return {
+            "workers": self.size,
+            "busy": busy,
+            "queue_depth": self._queue.qsize(),
+            "submitted": stats["submitted"],
+            "completed": stats["completed"],
+            "failed": stats["failed"],
+            "wait_ms_avg": round(stats["wait_ms_total"] / done, 3) if done else 0.0,
+            "wait_ms_max": round(stats["wait_ms_max"], 3),
+            "run_ms_avg": round(stats["run_ms_total"] / done, 3) if done else 0.0,
+            "run_ms_max": round(stats["run_ms_max"], 3),
+            "lock_wait_ms_avg": round(stats["lock_wait_ms_total"] / stats["lock_waits"], 3) if stats["lock_waits"] else 0.0,
+            "lock_wait_ms_max": round(stats["lock_wait_ms_max"], 3),
+            "locked_windows": len(self._locks),
+        }
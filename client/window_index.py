@@ -0,0 +1,254 @@
+"""顶层窗口索引：替代 find_window_by_pids 中每次调用都重建的关键字表与两遍 UIA 遍历
+
+- 关键字规则：启动时从 window_keywords.json 读取一次，每个应用编译成一个多关键字正则
+- 枚举：一次 EnumWindows（Win32，无跨进程 UIA 调用）得到所有可见顶层窗口，建立 pid -> 窗口 索引
+- 缓存：索引在短 TTL 内复用；窗口创建/销毁/显示/隐藏事件（SetWinEventHook）到来时立即失效
+- 统计：记录每次查找的耗时、缓存命中与重建次数
+
+Win32 相关调用只在 enum_top_level_windows / foreground_window / watch_window_events 中按需导入，
+WindowIndex 本身可注入假的枚举函数，在非 Windows 环境测试。
+"""
+import json
+import os
+import re
+import threading
+import time
+
+KEYWORDS_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "window_keywords.json")
+
+
+# ---------- 关键字规则 ----------
+
+def _compile_keywords(keywords):
+    # 长的关键字排在前面，多个关键字合成一个正则，一次扫描标题
+    ordered = sorted({keyword.lower() for keyword in keywords if keyword}, key=len, reverse=True)
+    return re.compile("|".join(re.escape(keyword) for keyword in ordered))
+
+
+class KeywordRules:
+    """应用名 -> 窗口标题关键字；未登记的应用以应用名本身作为关键字"""
+
+    def __init__(self, rules):
+        self.rules = {app.lower(): list(keywords) for app, keywords in rules.items()}
+        self._patterns = {app: _compile_keywords(keywords) for app, keywords in self.rules.items()}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def load(cls, path=KEYWORDS_PATH):
+        with open(path, "r", encoding="utf-8") as f:
+            return cls(json.load(f))
+
+    def keywords(self, app_name):
+        return self.rules.get(app_name.lower(), [app_name.lower()])
+
+    def pattern(self, app_name):
+        key = app_name.lower()
+        pattern = self._patterns.get(key)
+        if pattern is None:
+            with self._lock:
+                pattern = self._patterns.setdefault(key, _compile_keywords([key]))
+        return pattern
+
+    def matches(self, app_name, title):
+        return bool(title) and self.pattern(app_name).search(title.lower()) is not None
+
+
+# ---------- Win32 枚举与事件 ----------
+
+class WindowInfo:
+    """一个可见顶层窗口的快照"""
+    __slots__ = ("hwnd", "pid", "title", "minimized")
+
+    def __init__(self, hwnd, pid, title, minimized=False):
+        self.hwnd = hwnd
+        self.pid = pid
+        self.title = title
+        self.minimized = minimized
+
+    def __repr__(self):
+        return f"WindowInfo(hwnd={self.hwnd}, pid={self.pid}, title={self.title!r})"
+
+
+def enum_top_level_windows():
+    """一次 EnumWindows，返回可见顶层窗口列表（Z 序，前台在前）"""
+    import win32gui, win32process
+    windows = []
+
+    def _enum(hwnd, _):
+        if not win32gui.IsWindowVisible(hwnd):
+            return
+        try:
+            _, pid = win32process.GetWindowThreadProcessId(hwnd)
+            windows.append(WindowInfo(hwnd, pid, win32gui.GetWindowText(hwnd), bool(win32gui.IsIconic(hwnd))))
+        except Exception:
+            pass
+    win32gui.EnumWindows(_enum, None)
+    return windows
+
+
+def foreground_window():
+    """返回 (hwnd, pid)；没有前台窗口时返回 (0, 0)"""
+    import win32gui, win32process
+    hwnd = win32gui.GetForegroundWindow()
+    if not hwnd:
+        return 0, 0
+    return hwnd, win32process.GetWindowThreadProcessId(hwnd)[1]
+
+
+EVENT_OBJECT_CREATE = 0x8000
+EVENT_OBJECT_HIDE = 0x8003
+OBJID_WINDOW = 0
+WINEVENT_OUTOFCONTEXT = 0x0000
+WINEVENT_SKIPOWNPROCESS = 0x0002
+
+
+def watch_window_events(on_event):
+    """后台线程挂 SetWinEventHook（创建/销毁/显示/隐藏），每个窗口级事件回调 on_event(event, hwnd)"""
+    import ctypes
+    from ctypes import wintypes
+
+    user32 = ctypes.windll.user32
+    WinEventProc = ctypes.WINFUNCTYPE(None, wintypes.HANDLE, wintypes.DWORD, wintypes.HWND,
+                                      wintypes.LONG, wintypes.LONG, wintypes.DWORD, wintypes.DWORD)
+
+    def run():
+        @WinEventProc
+        def callback(hook, event, hwnd, id_object, id_child, thread_id, event_time):
+            if id_object == OBJID_WINDOW and id_child == 0 and hwnd:
+                on_event(event, hwnd)
+
+        hook = user32.SetWinEventHook(EVENT_OBJECT_CREATE, EVENT_OBJECT_HIDE, 0, callback, 0, 0,
+                                      WINEVENT_OUTOFCONTEXT | WINEVENT_SKIPOWNPROCESS)
+        if not hook:
+            print("Warning: SetWinEventHook failed, window index relies on TTL only")
+            return
+        msg = wintypes.MSG()
+        try:
+            while user32.GetMessageW(ctypes.byref(msg), 0, 0, 0) > 0:
+                user32.TranslateMessage(ctypes.byref(msg))
+                user32.DispatchMessageW(ctypes.byref(msg))
+        finally:
+            user32.UnhookWinEvent(hook)
+
+    thread = threading.Thread(target=run, name="window-events", daemon=True)
+    thread.start()
+    return thread
+
+
+# ---------- 索引 ----------
+
+class WindowIndex:
+    """pid -> 可见顶层窗口 的缓存索引
+
+    - enumerate_windows()：返回 WindowInfo 列表，默认 enum_top_level_windows
+    - foreground()：返回 (hwnd, pid)，默认 foreground_window
+    - expand_pids(pids)：把 pid 扩展为包含子孙进程的集合，默认原样返回
+    """
+
+    def __init__(self, rules=None, ttl=1.0, enumerate_windows=enum_top_level_windows,
+                 foreground=foreground_window, expand_pids=None):
+        self.rules = rules or KeywordRules.load()
+        self.ttl = ttl
+        self.enumerate_windows = enumerate_windows
+        self.foreground = foreground
+        self.expand_pids = expand_pids or set
+        self._windows = []
+        self._by_pid = {}
+        self._built = 0.0
+        self._dirty = True
+        self._lock = threading.Lock()
+        self.listeners = []       # 每次重建后以 (新出现的窗口, 消失的窗口) 调用
+        self.on_invalidate = None
+        self._stats = {"lookups": 0, "found": 0, "cache_hits": 0, "rebuilds": 0, "invalidations": 0,
+                       "total_ms": 0.0, "max_ms": 0.0, "last_ms": 0.0, "rebuild_ms": 0.0}
+
+    def invalidate(self, *_):
+        """窗口事件回调：下次查找时重建索引"""
+        self._dirty = True
+        self._stats["invalidations"] += 1
+        if self.on_invalidate:
+            self.on_invalidate()
+
+    def watch(self):
+        """订阅窗口事件，使缓存在窗口创建/销毁时立即失效"""
+        return watch_window_events(self.invalidate)
+
+    def snapshot(self):
+        """返回 (windows, by_pid)；过期或已失效时重新枚举一次"""
+        with self._lock:
+            if self._dirty or time.monotonic() - self._built > self.ttl:
+                t0 = time.perf_counter()
+                self._dirty = False
+                windows = self.enumerate_windows()
+                by_pid = {}
+                for window in windows:
+                    by_pid.setdefault(window.pid, []).append(window)
+                if self.listeners and self._built:
+                    old = {window.hwnd: window for window in self._windows}
+                    new = {window.hwnd: window for window in windows}
+                    opened = [window for hwnd, window in new.items() if hwnd not in old]
+                    closed = [window for hwnd, window in old.items() if hwnd not in new]
+                    if opened or closed:
+                        for listener in self.listeners:
+                            listener(opened, closed)
+                self._windows, self._by_pid = windows, by_pid
+                self._built = time.monotonic()
+                self._stats["rebuilds"] += 1
+                self._stats["rebuild_ms"] += (time.perf_counter() - t0) * 1000
+            else:
+                self._stats["cache_hits"] += 1
+            return self._windows, self._by_pid
+
+    def lookup(self, pids, app_name=""):
+        """与原 find_window_by_pids 相同的优先级：前台窗口 > 进程的可见窗口 > 进程的任一窗口 > 标题关键字
+
+        返回 (WindowInfo 或 None, 匹配方式)，匹配方式为 foreground / pid / pid_minimized / keyword / None。
+        """
+        t0 = time.perf_counter()
+        try:
+            window, how = self._lookup(pids, app_name)
+        finally:
+            elapsed = (time.perf_counter() - t0) * 1000
+            self._stats["lookups"] += 1
+            self._stats["total_ms"] += elapsed
+            self._stats["last_ms"] = elapsed
+            self._stats["max_ms"] = max(self._stats["max_ms"], elapsed)
+        if window is not None:
+            self._stats["found"] += 1
+        return window, how
+
+    def _lookup(self, pids, app_name):
+        all_pids = self.expand_pids(pids)
+        windows, by_pid = self.snapshot()
+
+        try:
+            hwnd, pid = self.foreground()
+        except Exception:
+            hwnd, pid = 0, 0
+        if hwnd and pid in all_pids:
+            for window in by_pid.get(pid, ()):
+                if window.hwnd == hwnd:
+                    return window, "foreground"
+
+        candidates = [window for window in windows if window.pid in all_pids]
+        for window in candidates:
+            if not window.minimized:
+                return window, "pid"
+        if candidates:
+            return candidates[0], "pid_minimized"
+
+        if app_name:
+            for window in windows:
+                if self.rules.matches(app_name, window.title):
+                    return window, "keyword"
+        return None, None
+
+    def stats(self):
+        stats = dict(self._stats)
+        lookups = stats["lookups"]
+        stats["avg_ms"] = round(stats["total_ms"] / lookups, 3) if lookups else 0.0
+        stats["windows"] = len(self._windows)
+        stats["ttl"] = self.ttl
+        for key in ("total_ms", "max_ms", "last_ms", "rebuild_ms"):
+            stats[key] = round(stats[key], 3)
+        return stats
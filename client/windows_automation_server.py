@@ -1,18 +1,34 @@
 import os
 import time
-import datetime
 import argparse
+import json
+import queue
+import asyncio
+import threading
 import uiautomation as uiauto
 from uiautomation import WindowControl
 from pywinauto.application import Application
-from PIL import ImageGrab
 from fastapi import FastAPI, Request
-from fastapi.responses import JSONResponse, FileResponse
+from fastapi.responses import JSONResponse, StreamingResponse, Response
 from pydantic import BaseModel
 from fastapi.middleware.cors import CORSMiddleware
 import psutil
 import subprocess
 import win32gui, win32con, win32process
+from ui_tree import extract_tree, extract_records, extract_budgeted, iter_nodes, open_provider, PruneOptions, FIELDS
+from tree_format import dump_line, ColumnarTree, TreeAssembler, TreeHistory, V2_MEDIA_TYPE
+from capture_format import pack_bundle, BUNDLE_MEDIA_TYPE
+from screen import capture_image, grab, grab_for, encode_capture, window_bbox
+from stability import wait_stable, poll
+from state_hash import nodes_signature, dhash
+from capture_store import CaptureStore
+from window_index import WindowIndex
+from process_table import ProcessTable
+from terminator import terminate
+from uia_workers import UIAWorkerPool
+from events import EventHub, LifecycleMonitor, format_sse, parse_pids, SSE_MEDIA_TYPE
+from tree_query import TreeQuery, SelectorError
+from ui_browser import HandleCache, HandleError, BROWSE_FIELDS, parse_handle
 
 app = FastAPI()
 
@@ -25,9 +41,36 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# 默认共享目录路径
+# 默认共享目录路径（截图仓库开启溢出时使用）
 SHARED_DIR = r"D:\\screenshots"
 
+# 截图仓库：内存中按字节/条数限额保存，首次下载后删除
+STORE = CaptureStore()
+
+# 最近若干版本的 UI 树（json 格式），用于按 since 返回差量
+TREE_HISTORY = TreeHistory()
+
+# UIA 工作线程池：COM/UIA 调用都在这些线程上执行；同一窗口的读取按窗口句柄加锁串行
+WORKERS = UIAWorkerPool(workers=4, initializer=uiauto.UIAutomationInitializerInThread)
+
+# 进程表：exe 路径 -> pid、pid -> 子孙进程，按 pid 集合差异增量刷新
+PROCESSES = ProcessTable()
+
+# 顶层窗口索引（关键字表见 window_keywords.json），窗口事件到来时缓存失效
+WINDOWS = WindowIndex(expand_pids=lambda pids: get_all_related_pids(pids))
+
+# 进程/窗口生命周期事件（/events），有订阅者时才刷新进程表与窗口索引
+EVENTS = EventHub()
+MONITOR = LifecycleMonitor(EVENTS, PROCESSES, WINDOWS)
+
+# 懒加载浏览的节点句柄（RuntimeId 路径）-> 控件对象，有界 LRU + TTL，命中时做存活检查
+HANDLES = HandleCache(root_for=uiauto.ControlFromHandle, alive=win32gui.IsWindow)
+
+@app.on_event("startup")
+def watch_windows():
+    WINDOWS.watch()
+    MONITOR.start()
+
 # ---------- Pydantic 请求模型 ----------
 
 class PathModel(BaseModel):
@@ -43,42 +86,150 @@ class PIDModel(BaseModel):
 class PIDListModel(BaseModel):
     pids: list[int]
 
+class CloseModel(PIDModel):
+    deadline: float = 5.0  # 总截止时间（秒）：优雅关闭的等待与强杀都在其内
+    graceful: bool = True  # False 时直接强杀进程树
+
+class CloseListModel(PIDListModel):
+    deadline: float = 5.0
+    graceful: bool = True
+
 class AppTask(BaseModel):
     name: str
     path: str
     pids: list[int]  # Updated to accept a list of PIDs
+    mode: str = "cached"  # cached: 一次性预取整棵子树；live: 逐属性遍历（回退方案）
+    format: str = "json"  # json: 嵌套 dict；v2: 列式二进制（见 tree_format.ColumnarTree）
+    # 裁剪选项，含义见 ui_tree.PruneOptions；全部缺省时返回完整树
+    max_depth: int | None = None
+    include_types: list[str] | None = None
+    exclude_types: list[str] | None = None
+    drop_offscreen: bool = False
+    drop_empty: bool = False
+    clickable_types: list[str] | None = None
+    # 客户端已持有的树版本号；仍在 TREE_HISTORY 中时只返回差量（仅 json 格式）
+    since: str | None = None
+    # 限时提取（见 ui_tree.extract_budgeted）：总预算与单次调用超时（秒），任一给出时按广度优先提取并可能返回部分树
+    budget: float | None = None
+    call_timeout: float | None = None
+
+    def prune_options(self):
+        return PruneOptions(
+            max_depth=self.max_depth,
+            include_types=self.include_types,
+            exclude_types=self.exclude_types,
+            drop_offscreen=self.drop_offscreen,
+            drop_empty=self.drop_empty,
+            clickable_types=self.clickable_types,
+        )
+
+class ScreenshotOptions(BaseModel):
+    format: str = "png"  # png / webp / raw（RGB24）
+    compress_level: int = 6  # PNG 压缩级别 0-9，越低越快
+    lossless: bool = True  # WebP 是否无损
+    quality: int = 80  # WebP 有损质量
+    target_width: int | None = None  # 训练分辨率，缺省不缩放
+    target_height: int | None = None
+    keep_aspect: bool = True
+    crop_to_window: bool = False  # 只截目标窗口（需给出 name/pids 或在 /capture 中使用）
+    name: str = ""
+    pids: list[int] = []
+
+class CaptureTask(AppTask):
+    screenshot: ScreenshotOptions = ScreenshotOptions()
+
+class WaitStableTask(AppTask):
+    quiet: float = 1.0  # UI 树与画面连续保持不变的秒数
+    timeout: float = 15.0  # 硬性截止时间（秒），到时无论是否稳定都返回
+    interval: float = 0.2  # 轮询间隔
+    check_tree: bool = True
+    check_screen: bool = True
+    screen_tolerance: int = 2  # 画面 dHash 允许的汉明距离（容忍光标闪烁）
+
+class QueryTask(AppTask):
+    selector: str  # 语法见 tree_query.py
+    limit: int | None = None  # 最多返回的匹配数
+
+class BrowseTask(BaseModel):
+    name: str = ""
+    pids: list[int]
+    depth: int = 2  # 返回窗口根节点以下几层
+    fields: list[str] | None = None  # 缺省为 ui_browser.BROWSE_FIELDS（不含 clickable）
+    max_children: int | None = None  # 每个节点最多返回的子节点数，超出部分记在 more_children
+
+class ExpandModel(BaseModel):
+    handle: str
+    depth: int = 1
+    fields: list[str] | None = None
+    max_children: int | None = None
+
+class PropsModel(BaseModel):
+    handles: list[str]
+    fields: list[str] | None = None  # 缺省为全部字段
 
 # ---------- 内部方法 ----------
-def extract_ui(ctrl, app_name='App', page_tag='Main', depth=0):
+def extract_ui(ctrl, app_name='App', mode='cached', prune=None):
+    """提取以 ctrl 为根的 UI 树，具体逻辑见 ui_tree.py"""
+    return extract_tree(ctrl, app_name, mode, prune or PruneOptions())
+
+def extract_for(window, data: AppTask):
+    """按 data 的选项提取扁平记录（先序），返回 (records, report)；未设预算时 report 为 None"""
+    if data.budget is None and data.call_timeout is None:
+        return extract_records(window, data.mode, data.prune_options()), None
+    records, report = extract_budgeted(window, data.mode, data.prune_options(), data.budget, data.call_timeout,
+                                       initializer=uiauto.UIAutomationInitializerInThread)
+    if not report["complete"]:
+        slowest = next(iter(report["timings"]), None)
+        print(f"Partial UI tree for {data.name}: {report['nodes']} nodes in {report['elapsed']}s, "
+              f"{report['truncated']} truncated, {report['timed_out']} timed out (slowest type: {slowest})")
+    return records, report
+
+def stream_ui_lines(window, data: AppTask):
+    """在独立线程中遍历 UI 树，逐行产出 NDJSON（格式见 tree_format.py）
+
+    UIA 对象只在生产线程内访问；队列有界，消费端（客户端）读得慢时生产端会被阻塞。
+    """
+    lines = queue.Queue(maxsize=1024)
+    stop = threading.Event()
+    done = object()
+
+    def put(line):
+        while not stop.is_set():
+            try:
+                lines.put(line, timeout=0.5)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def produce():
+        t0 = time.time()
+        count = 0
+        try:
+            with uiauto.UIAutomationInitializerInThread(), WORKERS.window_lock(window.NativeWindowHandle):
+                prune = data.prune_options()
+                provider, root = open_provider(window, data.mode, prune)
+                put(dump_line({"status": "ok", "app_name": data.name, "root_tag": "Main", "window": window.Name}))
+                for record in iter_nodes(provider, root, prune):
+                    if not put(dump_line(record)):
+                        return
+                    count += 1
+            put(dump_line({"status": "done", "count": count, "elapsed": round(time.time() - t0, 3)}))
+        except Exception as e:
+            print(f"Error streaming UI tree: {e}")
+            put(dump_line({"status": "error", "error": f"Error streaming UI tree: {e}"}))
+        finally:
+            put(done)
+
+    threading.Thread(target=produce, daemon=True).start()
     try:
-        rect = ctrl.BoundingRectangle
-        control_type = ctrl.ControlTypeName or ""
-        name = ctrl.Name or ""
-        return {
-            "app_name": app_name,
-            "page_tag": f"{page_tag}_{depth}",
-            "name": name,
-            "control_type": control_type,
-            "automation_id": ctrl.AutomationId,
-            "is_enabled": ctrl.IsEnabled,
-            "is_offscreen": ctrl.IsOffscreen,
-            "depth": depth,
-            "rect": {
-                "left": rect.left,
-                "top": rect.top,
-                "right": rect.right,
-                "bottom": rect.bottom
-            },
-            "clickable": ctrl.GetClickablePoint(),
-            "focusable": ctrl.IsKeyboardFocusable,
-            "children": [
-                extract_ui(child, app_name=app_name, page_tag=f"{page_tag}_{depth}", depth=depth + 1)
-                for child in ctrl.GetChildren()
-            ]
-        }
-    except Exception as e:
-        print(f"Error extracting UI for control {ctrl.Name}: {e}")
-        return None
+        while True:
+            line = lines.get()
+            if line is done:
+                break
+            yield line
+    finally:
+        stop.set()
 
 def _wait_for_window(name_keywords: list[str], timeout=10):
     """轮询顶层窗口，直到出现包含关键字的窗口"""
@@ -95,247 +246,95 @@ def _wait_for_window(name_keywords: list[str], timeout=10):
         time.sleep(0.3)
     return None
 
-def terminate_process_tree(pid: int) -> bool:
-    """psutil fallback to kill a process tree"""
-    try:
-        parent = psutil.Process(pid)
-        for child in parent.children(recursive=True):
-            child.kill()
-        parent.kill()
-        return True
-    except Exception:
-        return False
-    
-def post_wm_close(pid: int):
-    """枚举所有顶层窗口，把 WM_CLOSE 发给属于 pid 的那个"""
-    def _enum(hwnd, _):
-        _, wpid = win32process.GetWindowThreadProcessId(hwnd)
-        if wpid == pid and win32gui.IsWindowVisible(hwnd):
-            win32gui.PostMessage(hwnd, win32con.WM_CLOSE, 0, 0)
-    win32gui.EnumWindows(_enum, None)
+def close_windows(pids):
+    """向 pids 的全部可见顶层窗口一次性发送 WM_CLOSE；没有 Win32 窗口的进程（如 UWP）再尝试 UIA 的 Close()
 
-def get_all_related_pids(pid_list):
-    """获取所有相关进程ID，包括子进程"""
-    all_pids = set()
-    for pid in pid_list:
+    返回收到关闭请求的 pid 集合。
+    """
+    sent = set()
+    windows, _ = WINDOWS.snapshot()
+    for window in windows:
+        if window.pid in pids:
+            try:
+                win32gui.PostMessage(window.hwnd, win32con.WM_CLOSE, 0, 0)
+                sent.add(window.pid)
+            except Exception as e:
+                print(f"WM_CLOSE to {window.hwnd} failed: {e}")
+    for pid in set(pids) - sent:
         try:
-            proc = psutil.Process(pid)
-            all_pids.add(pid)
-            # 添加所有子进程
-            for child in proc.children(recursive=True):
-                all_pids.add(child.pid)
-        except (psutil.NoSuchProcess, psutil.AccessDenied):
+            win = WindowControl(ProcessId=pid, searchDepth=1)
+            if win.Exists(0, 0):
+                win.GetWindowPattern().Close()
+                sent.add(pid)
+        except Exception:
             continue
-    return all_pids
+    return sent
+
+def _bad_fields(fields):
+    """fields 中不认识的字段名，全部合法时返回 None"""
+    unknown = [field for field in fields or () if field not in FIELDS]
+    return f"Unknown fields {unknown} (expected a subset of {list(FIELDS)})" if unknown else None
+
+def get_all_related_pids(pid_list):
+    """获取所有相关进程ID，包括子进程（查进程表，不再逐个递归扫描）"""
+    return PROCESSES.related(pid_list)
 
 def find_window_by_pids(pids, app_name=""):
-    """根据进程ID列表查找窗口"""
-    root = uiauto.GetRootControl()
-    
-    print(f"Looking for windows with PIDs: {pids}")
-    
-    # 获取所有相关进程ID（包括子进程）
-    all_pids = get_all_related_pids(pids)
-    print(f"All related PIDs: {all_pids}")
-    
-    # 1. 首先尝试前台窗口
-    try:
-        foreground_win = uiauto.GetForegroundControl()
-        if foreground_win and foreground_win.ProcessId in all_pids:
-            print(f"Found foreground window: {foreground_win.Name} (PID: {foreground_win.ProcessId})")
-            return foreground_win
-    except Exception as e:
-        print(f"Error getting foreground window: {e}")
-    
-    # 2. 遍历所有顶层窗口，查找匹配的PID
-    windows_found = []
-    for win in root.GetChildren():
-        try:
-            if win.ProcessId in all_pids:
-                windows_found.append(win)
-                print(f"Found window: '{win.Name}' (PID: {win.ProcessId})")
-        except Exception as e:
-            print(f"Error checking window: {e}")
+    """根据进程ID列表查找窗口（查找逻辑见 window_index.py），返回 UIA 窗口控件"""
+    for _ in range(2):
+        info, how = WINDOWS.lookup(pids, app_name)
+        if info is None:
+            print(f"No matching window found for PIDs {pids} ({WINDOWS.stats()['last_ms']:.1f} ms)")
+            return None
+        # 缓存中的窗口可能在失效事件到达前已被销毁：失效后重查一次
+        if not win32gui.IsWindow(info.hwnd):
+            WINDOWS.invalidate()
             continue
-    
-    # 3. 如果找到了窗口，优先选择可见的窗口
-    if windows_found:
-        for win in windows_found:
-            try:
-                if win.IsWindowPatternAvailable() and not win.IsOffscreen:
-                    print(f"Selected visible window: {win.Name}")
-                    return win
-            except Exception:
-                continue
-        
-        # 如果没有可见窗口，返回第一个找到的
-        print(f"No visible windows found, using first available: {windows_found[0].Name}")
-        return windows_found[0]
-    
-    # 4. 如果按PID找不到，尝试按应用名称关键字查找
-    if app_name:
-        KEYWORD_MAP = {
-            # Windows 自带应用
-            'explorer': ['文件资源管理器', 'explorer', '此电脑','windows 资源管理器'],
-            'taskmgr': ['任务管理器', 'task manager'],
-            'control': ['控制面板', 'control panel'],
-            'systemsettings': ['设置', 'windows settings','systemsettings'],
-            'notepad': ['记事本', 'notepad', 'untitled'],
-            'mspaint': ['画图', 'paint'],
-            'calculator': ['计算器', 'calculator'],
-            'outlook': ['邮件', 'mail', 'outlook mail','outlook','microsoft outlook'],
-            'chrome': ['google chrome', 'google chrome浏览器','chrome浏览器','chrome'],
-            'wmplayer': ['windows media player', 'wmplayer'],
-            'snippingtool': ['截图工具', 'snipping tool'],
-            'remotedesktop': ['远程桌面', 'remote desktop'],
-
-            # 办公与生产力
-            'word': ['word', 'word文档', 'microsoft word','微软word'],
-            'excel': ['excel', 'excel文档', 'microsoft excel','微软excel'],
-            'ppt': ['ppt', 'powerpoint', 'microsoft powerpoint','微软powerpoint'],
-            'wps': ['wps', '金山办公','ksolaunch','wps office','wps办公'],
-            'acrobat': ['acrobat reader', 'adobe reader', 'pdf阅读器'],
-            'foxitpdf': ['foxit pdf', '福昕', 'foxit editor'],
-            'notepad++': ['notepad++', '代码编辑器'],
-            'vscode': ['visual studio code', 'code', 'vscode'],
-            'sublime': ['sublime text', 'sublime'],
-            'evernote': ['evernote', '印象笔记'],
-            'onenote': ['onenote', '微软笔记'],
-            'slack': ['slack', '团队沟通'],
-            'zoom': ['zoom', '视频会议'],
-            'teams': ['microsoft teams', 'teams'],
-            'dingtalk': ['钉钉', 'dingtalk','dingtalklauncher'],
-            'feishu': ['飞书', 'feishu'],
-            'wemeet': ['腾讯会议', 'tencent meeting', 'wemeet'],
-            'tencentdocs': ['腾讯文档', 'docs.qq.com'],
-            'baidunetdisk': ['百度网盘', 'baidunetdisk','百度云'],
-            'adrive': ['aDrive', '阿里云盘'],
-            # 网络与通信
-            'wechat': ['微信', 'wechat'],
-            'qq': ['qq', '腾讯qq'],
-            'weibo': ['微博', 'weibo'],
-            'mailmaster': ['网易邮箱大师', 'mailmaster'],
-            'thunderbird': ['thunderbird', '雷鸟'],
-            # 多媒体与设计
-            'vlc': ['vlc', 'vlc player'],
-            'potplayer': ['potplayer'],
-            'stormplayer': ['暴风影音', '暴风影音5', 'stormplayer'],
-            'iqiyi': ['爱奇艺', 'iqiyi','qyclient'],
-            'qqlive': ['腾讯视频', 'tencent video','qqlive','qq视频'],
-            'youku': ['优酷', 'youku'],
-            'bilibili': ['哔哩哔哩', 'bilibili', 'b站'],
-            'mgtv': ['芒果TV', 'mgtv'],
-            'photoshop': ['photoshop', 'ps'],
-            'premiere': ['premiere', 'pr'],
-            'lightroom': ['lightroom', 'lr'],
-            'gimp': ['gimp', '开源图像编辑','gimp3'],
-            'meituxiuxiu': ['美图秀秀', 'meitu','xiuxiu'],
-            'formatfactory': ['格式工厂', 'format factory'],
-            'audacity': ['audacity', '音频编辑'],
-            'kugou': ['酷狗音乐', 'kugou'],
-            'kwmusic': ['酷我音乐', 'kwmusic'],
-            'cloudmusic': ['网易云音乐', 'netease music','cloudmusic'],
-            'qqmusic': ['qq音乐', 'qqmusic'],
-            'spotify': ['spotify'],
-            'itunes': ['itunes'],
-            '千千静听': ['千千静听'],
-
-            # 安全与系统工具
-            '360safe': ['360安全卫士', '360safe'],
-            'qqmanager': ['腾讯电脑管家', 'qq电脑管家'],
-            'huorong': ['火绒', '火绒安全'],
-            'ludashi': ['鲁大师', 'ludashi'],
-            'ccleaner': ['ccleaner', '系统清理'],
-            '7zip': ['7-zip', '压缩工具'],
-            'winrar': ['winrar'],
-            'bandizip': ['bandizip'],
-            'thunder': ['迅雷', 'thunder'],
-            'idm': ['idm', 'internet download manager'],
-            'qbittorrent': ['qbittorrent', 'bt下载'],
-            'chrome': ['谷歌浏览器', 'chrome', 'google chrome'],
-            'firefox': ['火狐浏览器', 'firefox', 'mozilla firefox'],
-            'sogou_browser': ['搜狗浏览器', 'sogou'],
-
-            # 开发与工具类
-            'git': ['git', 'git bash'],
-            'github_desktop': ['github desktop', 'github'],
-            'docker': ['docker', 'docker desktop'],
-            'postman': ['postman', 'api测试'],
-            'fiddler': ['fiddler', '抓包工具'],
-            'xshell': ['xshell', 'ssh工具'],
-            'vmware': ['vmware', '虚拟机'],
-            'virtualbox': ['virtualbox', '虚拟机'],
-            'putty': ['putty'],
-            'sunlogin': ['向日葵', 'sunlogin'],
-            'teamviewer': ['teamviewer'],
-            'anydesk': ['anydesk'],
-            'everything': ['everything', '文件搜索'],
-            'listary': ['listary', '快速启动'],
-            'pdf_converter': ['pdf转换器', '迅捷pdf'],
-            
-            # java类
-            'xmind': ['xmind'],
-            'clash': ['clash']
-        }
-        keywords = KEYWORD_MAP.get(app_name.lower(), [app_name.lower()])
-        print(f"Searching by keywords: {keywords}")
-        
-        for win in root.GetChildren():
-            try:
-                title = (win.Name or "").lower()
-                if any(keyword.lower() in title for keyword in keywords):
-                    print(f"Found window by keyword: {win.Name}")
-                    return win
-            except Exception:
-                continue
-    
-    print("No matching window found")
+        print(f"Found window by {how}: '{info.title}' (PID: {info.pid}, {WINDOWS.stats()['last_ms']:.1f} ms)")
+        return uiauto.ControlFromHandle(info.hwnd)
     return None
 
 # ---------- 接口定义 ----------
 
 @app.post("/open_app")
+@WORKERS.endpoint
 def open_app(data: PathModel):
     exe_path = os.path.abspath(data.path)
     exe_name = os.path.basename(exe_path).lower()
     print(f"Opening app: {exe_path}")
 
     # 1. 如果已在运行，就直接返回主进程 PID 与窗口
-    for proc in psutil.process_iter(['pid', 'exe', 'name']):
+    running = PROCESSES.processes_for_exe(exe_path)
+    if running:
         try:
-            if proc.info['exe'] and os.path.samefile(proc.info['exe'], exe_path):
-                main = proc
-                child_pids = [c.pid for c in main.children(recursive=True)]
-                all_pids = [main.pid] + child_pids
-                window = find_window_by_pids(all_pids, os.path.splitext(exe_name)[0])
-                real_pid = window.ProcessId if window else main.pid
-                title = window.Name if window else "Unknown"
-                print(f"App already running - UI PID: {real_pid}, Window: {title}")
-                return {
-                    "status": "already running",
-                    "path": exe_path,
-                    "pid": real_pid,
-                    "window_title": title
-                }
-        except Exception:
-            continue
+            main = min(running, key=lambda proc: proc["create_time"])["pid"]
+            all_pids = [main] + list(PROCESSES.descendants(main))
+            window = find_window_by_pids(all_pids, os.path.splitext(exe_name)[0])
+            real_pid = window.ProcessId if window else main
+            title = window.Name if window else "Unknown"
+            print(f"App already running - UI PID: {real_pid}, Window: {title}")
+            return {
+                "status": "already running",
+                "path": exe_path,
+                "pid": real_pid,
+                "window_title": title
+            }
+        except Exception as e:
+            print(f"Error checking running instance: {e}")
 
     # 2. 启动应用
     try:
         parent = subprocess.Popen([exe_path], stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, shell=False)
         print(f"Started stub process PID: {parent.pid}")
-        time.sleep(2)
 
-        # 收集 parent + 子进程 PIDs
-        try:
-            proc = psutil.Process(parent.pid)
-            child_pids = [c.pid for c in proc.children(recursive=True)]
-        except (psutil.NoSuchProcess, psutil.AccessDenied):
-            child_pids = []
-        stub_pids = [parent.pid] + child_pids
-
-        # 查找真正的 UI 窗口和进程
-        window = find_window_by_pids(stub_pids, os.path.splitext(exe_name)[0])
+        # 收集 parent + 子进程 PIDs（子进程可能稍后才出现，每次轮询都重新收集）
+        def stub_pids():
+            return [parent.pid] + list(PROCESSES.descendants(parent.pid))
+
+        # 查找真正的 UI 窗口和进程：窗口一出现就返回，界面是否加载完由 /wait_stable 判断
+        t0 = time.time()
+        window = poll(lambda: find_window_by_pids(stub_pids(), os.path.splitext(exe_name)[0]), timeout=10, interval=0.2)
+        print(f"Window lookup took {time.time() - t0:.2f}s")
         if window:
             real_pid = window.ProcessId
             title = window.Name
@@ -358,14 +357,18 @@ def open_app(data: PathModel):
         return JSONResponse(status_code=500, content={"error": f"Failed to launch app: {e}", "status": "error"})
 
 @app.post("/screenshot")
-def screenshot(request: Request):
+@WORKERS.endpoint
+def screenshot(request: Request, data: ScreenshotOptions | None = None):
     try:
-        timestamp = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
-        filename = f"screenshot_{timestamp}.png"
-        save_path = os.path.join(SHARED_DIR, filename)
+        options = data or ScreenshotOptions()
+        window = None
+        if options.crop_to_window:
+            window = find_window_by_pids(options.pids, options.name)
+            if not window:
+                print("Warning: crop_to_window requested but no window found, capturing full screen")
 
-        image = ImageGrab.grab()
-        image.save(save_path)
+        body, info = capture_image(options, window)
+        filename = STORE.put(body, info["media_type"], options.format)
 
         host = request.client.host + ":" + str(request.url.port or 5000)
         url = f"http://{host}/screenshot/{filename}"
@@ -373,8 +376,8 @@ def screenshot(request: Request):
         return {
             "status": "ok",
             "filename": filename,
-            "path": save_path,
-            "url": url
+            "url": url,
+            **info
         }
     except Exception as e:
         print(f"Screenshot error: {e}")
@@ -382,13 +385,147 @@ def screenshot(request: Request):
 
 @app.get("/screenshot/{filename}")
 def serve_screenshot(filename: str):
-    file_path = os.path.join(SHARED_DIR, filename)
-    if os.path.exists(file_path):
-        return FileResponse(file_path, media_type="image/png")
+    item = STORE.get(filename)
+    if item:
+        body, media_type = item
+        return Response(content=body, media_type=media_type)
     else:
         return JSONResponse(status_code=404, content={"error": "file not found"})
+
+@app.get("/screenshot_store/stats")
+def screenshot_store_stats():
+    """截图仓库的命中/未命中/淘汰计数与当前占用"""
+    return STORE.stats()
     
+@app.post("/capture")
+@WORKERS.endpoint
+def capture(data: CaptureTask):
+    """截图与 UI 树背靠背采集，一次往返返回（不落盘），格式见 capture_format.py"""
+    try:
+        print(f"Capturing screenshot + UI tree for app: {data.name}, PIDs: {data.pids}")
+        # 先定位窗口，使截图与取树之间尽量没有多余耗时
+        window = find_window_by_pids(data.pids, data.name)
+        if not window:
+            error_msg = f'No window found for app {data.name} with PIDs {data.pids}'
+            print(error_msg)
+            return JSONResponse(status_code=404, content={"error": error_msg, "status": "error"})
+
+        with WORKERS.window_lock(window.NativeWindowHandle):
+            screenshot_time = time.time()
+            image, bbox = grab_for(data.screenshot, window)
+            tree_start = time.time()
+            records, report = extract_for(window, data)
+            tree_end = time.time()
+        if not records:
+            error_msg = f'Failed to extract UI tree for window {window.Name}'
+            print(error_msg)
+            return JSONResponse(status_code=500, content={"error": error_msg, "status": "error"})
+
+        # 编码放在两次采集之后
+        image_bytes, image_info = encode_capture(image, bbox, data.screenshot)
+        if data.format == "v2":
+            tree_part = ("ui_tree", V2_MEDIA_TYPE, ColumnarTree.from_records(records, data.name).to_bytes())
+        else:
+            assembler = TreeAssembler(data.name)
+            for record in records:
+                assembler.add(record)
+            version, delta = TREE_HISTORY.record(assembler.root, data.since)
+            if delta is not None:
+                tree_part = ("ui_delta", "application/json", json.dumps(delta, ensure_ascii=False).encode("utf-8"))
+            else:
+                tree_part = ("ui_tree", "application/json",
+                             json.dumps(assembler.root, ensure_ascii=False).encode("utf-8"))
+
+        meta = {
+            "status": "ok",
+            "window_title": window.Name,
+            "screenshot_time": screenshot_time,
+            "tree_start": tree_start,
+            "tree_end": tree_end,
+            "node_count": len(records),
+            **({"extract": report} if report else {}),
+            **({"version": version, "base": data.since if delta is not None else None} if data.format != "v2" else {}),
+            **{key: value for key, value in image_info.items() if key != "media_type"},
+        }
+        print(f"Captured {window.Name}: {len(records)} nodes, tree took {tree_end - tree_start:.3f}s after the frame")
+        body = pack_bundle(meta, [("screenshot", image_info["media_type"], image_bytes), tree_part])
+        return Response(content=body, media_type=BUNDLE_MEDIA_TYPE)
+    except Exception as e:
+        error_msg = f"Error capturing: {str(e)}"
+        print(error_msg)
+        return JSONResponse(status_code=500, content={"error": error_msg, "status": "error"})
+
+@app.get("/workers/stats")
+def workers_stats():
+    """UIA 工作线程池：队列深度、忙碌线程数、排队/执行/窗口锁等待耗时（毫秒）"""
+    return WORKERS.stats()
+
+@app.get("/window_index/stats")
+def window_index_stats():
+    """窗口查找耗时（平均/最大/最近一次，毫秒）、缓存命中与重建次数"""
+    return WINDOWS.stats()
+
+@app.post("/wait_stable")
+def wait_until_stable(data: WaitStableTask):
+    """轮询目标窗口的 UI 树结构与窗口区域画面，二者连续 quiet 秒不变即返回，最长等待 timeout 秒"""
+    print(f"Waiting for {data.name} (PIDs {data.pids}) to settle, quiet={data.quiet}s, timeout={data.timeout}s")
+    prune = data.prune_options()
+    state = {"window": None}
+
+    def locate():
+        window = state["window"]
+        try:
+            if window is not None and window.Exists(0, 0):
+                return window
+        except Exception:
+            pass
+        state["window"] = find_window_by_pids(data.pids, data.name)
+        return state["window"]
+
+    def read_tree():
+        window = locate()
+        if not window:
+            return None
+        with WORKERS.window_lock(window.NativeWindowHandle):
+            records = extract_records(window, data.mode, prune)
+        return nodes_signature(records) if records else None
+
+    def read_screen():
+        window = locate()
+        bbox = window_bbox(window) if window else None
+        return dhash(grab(bbox)) if bbox else None
+
+    # 等待本身在请求线程中进行，每次探测才交给 UIA 工作线程，长时间等待不会占住工作线程
+    def tree_probe():
+        try:
+            return WORKERS.submit(read_tree).result()
+        except Exception as e:
+            print(f"wait_stable: tree probe failed: {e}")
+            return None
+
+    def screen_probe():
+        try:
+            return WORKERS.submit(read_screen).result()
+        except Exception as e:
+            print(f"wait_stable: screen probe failed: {e}")
+            return None
+
+    try:
+        result = wait_stable(tree_probe if data.check_tree else None,
+                             screen_probe if data.check_screen else None,
+                             quiet=data.quiet, timeout=data.timeout, interval=data.interval,
+                             screen_tolerance=data.screen_tolerance)
+    except Exception as e:
+        error_msg = f"Error waiting for UI to settle: {str(e)}"
+        print(error_msg)
+        return JSONResponse(status_code=500, content={"error": error_msg, "status": "error"})
+    window = state["window"]
+    print(f"wait_stable: {'stable' if result['stable'] else 'timed out'} after {result['elapsed']}s "
+          f"({result['samples']} samples, {result['changes']} changes)")
+    return {"status": "ok", "window_title": window.Name if window else None, **result}
+
 @app.post("/get_ui_tree")
+@WORKERS.endpoint
 def get_ui_tree(data: AppTask):
     try:
         print(f"Getting UI tree for app: {data.name}, PIDs: {data.pids}")
@@ -404,8 +541,31 @@ def get_ui_tree(data: AppTask):
                 content={"error": error_msg, "status": "error"}
             )
         
+        if data.format == "v2":
+            with WORKERS.window_lock(window.NativeWindowHandle):
+                records, report = extract_for(window, data)
+            if not records:
+                error_msg = f'Failed to extract UI tree for window {window.Name}'
+                print(error_msg)
+                return JSONResponse(status_code=500, content={"error": error_msg, "status": "error"})
+            columns = ColumnarTree.from_records(records, data.name)
+            print(f"Successfully extracted UI tree for window: {window.Name} ({len(columns)} nodes, v2)")
+            # 节点上的 truncated / timed_out 标记随 extras 保存在列中；整次提取的报告（complete、timings 等）
+            # 只在响应头 X-Extract-Report 中给出
+            headers = {"X-Extract-Report": json.dumps(report)} if report else None
+            return Response(content=columns.to_bytes(), media_type=V2_MEDIA_TYPE, headers=headers)
+
         # 提取UI树
-        ui_tree = extract_ui(window, data.name)
+        report = None
+        with WORKERS.window_lock(window.NativeWindowHandle):
+            if data.budget is None and data.call_timeout is None:
+                ui_tree = extract_ui(window, data.name, data.mode, data.prune_options())
+            else:
+                records, report = extract_for(window, data)
+                assembler = TreeAssembler(data.name)
+                for record in records:
+                    assembler.add(record)
+                ui_tree = assembler.root
         
         if not ui_tree:
             error_msg = f'Failed to extract UI tree for window {window.Name}'
@@ -415,8 +575,13 @@ def get_ui_tree(data: AppTask):
                 content={"error": error_msg, "status": "error"}
             )
         
+        version, delta = TREE_HISTORY.record(ui_tree, data.since)
+        extra = {"extract": report} if report else {}
+        if delta is not None:
+            print(f"Successfully extracted UI tree for window: {window.Name} (delta against {data.since[:8]})")
+            return {"status": "ok", "version": version, "base": data.since, "delta": delta, **extra}
         print(f"Successfully extracted UI tree for window: {window.Name}")
-        return {"status": "ok", "ui_tree": ui_tree}
+        return {"status": "ok", "version": version, "ui_tree": ui_tree, **extra}
         
     except Exception as e:
         error_msg = f"Error getting UI tree: {str(e)}"
@@ -426,109 +591,202 @@ def get_ui_tree(data: AppTask):
             content={"error": error_msg, "status": "error"}
         )
 
-import os
-
-@app.post("/close_app")
-def close_app(data: PIDModel):
-    pid = data.pid
-    print(f"Closing app with PID: {pid}")
-
-    # ——0) 跳过自己——
-    if pid == os.getpid():
-        return {"status": "skipped", "pid": pid, "message": "Refusing to close server process"}
-
-    # ——1) 尝试 WindowControl.Close()（UWP 窗口有效）——
+@app.post("/get_ui_tree/stream")
+@WORKERS.endpoint
+def get_ui_tree_stream(data: AppTask):
+    """/get_ui_tree 的流式版本：边遍历边返回 NDJSON，每行一个节点"""
+    print(f"Streaming UI tree for app: {data.name}, PIDs: {data.pids}")
+    window = find_window_by_pids(data.pids, data.name)
+    if not window:
+        error_msg = f'No window found for app {data.name} with PIDs {data.pids}'
+        print(error_msg)
+        return JSONResponse(status_code=404, content={"error": error_msg, "status": "error"})
+    return StreamingResponse(stream_ui_lines(window, data), media_type="application/x-ndjson")
+
+@app.post("/query")
+@WORKERS.endpoint
+def query_ui_tree(data: QueryTask):
+    """按选择器查询 UI 树，只返回匹配节点（不含 children，附 id / parent_id / path）"""
+    t0 = time.perf_counter()
+    window = find_window_by_pids(data.pids, data.name)
+    if not window:
+        error_msg = f'No window found for app {data.name} with PIDs {data.pids}'
+        print(error_msg)
+        return JSONResponse(status_code=404, content={"error": error_msg, "status": "error"})
     try:
-        win = WindowControl(ProcessId=pid)
-        if win.Exists(0, 0) and hasattr(win, "Close"):
-            print("Attempting WindowControl.Close()")
-            win.Close()
-            time.sleep(1)
+        with WORKERS.window_lock(window.NativeWindowHandle):
+            records = extract_records(window, data.mode, data.prune_options())
+        tree = TreeQuery(records)
+        matches = tree.query(data.selector, data.limit)
+    except SelectorError as e:
+        return JSONResponse(status_code=400, content={"error": str(e), "status": "error"})
     except Exception as e:
-        print("WindowControl.Close() failed:", e)
+        error_msg = f"Error querying UI tree: {str(e)}"
+        print(error_msg)
+        return JSONResponse(status_code=500, content={"error": error_msg, "status": "error"})
+    elapsed = round(time.perf_counter() - t0, 3)
+    print(f"Query {data.selector!r} on {window.Name}: {len(matches)}/{len(tree)} nodes in {elapsed}s")
+    return {"status": "ok", "window": window.Name, "count": len(matches), "nodes": len(tree),
+            "elapsed": elapsed, "matches": matches}
+
+import os
 
-    # ——2) 发送 WM_CLOSE——
+@app.post("/ui/top")
+@WORKERS.endpoint
+def browse_top(data: BrowseTask):
+    """懒加载浏览的入口：窗口根节点及其顶部 depth 层，每个节点带句柄；未展开的节点 children 为 null"""
+    error_msg = _bad_fields(data.fields)
+    if error_msg:
+        return JSONResponse(status_code=400, content={"error": error_msg, "status": "error"})
+    window = find_window_by_pids(data.pids, data.name)
+    if not window:
+        error_msg = f'No window found for app {data.name} with PIDs {data.pids}'
+        print(error_msg)
+        return JSONResponse(status_code=404, content={"error": error_msg, "status": "error"})
+    hwnd = window.NativeWindowHandle
     try:
-        print("Posting WM_CLOSE to PID", pid)
-        post_wm_close(pid)
-        time.sleep(1)
+        with WORKERS.window_lock(hwnd):
+            root = HANDLES.top(hwnd, data.depth, tuple(data.fields or BROWSE_FIELDS), data.max_children)
     except Exception as e:
-        print("post_wm_close failed:", e)
-
-    # ——3) 最后强制杀进程树——
+        error_msg = f"Error browsing UI tree: {str(e)}"
+        print(error_msg)
+        return JSONResponse(status_code=500, content={"error": error_msg, "status": "error"})
+    return {"status": "ok", "window": window.Name, "root": root}
+
+@app.post("/ui/expand")
+@WORKERS.endpoint
+def browse_expand(data: ExpandModel):
+    """展开一个句柄 depth 层；句柄失效（控件或窗口已销毁）时返回 410"""
+    error_msg = _bad_fields(data.fields)
+    if error_msg:
+        return JSONResponse(status_code=400, content={"error": error_msg, "status": "error"})
     try:
-        print(f"taskkill /PID {pid} /T /F")
-        subprocess.run(
-            ["taskkill", "/PID", str(pid), "/T", "/F"],
-            check=True, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
-        )
-        return {"status": "ok", "pid": pid, "message": "Terminated via taskkill"}
-    except subprocess.CalledProcessError as e:
-        print("taskkill failed, fallback to psutil:", e)
-        if terminate_process_tree(pid):
-            return {"status": "ok", "pid": pid, "message": "Terminated via psutil fallback"}
-        else:
-            return {"status": "error", "pid": pid, "message": "Both taskkill and psutil failed"}
-
-@app.post("/close_apps")
-def close_apps(data: PIDListModel):
-    results = []
-    for pid in data.pids:
-        if pid == os.getpid():
-            results.append({"pid": pid, "status": "skipped", "message": "Refusing to close server process"})
-            continue
-
-        # 同上：1) Close() 2) WM_CLOSE 3) taskkill/psutil
+        hwnd, _ = parse_handle(data.handle)
+        with WORKERS.window_lock(hwnd):
+            node = HANDLES.expand(data.handle, data.depth, tuple(data.fields or BROWSE_FIELDS), data.max_children)
+    except HandleError as e:
+        return JSONResponse(status_code=410, content={"error": e.args[0], "status": "stale"})
+    except ValueError as e:
+        return JSONResponse(status_code=400, content={"error": str(e), "status": "error"})
+    except Exception as e:
+        error_msg = f"Error expanding {data.handle}: {str(e)}"
+        print(error_msg)
+        return JSONResponse(status_code=500, content={"error": error_msg, "status": "error"})
+    return {"status": "ok", "node": node}
+
+@app.post("/ui/props")
+@WORKERS.endpoint
+def browse_props(data: PropsModel):
+    """批量读取句柄的属性：{ handle: {字段...} }，失效的句柄为 { error, stale: true }"""
+    error_msg = _bad_fields(data.fields)
+    if error_msg:
+        return JSONResponse(status_code=400, content={"error": error_msg, "status": "error"})
+    by_window = {}
+    for handle in data.handles:
         try:
-            win = WindowControl(ProcessId=pid)
-            if win.Exists(0, 0) and hasattr(win, "Close"):
-                win.Close(); time.sleep(1)
-        except: pass
+            by_window.setdefault(parse_handle(handle)[0], []).append(handle)
+        except ValueError:
+            by_window.setdefault(None, []).append(handle)
+    properties = {}
+    for hwnd, handles in by_window.items():
+        if hwnd is None:
+            properties.update(HANDLES.properties(handles))  # 格式错误，各自返回 error
+            continue
+        with WORKERS.window_lock(hwnd):
+            properties.update(HANDLES.properties(handles, tuple(data.fields or FIELDS)))
+    return {"status": "ok", "properties": properties}
 
-        try:
-            post_wm_close(pid); time.sleep(1)
-        except: pass
+@app.get("/ui/handles/stats")
+def browse_handles_stats():
+    """句柄缓存的条数、命中/未命中、失效、按 RuntimeId 找回的次数与淘汰计数"""
+    return HANDLES.stats()
 
-        try:
-            subprocess.run(
-                ["taskkill", "/PID", str(pid), "/T", "/F"],
-                check=True, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
-            )
-            results.append({"pid": pid, "status": "ok", "message": "Terminated via taskkill"})
-        except subprocess.CalledProcessError:
-            success = terminate_process_tree(pid)
-            results.append({
-                "pid": pid,
-                "status": "ok" if success else "error",
-                "message": "Terminated via psutil fallback" if success else "Both methods failed"
-            })
+@app.post("/close_app")
+@WORKERS.endpoint
+def close_app(data: CloseModel):
+    print(f"Closing app with PID: {data.pid}")
+    report = terminate([data.pid], deadline=data.deadline, graceful=data.graceful, close_windows=close_windows)
+    print(f"Closed PID {data.pid} and its tree in {report['elapsed']}s")
+    # 主 pid 的结果决定整体状态，子孙进程的结果放在 results 中
+    main = next(result for result in report["results"] if result["pid"] == data.pid)
+    status = {"exited": "ok", "killed": "ok", "not_running": "ok", "skipped": "skipped"}.get(main["status"], "error")
+    return {"status": status, "pid": data.pid, "message": main.get("message", main["status"]), **report}
 
-    return {"results": results}
+@app.post("/close_apps")
+@WORKERS.endpoint
+def close_apps(data: CloseListModel):
+    """一次性关闭全部 pid：同一个截止时间内等待退出，残留进程再强杀进程树"""
+    print(f"Closing PIDs: {data.pids}")
+    report = terminate(data.pids, deadline=data.deadline, graceful=data.graceful, close_windows=close_windows)
+    print(f"Closed {len(report['results'])} processes in {report['elapsed']}s")
+    return report
 
 @app.post("/get_processes_by_exe")
 def get_processes_by_exe(data: PathModel):
     """获取运行指定可执行文件的所有进程"""
     exe_path = os.path.abspath(data.path)
-    processes = []
     
     try:
-        for proc in psutil.process_iter(['pid', 'exe', 'name', 'create_time']):
-            try:
-                if proc.info['exe'] and os.path.samefile(proc.info['exe'], exe_path):
-                    processes.append({
-                        "pid": proc.info['pid'],
-                        "name": proc.info['name'],
-                        "exe": proc.info['exe'],
-                        "create_time": proc.info['create_time']
-                    })
-            except (psutil.NoSuchProcess, psutil.AccessDenied, FileNotFoundError):
-                continue
+        processes = PROCESSES.processes_for_exe(exe_path)
     except Exception as e:
         return JSONResponse(status_code=500, content={"error": str(e), "status": "error"})
     
     return {"processes": processes, "count": len(processes)}
 
+@app.get("/events")
+async def lifecycle_events(request: Request, exe: str | None = None, pids: str = ""):
+    """SSE：推送跟踪中的进程树的 process_spawn / process_exit 与 window_open / window_close 事件
+
+    跟踪范围：exe 对应的全部进程 + pids（逗号分隔）+ 它们的子孙，新派生的子进程自动加入。
+    首条为 hello 事件，带当前跟踪的 pid 列表；空闲时每 15 秒发一行注释作为心跳。
+    """
+    try:
+        pid_list = parse_pids(pids)
+    except ValueError as e:
+        return JSONResponse(status_code=400, content={"error": str(e), "status": "error"})
+    exe_path = os.path.abspath(exe) if exe else None
+    # 先订阅再补充已存在的进程，两步之间派生的进程不会丢
+    subscription = EVENTS.subscribe(PROCESSES.normalize(exe_path) if exe_path else None, pid_list)
+
+    def existing():
+        roots = set(pid_list) | (PROCESSES.pids_for_exe(exe_path) if exe_path else set())
+        return PROCESSES.related(roots)
+
+    tracked = await asyncio.to_thread(existing)
+    EVENTS.track(subscription, tracked)
+    print(f"Event subscriber connected: exe={exe_path}, tracking {sorted(tracked)}")
+
+    async def stream():
+        try:
+            yield format_sse({"type": "hello", "pid": None, "pids": sorted(tracked), "time": time.time()})
+            idle = 0.0
+            while not await request.is_disconnected():
+                event = await asyncio.to_thread(subscription.get, 1.0)
+                if event is not None:
+                    idle = 0.0
+                    yield format_sse(event)
+                else:
+                    idle += 1.0
+                    if idle >= 15:
+                        idle = 0.0
+                        yield ": keepalive\n\n"
+        finally:
+            EVENTS.unsubscribe(subscription)
+            print(f"Event subscriber disconnected: exe={exe_path}")
+
+    return StreamingResponse(stream(), media_type=SSE_MEDIA_TYPE)
+
+@app.get("/events/stats")
+def lifecycle_events_stats():
+    return EVENTS.stats()
+
+@app.get("/process_table/stats")
+def process_table_stats():
+    """进程表的刷新次数/耗时、新增与退出进程计数、路径规范化未命中次数"""
+    return PROCESSES.stats()
+
 @app.post("/get_ui")
+@WORKERS.endpoint
 def get_ui(data: PIDModel):
     try:
         root = uiauto.GetRootControl()
@@ -545,18 +803,19 @@ def get_ui(data: PIDModel):
             return JSONResponse(status_code=404, content={"error": f"No window found with pid {data.pid}"})
 
         info_list = []
-        for ctrl in target_window.GetChildren():
-            rect = ctrl.BoundingRectangle
-            info_list.append({
-                "name": ctrl.Name,
-                "control_type": ctrl.ControlTypeName,
-                "rect": {
-                    "left": rect.left,
-                    "top": rect.top,
-                    "right": rect.right,
-                    "bottom": rect.bottom
-                }
-            })
+        with WORKERS.window_lock(target_window.NativeWindowHandle):
+            for ctrl in target_window.GetChildren():
+                rect = ctrl.BoundingRectangle
+                info_list.append({
+                    "name": ctrl.Name,
+                    "control_type": ctrl.ControlTypeName,
+                    "rect": {
+                        "left": rect.left,
+                        "top": rect.top,
+                        "right": rect.right,
+                        "bottom": rect.bottom
+                    }
+                })
         return {
             "app_name": target_window.Name,
             "pid": data.pid,
@@ -566,6 +825,7 @@ def get_ui(data: PIDModel):
         return JSONResponse(status_code=500, content={"error": str(e)})
 
 @app.post("/click")
+@WORKERS.endpoint
 def click(data: CoordModel):
     try:
         uiauto.Click(data.x, data.y)
@@ -580,6 +840,16 @@ if __name__ == "__main__":
     import sys
     parser = argparse.ArgumentParser()
     parser.add_argument("--shared-dir", default="shared", help="Shared directory for screenshots")
+    parser.add_argument("--spill", action="store_true", help="Spill screenshots evicted from memory into --shared-dir")
+    parser.add_argument("--store-max-mb", type=int, default=256, help="Memory budget of the screenshot store")
+    parser.add_argument("--store-max-items", type=int, default=64, help="Max screenshots kept in memory")
+    parser.add_argument("--store-ttl", type=float, default=300.0, help="Seconds before an undownloaded screenshot expires")
+    parser.add_argument("--uia-workers", type=int, default=4, help="Number of COM-initialized UIA worker threads")
     args = parser.parse_args()
     SHARED_DIR = args.shared_dir
+    STORE.max_bytes = args.store_max_mb * 1024 * 1024
+    STORE.max_items = args.store_max_items
+    STORE.ttl = args.store_ttl
+    STORE.set_spill_dir(SHARED_DIR if args.spill else None)
+    WORKERS.size = args.uia_workers
     uvicorn.run(app, host="0.0.0.0", port=5000)
\ No newline at end of file
@@ -1,86 +1,213 @@
-import random
+import copy
+import io
+import threading
 import time
 import json
 from pathlib import Path
-import requests
 import uiautomation as uiauto
-from PIL import ImageGrab
-import psutil
 import os
+import utils  # noqa: F401  (puts client/ on sys.path for the shared format modules)
+from tree_format import read_ndjson_tree, iter_tree, transform_rects, unmap_point, ColumnarTree, TreeSync
+from capture_format import unpack_bundle
+from screen import persistable
+from events import iter_sse
+from dedup import DedupIndex
+from rpc_client import RpcClient
+from pipeline import Pipeline, Stage
+from overlay import render_overlay, overlay_path_for
+from shards import ShardWriter
+from element_table import ElementTable
+from spatial import SpatialIndex
 
 class AutoClicker:
-    def __init__(self, vm_ip="127.0.0.1", app_config=None):
+    def __init__(self, vm_ip="127.0.0.1", app_config=None, port=5000):
         self.vm_ip = vm_ip
+        self.rpc = RpcClient(vm_ip, port)
         self.app_config = app_config
         self.pid = None
         self.data_dir = None
         self.related_pids = set()
+        self._pids_lock = threading.Lock()
+        # /events subscription that keeps related_pids current
+        self._events_stop = None
+        self._events_response = None
+        self._events_connected = threading.Event()
         self.app_exe_path = None
+        self.dedup = None
+        # Background writer used by save_data while run() is active
+        self.writer = None
+        # Shard output backend (app_config["output"] == "shards")
+        self.shards = None
+        # Spatial index of the last get_clickable_elements() tree, and id(element) -> row in it
+        self.spatial = None
+        self._click_targets = {}
+        self._click_transform = None  # meta["transform"] of the tree the click targets came from
+        # Last full (untransformed) JSON tree and its version; /capture then only sends deltas
+        self.tree_sync = TreeSync()
         self.enabled_types = [
             'ButtonControl', 'CheckBoxControl', 'ComboBoxControl', 'ScrollBarControl',
             'RadioButtonControl', 'HyperlinkControl', 'MenuItemControl', 'PaneControl',
             'TextControl', 'JavaControl', 'SwingControl', 'UwpButton', 'UwpText', 'TreeItemControl'
         ]
+        self.clickable_types = [
+            'ButtonControl', 'CheckBoxControl', 'ComboBoxControl', 'ScrollBarControl',
+            'RadioButtonControl', 'HyperlinkControl','ListItemControl','MenuItemControl','TreeItemControl'
+        ]
+        # Server-side pruning for /get_ui_tree. Saved layouts are full trees by default; an app
+        # opts in via app_config["prune"], e.g. {"drop_offscreen": True, "drop_empty": True,
+        # "clickable_types": [...]}
+        self.prune = {}
 
     def set_app(self, app_config):
         self.app_config = app_config
 
-    def _post(self, route, payload=None):
-        return requests.post(f"http://{self.vm_ip}:5000/{route}", json=payload or {})
+    def _post(self, route, payload=None, **kwargs):
+        return self.rpc.post(route, payload, **kwargs)
 
     def _get_processes_by_exe(self, exe_path):
-        exe_name = os.path.basename(exe_path).lower()
-        pids = set()
-        for proc in psutil.process_iter(['pid', 'name']):
-            try:
-                if proc.info['name'] and proc.info['name'].lower() == exe_name:
-                    pids.add(proc.info['pid'])
-            except (psutil.NoSuchProcess, psutil.AccessDenied):
-                continue
-        return pids
+        """PIDs running exe_path on the VM, answered from the server's process table."""
+        try:
+            r = self._post("get_processes_by_exe", {"path": exe_path})
+            if r.status_code == 200:
+                return {proc["pid"] for proc in r.json()["processes"]}
+            print(f"Process lookup failed: {r.status_code}")
+        except Exception as e:
+            print(f"Error looking up processes: {e}")
+        return set()
 
     def _update_related_pids(self):
+        """One-off lookup, only used when the /events subscription is not connected."""
         if self.app_exe_path:
-            pids = self._get_processes_by_exe(self.app_exe_path)
-            self.related_pids.update(pids)
+            self._track(self._get_processes_by_exe(self.app_exe_path))
+
+    def _track(self, pids):
+        # related_pids is rebound rather than mutated so readers can iterate it without the lock
+        with self._pids_lock:
+            self.related_pids = self.related_pids | set(pids)
+
+    def _untrack(self, pid):
+        with self._pids_lock:
+            self.related_pids = self.related_pids - {pid}
+
+    def _start_event_listener(self, timeout=5):
+        """Subscribe to the VM's /events stream for this exe and keep related_pids current.
+
+        Returns True once the subscription is connected (its hello event has arrived).
+        """
+        self._stop_event_listener()
+        self._events_connected.clear()
+        stop = threading.Event()
+        self._events_stop = stop
+        threading.Thread(target=self._follow_events, args=(stop,), daemon=True).start()
+        return self._events_connected.wait(timeout)
+
+    def _stop_event_listener(self):
+        if self._events_stop:
+            self._events_stop.set()
+            self._events_stop = None
+        response, self._events_response = self._events_response, None
+        if response is not None:
+            try:
+                response.close()
+            except Exception:
+                pass
 
-    def _wait_for_process_and_ui(self, max_wait_time=10):
-        """Wait for the process to start and UI to be available."""
-        start_time = time.time()
-        
-        while time.time() - start_time < max_wait_time:
-            self._update_related_pids()
-            
-            if self.related_pids:
-                print(f"Found processes: {self.related_pids}")
-                time.sleep(1)  # Wait for UI to load
-                
-                ui_tree = self.fetch_ui_tree()
-                if ui_tree:
-                    print("UI tree successfully retrieved")
-                    return True
-                else:
-                    print("UI tree not available yet, continuing to wait...")
-            
-            time.sleep(0.5)
-        
-        return False
+    def _follow_events(self, stop):
+        while not stop.is_set():
+            try:
+                with self.rpc.get("events", params={"exe": self.app_exe_path}, stream=True) as r:
+                    if r.status_code != 200:
+                        print(f"Event subscription failed: {r.status_code}")
+                        return
+                    self._events_response = r
+                    for event in iter_sse(r.iter_lines()):
+                        if stop.is_set():
+                            return
+                        self._on_event(event)
+            except Exception as e:
+                if stop.is_set():
+                    return
+                print(f"Event stream interrupted ({e}), reconnecting...")
+            self._events_connected.clear()
+            stop.wait(1)
+
+    def _on_event(self, event):
+        kind = event["type"]
+        if kind == "hello":
+            self._track(event["pids"])
+            self._events_connected.set()
+        elif kind == "process_spawn":
+            print(f"Process started: {event['name']} (PID {event['pid']}, parent {event['ppid']})")
+            self._track({event["pid"]})
+        elif kind == "process_exit":
+            self._untrack(event["pid"])
+        elif kind == "window_open":
+            print(f"Window opened: '{event['title']}' (PID {event['pid']})")
+
+    def wait_stable(self):
+        """Block until the app's UI tree and window pixels stop changing (server-side /wait_stable).
+
+        Options (quiet, timeout, interval, check_tree, check_screen, screen_tolerance) come from
+        app_config["stable"]. Falls back to sleeping app_config["wait_time"] if the call fails.
+        """
+        try:
+            r = self._post("wait_stable", {
+                "name": self.app_config["app_name"],
+                "path": self.app_exe_path,
+                "pids": list(self.related_pids),
+                **self.app_config.get("prune", self.prune),
+                **self.app_config.get("stable", {})
+            }, timeout=(5, self.app_config.get("stable", {}).get("timeout", 15) + 15))
+            if r.status_code == 200:
+                result = r.json()
+                print(f"UI {'settled' if result['stable'] else 'still changing'} after {result['elapsed']}s")
+                return result
+            print(f"wait_stable failed: {r.status_code}")
+        except Exception as e:
+            print(f"Error waiting for UI to settle: {e}")
+        time.sleep(self.app_config.get("wait_time", 3))
+        return None
+
+    def query(self, selector, limit=None):
+        """Nodes of the app's current UI tree matching selector (server-side /query, see tree_query.py).
+
+        Returns a flat list of node dicts with id / parent_id / path, or [] if the call fails.
+        """
+        try:
+            r = self._post("query", {
+                "name": self.app_config["app_name"],
+                "path": self.app_exe_path,
+                "pids": list(self.related_pids),
+                **self.app_config.get("prune", self.prune),
+                "selector": selector,
+                "limit": limit,
+            })
+            if r.status_code == 200:
+                return r.json()["matches"]
+            print(f"Query {selector!r} failed: {r.status_code} {r.text[:200]}")
+        except Exception as e:
+            print(f"Error querying UI tree: {e}")
+        return []
 
     def open_app(self):
         self.app_exe_path = self.app_config["exe_path"]
-        before = self._get_processes_by_exe(self.app_exe_path)
+        # 先订阅再启动：启动器派生的子进程都会以 process_spawn 事件推送过来
+        connected = self._start_event_listener()
+        if not connected:
+            print("Event stream unavailable, falling back to a one-off process lookup")
 
         r = self._post("open_app", {"path": self.app_exe_path})
         data = r.json()
         if data.get('status') not in ('launched', 'already running'):
             print("Launch failed:", data)
+            self._stop_event_listener()
             return None
 
         self.pid = data['pid']
-        self.related_pids = {self.pid}
-        time.sleep(2)
-        # 收集所有相关进程
-        self.related_pids |= self._get_processes_by_exe(self.app_exe_path) - before
+        self._track({self.pid})
+        self.wait_stable()
+        if not connected:
+            self._update_related_pids()
         print(f"Tracking PIDs: {self.related_pids}")
         return data
 
@@ -88,41 +215,97 @@ class AutoClicker:
         if not self.related_pids and self.pid:
             self.related_pids = {self.pid}
 
-        exe_name = os.path.basename(self.app_exe_path) if self.app_exe_path else None
-        for pid in list(self.related_pids):
-            payload = {"pid": pid, **({"exe_name": exe_name} if exe_name else {})}
-            r = self._post("close_app", payload)
-            print(f"close_app→ PID {pid}: {r.json()}")
-
-        time.sleep(2)
-        # 强杀残留进程
-        rem = self._get_processes_by_exe(self.app_exe_path)
+        # One batch call: graceful close for every window, one shared deadline, tree kill for survivors
+        r = self._post("close_apps", {"pids": list(self.related_pids),
+                                      "deadline": self.app_config.get("close_deadline", 5.0)})
+        report = r.json()
+        for result in report.get("results", []):
+            print(f"close_apps→ PID {result['pid']}: {result['status']} ({result.get('method', '-')}, "
+                  f"{result.get('elapsed')}s)")
+        print(f"Closed in {report.get('elapsed')}s")
+
+        # 残留的同 exe 进程（未被跟踪到的）在 VM 上直接强杀
+        rem = self._get_processes_by_exe(self.app_exe_path) if self.app_exe_path else set()
         if rem:
             print("Force killing remaining:", rem)
-            for pid in rem:
-                try:
-                    psutil.Process(pid).kill()
-                except Exception:
-                    pass
+            self._post("close_apps", {"pids": list(rem), "graceful": False})
 
-        self.related_pids.clear()
+        self._stop_event_listener()
+        self.related_pids = set()
         self.pid = None
 
-    def capture_screenshot(self):
-        """Capture a screenshot of the current screen."""
+    def capture(self, on_node=None):
+        """Grab the screenshot and the UI tree back to back in one /capture round trip.
+
+        Returns (image_bytes, ui_tree, meta) or (None, None, None); on_node(node) is called
+        for every node. Screenshot options (format, target size, crop_to_window) come from
+        app_config["screenshot"]; rects are mapped into the cropped/scaled image space.
+        For JSON trees the version of the last tree is sent as "since", so the server
+        only returns a delta that is patched onto self.tree_sync.
+        """
         try:
-            response = self._post("screenshot")
-            if response.status_code == 200:
-                return response.json()
+            if not self.related_pids:
+                self._update_related_pids()
+            r = self._post("capture", {
+                "name": self.app_config["app_name"],
+                "path": self.app_exe_path,
+                "pids": list(self.related_pids),
+                "format": self.app_config.get("tree_format", "json"),
+                "screenshot": self.app_config.get("screenshot", {}),
+                "since": self.tree_sync.version,
+                **self.app_config.get("prune", self.prune)
+            })
+            if r.status_code != 200:
+                print(f"Capture failed: {r.status_code}")
+                return None, None, None
+
+            meta, parts = unpack_bundle(r.content)
+            _, img_bytes = parts["screenshot"]
+            # raw frames carry no size of their own, so they are stored as PNG
+            img_bytes, meta["format"] = persistable(img_bytes, meta["format"], meta["width"], meta["height"])
+            if "ui_delta" in parts:
+                delta = json.loads(parts["ui_delta"][1].decode("utf-8"))
+                try:
+                    ui_tree = self.tree_sync.update(meta["version"], base=meta["base"], delta=delta)
+                except (ValueError, KeyError) as e:
+                    # Local copy out of sync with the server: drop it and fetch a full tree next time
+                    print(f"Cannot apply UI tree delta ({e}), falling back to a full tree")
+                    self.tree_sync = TreeSync()
+                    return None, None, None
+                print(f"UI tree delta: {len(parts['ui_delta'][1])} bytes")
             else:
-                print(f"Screenshot failed: {response.status_code}")
-                return None
+                tree_type, tree_bytes = parts["ui_tree"]
+                if tree_type == "application/json":
+                    ui_tree = self.tree_sync.update(meta["version"], json.loads(tree_bytes.decode("utf-8")))
+                else:
+                    ui_tree = ColumnarTree.from_bytes(tree_bytes)
+            transform = meta["transform"]
+            if (transform["offset_x"], transform["offset_y"], transform["scale_x"], transform["scale_y"]) != (0, 0, 1, 1):
+                # Keep the synced tree in screen coordinates so later deltas still apply
+                ui_tree = copy.deepcopy(ui_tree) if isinstance(ui_tree, dict) else ui_tree
+                transform_rects(ui_tree, transform)
+            if isinstance(ui_tree, ColumnarTree):
+                nodes = (ui_tree.node(i) for i in range(len(ui_tree)))
+            else:
+                nodes = iter_tree(ui_tree)
+            if on_node:
+                for node in nodes:
+                    on_node(node)
+            print(f"Captured {meta['node_count']} nodes, tree finished "
+                  f"{meta['tree_end'] - meta['screenshot_time']:.3f}s after the frame")
+            return img_bytes, ui_tree, meta
         except Exception as e:
-            print(f"Error capturing screenshot: {e}")
-            return None
+            print(f"Error capturing: {e}")
+            return None, None, None
+
+    def fetch_ui_tree(self, on_node=None):
+        """Fetch the UI tree of the application.
 
-    def fetch_ui_tree(self):
-        """Fetch the UI tree of the application."""
+        The tree is streamed as NDJSON and assembled while the server is still
+        extracting; on_node(node) is called for every node as it arrives.
+        With app_config["tree_format"] == "v2" the compact columnar tree is
+        fetched instead and a ColumnarTree is returned.
+        """
         try:
             if not self.related_pids:
                 self._update_related_pids()
@@ -130,195 +313,288 @@ class AutoClicker:
             if not self.related_pids:
                 print("No related PIDs found for UI tree fetching")
                 return None
+
+            if self.app_config.get("tree_format") == "v2":
+                return self.fetch_ui_columns(on_node)
                 
-            r = self._post("get_ui_tree", {
+            r = self._post("get_ui_tree/stream", {
                 "name": self.app_config["app_name"],
                 "path": self.app_exe_path,
-                "pids": list(self.related_pids)
-            })
+                "pids": list(self.related_pids),
+                **self.app_config.get("prune", self.prune)
+            }, stream=True)
             
             if r.status_code != 200:
                 print(f"UI tree request failed: {r.status_code}")
                 return None
                 
-            response_data = r.json()
-            if response_data.get('status') == 'ok':
-                return response_data.get('ui_tree')
-            else:
-                print(f"UI tree fetch failed: {response_data.get('error', 'Unknown error')}")
-                return None
+            with r:
+                ui_tree, _, trailer = read_ndjson_tree(r.iter_lines(), on_node)
+            print(f"UI tree received: {trailer.get('count')} nodes in {trailer.get('elapsed')}s")
+            return ui_tree
                 
         except Exception as e:
             print(f"Error fetching UI tree: {e}")
             return None
 
-    def get_clickable_elements(self, ui_tree):
-        """Extract clickable elements from the UI tree, ignoring empty rects."""
-        clickable_types = [
-            'ButtonControl', 'CheckBoxControl', 'ComboBoxControl', 'ScrollBarControl',
-            'RadioButtonControl', 'HyperlinkControl','ListItemControl','MenuItemControl','TreeItemControl'
-        ]
-        elements = []
-
-        def traverse(node):
-            if not node or not node.get('rect'):
-                return
-            ctype = node['control_type']
-            visible = not node.get('is_offscreen', False)
-            rect = node['rect']
-            width  = rect['right']  - rect['left']
-            height = rect['bottom'] - rect['top']
-
-            # only keep if it’s a real, non‑zero‑sized control
-            if (ctype in clickable_types
-                    and visible
-                    and width  > 0
-                    and height > 0):
-                elements.append(node)
-
-            for child in node.get('children', []):
-                traverse(child)
-
-        traverse(ui_tree)
+    def fetch_ui_columns(self, on_node=None):
+        """Fetch the UI tree in the v2 columnar binary format."""
+        r = self._post("get_ui_tree", {
+            "name": self.app_config["app_name"],
+            "path": self.app_exe_path,
+            "pids": list(self.related_pids),
+            "format": "v2",
+            **self.app_config.get("prune", self.prune)
+        })
+        if r.status_code != 200:
+            print(f"UI tree request failed: {r.status_code}")
+            return None
+        columns = ColumnarTree.from_bytes(r.content)
+        print(f"UI tree received: {len(columns)} nodes, {len(r.content)} bytes (v2)")
+        if on_node:
+            for i in range(len(columns)):
+                on_node(columns.node(i))
+        return columns
+
+    def get_clickable_elements(self, ui_tree, transform=None):
+        """Extract clickable elements from the UI tree, ignoring empty rects.
+
+        transform is the capture's meta["transform"] when the tree's rects were mapped into
+        the cropped/scaled image; click_element maps click points back to screen coordinates.
+
+        Filtering runs on an ElementTable; boxes that overlap an already kept one at
+        IoU >= app_config["dedup_iou"] (default 0.9, 0 disables) are dropped, keeping
+        the deepest control, so stacked wrapper nodes yield a single click target.
+        With app_config["drop_occluded"] (off by default), elements fully covered by a
+        later control (per SpatialIndex) are dropped too, and click_element aims at a
+        point that is not covered.
+        """
+        table = ElementTable.from_tree(ui_tree)
+        indices, boxes = table.select(self.clickable_types)
+        config = self.app_config or {}
+        iou = config.get("dedup_iou", 0.9)
+        if iou:
+            indices = table.dedup(indices, boxes, iou)
+        self.spatial = None
+        if config.get("drop_occluded", False):
+            self.spatial = SpatialIndex(table)
+            indices = indices[self.spatial.visible_mask()[indices]]
+        elements = [table.node(i) for i in indices]
+        self._click_targets = {id(element): i for element, i in zip(elements, indices.tolist())}
+        self._click_transform = transform
         return elements
 
-
     def click_element(self, element):
-        """Simulate a click on the given element."""
+        """Simulate a click on the given element.
+
+        With occlusion filtering on, elements from get_clickable_elements are clicked at a
+        point that is not covered (the centre when possible); otherwise at the rect centre.
+        """
         rect = element['rect']
         x = (rect['left'] + rect['right']) // 2
         y = (rect['top'] + rect['bottom']) // 2
+        target = self._click_targets.get(id(element))
+        if self.spatial is not None and target is not None:
+            point = self.spatial.click_point(target)
+            if point is None:
+                print(f"Element is fully occluded, not clicking: {rect}")
+                return False
+            x, y = point
+        if self._click_transform is not None:
+            # Rects are in image space after crop_to_window / resizing; clicks need screen space
+            x, y = unmap_point(x, y, self._click_transform)
         
-        pids_before_click = self._get_processes_by_exe(self.app_exe_path) if self.app_exe_path else set()
-        
+        # Processes spawned by the click reach related_pids through the /events subscription
         try:
             uiauto.Click(x, y)
             print(f"Clicked at ({x}, {y})")
-            
-            time.sleep(1)
-            
-            if self.app_exe_path:
-                pids_after_click = self._get_processes_by_exe(self.app_exe_path)
-                new_pids = pids_after_click - pids_before_click
-                if new_pids:
-                    print(f"New processes detected after click: {new_pids}")
-                    self.related_pids.update(new_pids)
-            
             return True
         except Exception as e:
             print(f"Click failed: {e}")
             return False
 
-    def save_data(self, ui_tree, ss_info, state, click_num):
-        """Save the UI tree and screenshot for a specific state and click number."""
+    def _start_writer(self):
+        """Dedup + file writes on one thread (keeps the index ordered), overlays on a small pool.
+
+        Both queues are bounded (app_config["writer"]["queue"], default 4), so save_data
+        blocks once the writer falls that far behind instead of buffering every capture.
+        With app_config["overlay"] set to False no overlay stage is created; render them
+        later with server/overlay.py. With app_config["output"] == "shards" samples are
+        appended to data/<app>/shards/ (see server/shards.py) and no overlays are drawn.
+        """
+        options = self.app_config.get("writer", {})
+        maxsize = options.get("queue", 4)
+        if self.app_config.get("output", "files") == "shards":
+            self.shards = ShardWriter(self.data_dir / "shards", options.get("shard_mb", 1024) << 20)
+        stages = [Stage("write", self._write_sample, workers=1, maxsize=maxsize)]
+        if self.app_config.get("overlay", True) and not self.shards:
+            stages.append(Stage("overlay", self._render_overlay, workers=options.get("overlay_workers", 2),
+                                maxsize=maxsize))
+        self.writer = Pipeline(stages, name="writer").start()
+
+    def _stop_writer(self):
+        """Flush every queued sample to disk and stop the writer threads."""
+        if self.writer:
+            self.writer.close()
+            print(f"Writer stats: {self.writer.stats()}")
+            self.writer = None
+        if self.shards:
+            self.shards.close()
+            self.shards = None
+
+    def save_data(self, ui_tree, img_bytes, state, click_num, image_format="png"):
+        """Queue the UI tree and encoded screenshot bytes for a specific state and click number.
+
+        Returns as soon as the sample is queued (blocking only when the writer queue is full);
+        files are written by the background writer. Without a running writer the sample is
+        written synchronously.
+        """
         ts = time.strftime("%Y%m%d_%H%M%S")
-        ss_path = self.data_dir / f"{state}_click_{click_num}_{ts}_screenshot.png"
-        layout_path = self.data_dir / f"{state}_click_{click_num}_{ts}_layout.json"
+        item = {"sample": f"{state}_click_{click_num}_{ts}", "ui_tree": ui_tree,
+                "img_bytes": img_bytes, "format": image_format}
+        if self.writer:
+            self.writer.submit(item)
+        else:
+            item = self._write_sample(item)
+            if item and self.app_config.get("overlay", True):
+                self._render_overlay(item)
+
+    def _write_sample(self, item):
+        """Writer stage: dedup check, then screenshot bytes and layout.
+
+        States already seen for this app (same tree structure, near-identical screenshot)
+        are skipped, or recorded as a *_ref.json pointing at the earlier sample when
+        app_config["dedup"] == "link". Returns the item for the overlay stage, or None.
+        """
+        sample, ui_tree, img_bytes = item["sample"], item["ui_tree"], item["img_bytes"]
+        ss_path = self.data_dir / f"{sample}_screenshot.{item['format']}"
+        layout_suffix = "uit" if isinstance(ui_tree, ColumnarTree) else "json"
+        layout_path = self.data_dir / f"{sample}_layout.{layout_suffix}"
+
+        seen = None
+        if self.dedup:
+            try:
+                duplicate_of, phash, thash = self.dedup.check(img_bytes, ui_tree)
+                if duplicate_of:
+                    print(f"Duplicate state, same as {duplicate_of}")
+                    if self.app_config.get("dedup") == "link":
+                        with open(self.data_dir / f"{sample}_ref.json", "w", encoding="utf-8") as f:
+                            json.dump({"duplicate_of": duplicate_of}, f, ensure_ascii=False)
+                    return None
+                seen = (phash, thash)
+            except Exception as e:
+                print(f"Dedup check failed, saving anyway: {e}")
+
+        if self.shards:
+            try:
+                layout = ui_tree.to_bytes() if isinstance(ui_tree, ColumnarTree) else \
+                    json.dumps(ui_tree, ensure_ascii=False).encode("utf-8")
+                self.shards.add(sample, (img_bytes, item["format"]), (layout, layout_suffix))
+                print(f"Sample appended to shard {self.shards.shard_no}: {sample}")
+                if seen:
+                    self.dedup.add(sample, *seen)
+            except Exception as e:
+                print(f"Error saving data: {e}")
+            return None
 
         try:
-            img_bytes = requests.get(ss_info['url']).content
             with open(ss_path, "wb") as f:
                 f.write(img_bytes)
             print(f"Screenshot saved: {ss_path}")
 
-            with open(layout_path, "w", encoding="utf-8") as f:
-                json.dump(ui_tree, f, ensure_ascii=False, indent=2)
+            if isinstance(ui_tree, ColumnarTree):
+                ui_tree.save(layout_path)
+            else:
+                with open(layout_path, "w", encoding="utf-8") as f:
+                    json.dump(ui_tree, f, ensure_ascii=False, indent=2)
             print(f"Layout saved: {layout_path}")
 
-            self.draw_ui_on_screenshot(ui_tree, ss_path)
+            if seen:
+                self.dedup.add(sample, *seen)
         except Exception as e:
             print(f"Error saving data: {e}")
+            return None
+        item["path"] = ss_path
+        return item
 
-    def draw_ui_on_screenshot(self, ui_tree, png_path):
-        """Draw UI elements on the screenshot and save as an overlay."""
-        from PIL import Image, ImageDraw
-        import os
-        from pathlib import Path
+    def _render_overlay(self, item):
+        """Overlay stage: draw from the in-memory screenshot, no re-read of the written file."""
+        from PIL import Image
 
-        try:
-            img = Image.open(png_path).convert("RGB")
-            draw = ImageDraw.Draw(img)
-            
-            font = None
-            COLORS = [(255, 0, 0), (0, 255, 0), (0, 0, 255), (255, 255, 0), (255, 0, 255), (0, 255, 255)]
+        with Image.open(io.BytesIO(item["img_bytes"])) as image:
+            self.draw_ui_on_screenshot(item["ui_tree"], item["path"], image=image)
 
-            def _traverse(node):
-                if not node or not node.get('rect'):
-                    return
-                bbox = node['rect']
-                depth = node.get('depth', 0)
-                ctype = node.get('control_type', 'Unknown')
-                visible = not node.get('is_offscreen', False)
-
-                if ctype in self.enabled_types and visible:
-                    try:
-                        left, top, right, bottom = bbox['left'], bbox['top'], bbox['right'], bbox['bottom']
-                        if (left < 0 or top < 0 or right > img.width or bottom > img.height):
-                            print(f"Skipping element with out-of-bounds coordinates: {bbox}")
-                            return
-                        
-                        color = COLORS[depth % len(COLORS)]
-                        draw.rectangle([left, top, right, bottom], outline=color)
-                        draw.text((left, top), ctype, fill=color, font=font)
-                    except Exception as e:
-                        print(f"Draw error for element '{ctype}' at depth {depth}: {str(e)}")
+    def draw_ui_on_screenshot(self, ui_tree, png_path, image=None):
+        """Draw UI elements on the screenshot and save as an overlay.
 
-                for child in node.get('children', []):
-                    _traverse(child)
-
-            _traverse(ui_tree)
-            
-            overlay_path = Path(png_path).with_stem(Path(png_path).stem + "_overlay")
-            img.save(overlay_path)
-            print(f"Overlay saved: {overlay_path}")
-            
+        image is an already decoded PIL image of png_path; when omitted the file is opened.
+        """
+        try:
+            render_overlay(ui_tree, png_path, self.enabled_types, image=image,
+                           drop_occluded=(self.app_config or {}).get("drop_occluded", False))
+            print(f"Overlay saved: {overlay_path_for(png_path)}")
         except Exception as e:
             print(f"Error creating overlay: {e}")
 
     def run(self):
-        """Execute the auto-clicking process, capturing initial state before the loop."""
+        """Execute the auto-clicking process, capturing initial state before the loop.
+
+        Returns True when the initial state was captured and the click loop ran.
+        """
         if not self.app_config:
             print("App config not set")
-            return
+            return False
 
         BASE_DIR = Path(__file__).resolve().parent.parent
         DATA_ROOT = BASE_DIR / "data" / self.app_config["app_name"]
         DATA_ROOT.mkdir(parents=True, exist_ok=True)
         self.data_dir = DATA_ROOT
+        if self.app_config.get("dedup", "skip") != "off":
+            self.dedup = DedupIndex(DATA_ROOT / "dedup_index.json")
 
+        self._start_writer()
+        try:
+            return self._collect()
+        finally:
+            self._stop_writer()
+            if self.dedup:
+                self.dedup.close()
+                print(f"Dedup report: {self.dedup.report()}")
+            print(f"RPC stats: {self.rpc.stats()}")
+
+    def _collect(self):
+        """Initial capture, then the click loop; samples go to the background writer."""
         print("Capturing initial state...")
         if not self.open_app():
             print("Failed to open application")
-            return
-        
-        time.sleep(self.app_config.get("wait_time", 3))   ###
-        
-        ss_info_initial = None
+            return False
+
+        img_initial = None
         ui_tree_initial = None
+        meta_initial = None
         
+        clickable_elements = []
         for attempt in range(3):
             print(f"Attempt {attempt + 1} to capture initial state...")
-            ss_info_initial = self.capture_screenshot()
-            ui_tree_initial = self.fetch_ui_tree()
+            img_initial, ui_tree_initial, meta_initial = self.capture()
             
-            if ss_info_initial and ui_tree_initial:
+            if img_initial and ui_tree_initial:
                 print("Successfully captured initial state")
                 break
             else:
                 print(f"Failed attempt {attempt + 1}, waiting before retry...")
-                time.sleep(5)
+                self.wait_stable()
         
-        if ss_info_initial and ui_tree_initial:
-            self.save_data(ui_tree_initial, ss_info_initial, "initial", 0)
-            clickable_elements = self.get_clickable_elements(ui_tree_initial)
+        if img_initial and ui_tree_initial:
+            clickable_elements = self.get_clickable_elements(ui_tree_initial, meta_initial["transform"])
+            self.save_data(ui_tree_initial, img_initial, "initial", 0, meta_initial["format"])
             print(f"Found {len(clickable_elements)} clickable elements")
         else:
             print("Failed to capture initial state after multiple attempts")
             self.close_app()
-            return      
+            return False
         
         self.close_app()
-        time.sleep(5)
 
         for i in range(1, 16):
             print(f"Starting click {i}...")
@@ -326,9 +602,7 @@ class AutoClicker:
             if not self.open_app():
                 print(f"Failed to open app for click {i}")
                 continue
-                
-            time.sleep(self.app_config.get("wait_time", 3))
-            
+
             if not clickable_elements:
                 print(f"No clickable elements found for click {i}")
                 self.close_app()
@@ -338,12 +612,11 @@ class AutoClicker:
             # print(f"Clicking element: {element_to_click.get('control_type', 'Unknown')}")
             
             # if self.click_element(element_to_click):
-            #     time.sleep(5)
-            #     ss_info_after = self.capture_screenshot()
-            #     ui_tree_after = self.fetch_ui_tree()
+            #     self.wait_stable()
+            #     img_after, ui_tree_after, meta_after = self.capture()
                 
-            #     if ss_info_after and ui_tree_after:
-            #         self.save_data(ui_tree_after, ss_info_after, "after", i)
+            #     if img_after and ui_tree_after:
+            #         self.save_data(ui_tree_after, img_after, "after", i, meta_after["format"])
             #         print(f"Successfully captured state after click {i}")
             #     else:
             #         print(f"Failed to capture state after click {i}")
@@ -351,21 +624,20 @@ class AutoClicker:
             #     print(f"Click action failed for click {i}")
             
             ###
-            time.sleep(5)  ##
-            ss_info_after = self.capture_screenshot()
-            ui_tree_after = self.fetch_ui_tree()
+            self.wait_stable()
+            img_after, ui_tree_after, meta_after = self.capture()
                 
-            if ss_info_after and ui_tree_after:
-                self.save_data(ui_tree_after, ss_info_after, "after", i)
+            if img_after and ui_tree_after:
+                self.save_data(ui_tree_after, img_after, "after", i, meta_after["format"])
                 print(f"Successfully captured state after click {i}")
             else:
                 print(f"Failed to capture state after click {i}")
             ###
 
             self.close_app()
-            time.sleep(5)
         
         print("Auto-clicking process completed")
+        return True
 
 if __name__ == "__main__":
     # app_infos = {
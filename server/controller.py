@@ -1,14 +1,17 @@
-import requests, json, time, logging
+import requests, json, time, logging, copy
 from pathlib import Path
-from PIL import Image, ImageDraw
-from utils import COLORS
+import utils  # noqa: F401  (puts client/ on sys.path for the shared format modules)
+from tree_format import read_ndjson_tree, transform_rects, ColumnarTree, TreeSync
+from capture_format import unpack_bundle
+from screen import persistable
+from rpc_client import RpcClient
+from overlay import render_overlay, overlay_path_for
 
 # ---------------- logging ----------------
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 # ---------------- 常量 ----------------
-B_COLORS = {idx: c for idx, c in enumerate(COLORS.keys())}
 ENABLED_TYPES = [
     'ButtonControl', 'CheckBoxControl', 'ComboBoxControl', 'ScrollBarControl',
     'RadioButtonControl', 'HyperlinkControl', 'MenuItemControl', 'PaneControl',
@@ -18,62 +21,52 @@ CLICK_TYPES = [
     'ButtonControl', 'CheckBoxControl', 'ComboBoxControl', 'ScrollBarControl', 
     'RadioButtonControl', 'HyperlinkControl'
 ]
+# /get_ui_tree 服务端裁剪。数据集默认保存完整树（NO_PRUNE）；应用配置中 "prune": PRUNE 时
+# 只取绘制需要的类型，屏幕外与空矩形直接在被控端丢弃
+NO_PRUNE = {}
+PRUNE = {
+    "include_types": ENABLED_TYPES,
+    "drop_offscreen": True,
+    "drop_empty": True,
+    "clickable_types": CLICK_TYPES,
+}
+# 限时提取。默认不限时（NO_BUDGET），总是取完整树；应用配置中 "extract": EXTRACT 时启用：
+# Qt 应用（QQMusic、WeMeet、bilibili）的 GetClickablePoint / GetChildren 可能长时间无响应，
+# 超过单次调用超时即放弃该调用，总预算用完时返回已取到的部分树（见 ui_tree.extract_budgeted）
+NO_BUDGET = {}
+EXTRACT = {
+    "budget": 40.0,
+    "call_timeout": 3.0,
+}
 
 # ---------------- 绘制辅助 ----------------
 def draw_ui_on_screenshot(ui_tree, png_path):
-    """在截屏上绘制 UI 边框，保存 *_overlay.png 并返回所有元素信息"""
-    img = Image.open(png_path)
-    draw = ImageDraw.Draw(img)
-    all_elements = []
-
-    def _traverse(node):
-        if not node or not node.get('rect'):
-            return
-        bbox = node['rect']
-        depth = min(node['depth'], len(B_COLORS) - 1)
-        ctype = node['control_type']
-        visible = not node.get('is_offscreen', False)
-
-        if ctype in ENABLED_TYPES and visible:
-            try:
-                draw.rectangle([bbox['left'], bbox['top'],
-                                bbox['right'], bbox['bottom']],
-                               outline=B_COLORS[depth])
-                draw.text((bbox['left'], bbox['top']), ctype,
-                          fill=B_COLORS[depth])
-                all_elements.append({
-                    "name": node['name'],
-                    "type": ctype,
-                    "bbox": bbox,
-                    "depth": node['depth'],
-                    "clickable": node['clickable'],
-                })
-            except Exception as e:
-                logger.error(f"Draw error: {e}")
-
-        for child in node.get('children', []):
-            _traverse(child)
-
-    _traverse(ui_tree)
-    overlay_path = Path(png_path).with_stem(Path(png_path).stem + "_overlay")
-    img.save(overlay_path)
-    logger.info(f"Overlay saved: {overlay_path}")
+    """在截屏上绘制 UI 边框，保存 *_overlay.png 并返回所有元素信息；ui_tree 可为嵌套 dict 或 ColumnarTree"""
+    all_elements = render_overlay(ui_tree, png_path, ENABLED_TYPES)
+    logger.info(f"Overlay saved: {overlay_path_for(png_path)}")
     return all_elements
 
 # ---------------- 主类 ----------------
 class UI_Extractor:
-    def __init__(self, vm_ip="127.0.0.1"):
+    def __init__(self, vm_ip="127.0.0.1", port=5000):
         self.vm_ip = vm_ip
+        self.rpc = RpcClient(vm_ip, port)  # keep-alive 连接池、按接口超时与重试
+        self.tree_sync = TreeSync()  # 上一棵完整树（屏幕坐标）及版本号，/capture 据此只返回差量
 
     # ---------- 配置 ----------
     def set_app(self, cfg):
         self.app_name = cfg.get("app_name", "app")
         self.exe_path = cfg.get("exe_path")
         self.wait_time = cfg.get("wait_time", 3)
+        self.prune = cfg.get("prune", NO_PRUNE)
+        self.extract = cfg.get("extract", NO_BUDGET)  # 限时提取选项，默认不限时
+        self.screenshot = cfg.get("screenshot", {})  # 截图选项，见被控端 ScreenshotOptions
+        self.stable = cfg.get("stable", {})  # 稳定等待选项，见被控端 WaitStableTask
+        self.overlay = cfg.get("overlay", True)  # False 时采集不绘制叠加图，之后用 server/overlay.py 离线渲染
 
     # ---------- 基础 RPC ----------
-    def _post(self, route, payload=None):
-        return requests.post(f"http://{self.vm_ip}:5000/{route}", json=payload or {})
+    def _post(self, route, payload=None, **kwargs):
+        return self.rpc.post(route, payload, **kwargs)
 
     def open_app(self):  # 启动
         r = self._post("open_app", {"path": self.exe_path}).json()
@@ -86,12 +79,65 @@ class UI_Extractor:
     def close_app(self, pid):  # 结束
         self._post("close_app", {"pid": pid})
 
+    def wait_stable(self, app_meta):  # 等待 UI 树与画面稳定，失败时退回固定等待 wait_time
+        try:
+            r = self._post("wait_stable", {**app_meta, **self.stable},
+                           timeout=(5, self.stable.get("timeout", 15) + 15))
+            if r.status_code == 200:
+                result = r.json()
+                logger.info(f"UI {'settled' if result['stable'] else 'still changing'} after {result['elapsed']}s")
+                return result
+            logger.warning(f"wait_stable failed: {r.status_code}")
+        except requests.RequestException as e:
+            logger.warning(f"wait_stable failed: {e}")
+        time.sleep(self.wait_time)
+        return None
+
     def capture_screenshot(self):  # 远程抓图
         return self._post("screenshot").json()
 
-    def fetch_ui_tree(self, app_meta):
-        r = self._post("get_ui_tree", app_meta).json()
-        return r.get('ui_tree') if r.get('status') == 'ok' else None
+    def capture(self, app_meta):  # 截图 + UI 树一次往返，返回 (png_bytes, ui_tree, meta)
+        r = self._post("capture", {**app_meta, "since": self.tree_sync.version})
+        if r.status_code != 200:
+            logger.error(f"Capture failed: {r.status_code}")
+            return None, None, None
+        meta, parts = unpack_bundle(r.content)
+        _, img_bytes = parts["screenshot"]
+        # raw 只用于传输，落盘前转成 PNG（见 screen.persistable）
+        img_bytes, meta["format"] = persistable(img_bytes, meta["format"], meta["width"], meta["height"])
+        if "ui_delta" in parts:
+            try:
+                ui_tree = self.tree_sync.update(meta["version"], base=meta["base"],
+                                                delta=json.loads(parts["ui_delta"][1].decode("utf-8")))
+            except (ValueError, KeyError) as e:
+                logger.warning(f"Cannot apply UI tree delta ({e}), next capture fetches a full tree")
+                self.tree_sync = TreeSync()
+                return None, None, None
+        else:
+            tree_type, tree_bytes = parts["ui_tree"]
+            if tree_type == "application/json":
+                ui_tree = self.tree_sync.update(meta["version"], json.loads(tree_bytes.decode("utf-8")))
+            else:
+                ui_tree = ColumnarTree.from_bytes(tree_bytes)
+        # 裁剪/缩放后把矩形换算到图像坐标，保证 layout 与截图对齐；换算在副本上做，同步的树保持屏幕坐标
+        if isinstance(ui_tree, dict):
+            ui_tree = copy.deepcopy(ui_tree)
+        transform_rects(ui_tree, meta["transform"])
+        return img_bytes, ui_tree, meta
+
+    def fetch_ui_tree(self, app_meta, on_node=None):  # 流式拉取 UI 树，边接收边拼装
+        r = self._post("get_ui_tree/stream", app_meta, stream=True)
+        if r.status_code != 200:
+            logger.error(f"UI tree request failed: {r.status_code}")
+            return None
+        try:
+            with r:
+                ui_tree, _, trailer = read_ndjson_tree(r.iter_lines(), on_node)
+        except ValueError as e:
+            logger.error(f"UI tree stream failed: {e}")
+            return None
+        logger.info(f"UI tree received: {trailer.get('count')} nodes in {trailer.get('elapsed')}s")
+        return ui_tree
 
     # ---------- 流程 ----------
     def init_task(self):
@@ -99,7 +145,7 @@ class UI_Extractor:
         if not meta:
             return False
         self.pid = meta['pid']
-        time.sleep(self.wait_time)
+        self.wait_stable({"name": self.app_name, "path": self.exe_path, "pids": [self.pid], **self.prune})
         return True
 
     def run_task(self):
@@ -111,26 +157,32 @@ class UI_Extractor:
         data_dir = DATA_ROOT / self.app_name
         data_dir.mkdir(parents=True, exist_ok=True)
 
-        # 2) 抓图并下载
-        ss_info = self.capture_screenshot()
-        if not ss_info or ss_info.get('status') != 'ok':
-            logger.error("Screenshot failed")
-            return
-        img_bytes = requests.get(ss_info['url']).content
-        ss_path = data_dir / f"{ts}_screenshot.png"
-        with open(ss_path, "wb") as f:
-            f.write(img_bytes)
-        logger.info(f"Screenshot saved: {ss_path}")
-
-        # 3) 获取 UI 树
-        ui_tree = self.fetch_ui_tree({
+        # 2) 截图与 UI 树一次采集（两者时间上背靠背，避免画面与树错位）
+        img_bytes, ui_tree, meta = self.capture({
             "name": self.app_name,
             "path": self.exe_path,
-            "pid": self.pid
+            "pids": [self.pid],
+            "screenshot": self.screenshot,
+            **self.prune,
+            **self.extract
         })
-        if not ui_tree:
-            logger.error("UI tree fetch failed")
-            return
+        if not img_bytes or not ui_tree:
+            logger.error("Capture failed")
+            return False
+        report = meta.get("extract")
+        if report and not report["complete"]:
+            slow = [f"{ctype} {stat['total_ms']:.0f}ms/{stat['timeouts']} timeouts"
+                    for ctype, stat in list(report["timings"].items())[:3]]
+            logger.warning(f"Partial UI tree: {report['truncated']} truncated, {report['timed_out']} timed out, "
+                           f"{report['unvisited']} unvisited; slowest types: {', '.join(slow)}")
+        logger.info(f"Captured {meta['node_count']} nodes, tree finished "
+                    f"{meta['tree_end'] - meta['screenshot_time']:.3f}s after the frame")
+
+        # 3) 保存截图
+        ss_path = data_dir / f"{ts}_screenshot.{meta['format']}"
+        with open(ss_path, "wb") as f:
+            f.write(img_bytes)
+        logger.info(f"Screenshot saved: {ss_path}")
 
         # 4) 保存 UI 树 JSON
         layout_path = data_dir / f"{ts}_layout.json"
@@ -139,9 +191,11 @@ class UI_Extractor:
         logger.info(f"Layout saved: {layout_path}")
 
         # 5) 可选：绘制可视化
-        draw_ui_on_screenshot(ui_tree, ss_path)
+        if self.overlay:
+            draw_ui_on_screenshot(ui_tree, ss_path)
 
         logger.info(f"All data written under: {data_dir}")
+        return True
 
     def end_task(self):
         if hasattr(self, 'pid'):
@@ -0,0 +1,81 @@
+"""采集状态去重：截图感知哈希（dHash）+ UI 树结构哈希
+
+同一应用的索引保存在 data/<app>/dedup_index.json，跨多次运行持续生效。
+新增样本先只记在内存中，每 save_every 条写一次文件，report() / close() 时写入剩余部分，
+避免长时间运行时每个样本都重写整个索引。
+两个状态视为重复：UI 树结构哈希相同，且截图 dHash 的汉明距离不超过阈值。
+两种哈希来自 client/state_hash.py，与被控端等待稳定时使用的完全一致。
+"""
+import json
+import os
+from pathlib import Path
+
+import utils  # noqa: F401  (puts client/ on sys.path for the shared format modules)
+from state_hash import dhash_bytes as image_dhash, hamming, tree_signature as tree_hash
+
+DEDUP_MODES = ("off", "skip", "link")
+
+
+class DedupIndex:
+    """每个应用一份的已见状态索引"""
+
+    def __init__(self, path, max_distance=4, save_every=50):
+        self.path = Path(path)
+        self.max_distance = max_distance
+        self.save_every = save_every
+        self._unsaved = 0
+        self.entries = []
+        self._by_tree = {}
+        self.checked = 0
+        self.duplicates = 0
+        if self.path.exists():
+            with open(self.path, "r", encoding="utf-8") as f:
+                for entry in json.load(f).get("entries", []):
+                    self._index(entry)
+
+    def _index(self, entry):
+        self.entries.append(entry)
+        self._by_tree.setdefault(entry["tree"], []).append(entry)
+
+    def check(self, img_bytes, ui_tree):
+        """返回 (duplicate_of, phash, thash)；duplicate_of 为已有样本名或 None"""
+        self.checked += 1
+        phash = image_dhash(img_bytes)
+        thash = tree_hash(ui_tree)
+        for entry in self._by_tree.get(thash, []):
+            if hamming(int(entry["phash"], 16), phash) <= self.max_distance:
+                self.duplicates += 1
+                return entry["sample"], phash, thash
+        return None, phash, thash
+
+    def add(self, sample, phash, thash):
+        self._index({"sample": sample, "phash": f"{phash:016x}", "tree": thash})
+        self._unsaved += 1
+        if self._unsaved >= self.save_every:
+            self.save()
+
+    def flush(self):
+        """有未写入的样本时保存"""
+        if self._unsaved:
+            self.save()
+
+    def close(self):
+        self.flush()
+
+    def save(self):
+        self._unsaved = 0
+        tmp_path = self.path.with_suffix(".tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"entries": self.entries}, f, ensure_ascii=False)
+        os.replace(tmp_path, self.path)
+
+    def report(self):
+        self.flush()
+        rate = self.duplicates / self.checked if self.checked else 0.0
+        return {
+            "checked": self.checked,
+            "duplicates": self.duplicates,
+            "unique": self.checked - self.duplicates,
+            "dedup_rate": round(rate, 3),
+            "known_states": len(self.entries),
+        }
@@ -0,0 +1,226 @@
+"""元素表：把一棵 UI 树展平为 NumPy 数组（框、深度、类型号、flags、父节点、子树终点），在数组上做筛选
+
+- 按类型 / 可见 / 面积 / 是否在画面内筛选，全部为向量运算，不逐个 dict 判断、不逐个打印
+- 先序排列 + 子树终点 end[i]（i 的子树为 [i, end[i])），可以整棵子树一起剔除
+- 把框裁剪到截图范围内
+- 基于 IoU 的重复框抑制：Qt / Electron 的树常有多层同一矩形的包装节点，只保留一个
+
+嵌套 dict（*_layout.json）与 ColumnarTree（*_layout.uit）都可输入；ColumnarTree 的列直接转成数组，不经过 dict。
+"""
+import numpy as np
+
+import utils  # noqa: F401  (puts client/ on sys.path for the shared format modules)
+from tree_format import (ColumnarTree, FLAG_ENABLED, FLAG_OFFSCREEN, FLAG_FOCUSABLE,
+                         FLAG_HAS_CLICKABLE, FLAG_CLICKABLE_OK)
+
+FLAG_NO_RECT = 128  # 嵌套树中没有 rect 的节点（框记为 0）
+
+
+def _node_flags(node):
+    flags = 0
+    if node.get("is_enabled"):
+        flags |= FLAG_ENABLED
+    if node.get("is_offscreen"):
+        flags |= FLAG_OFFSCREEN
+    if node.get("focusable"):
+        flags |= FLAG_FOCUSABLE
+    clickable = node.get("clickable")
+    if clickable is not None:
+        flags |= FLAG_HAS_CLICKABLE
+        if clickable[2]:
+            flags |= FLAG_CLICKABLE_OK
+    if not node.get("rect"):
+        flags |= FLAG_NO_RECT
+    return flags
+
+
+def subtree_ends(parent, depth):
+    """先序数组的子树终点：end[i] 为 i 的最后一个子孙下标 + 1；按深度自底向上逐层归并"""
+    n = len(parent)
+    end = np.arange(1, n + 1, dtype=np.int64)
+    if n == 0:
+        return end
+    order = np.argsort(depth, kind="stable")
+    levels = np.split(order, np.flatnonzero(np.diff(depth[order])) + 1)
+    for level in reversed(levels):
+        children = level[parent[level] >= 0]
+        if len(children):
+            np.maximum.at(end, parent[children], end[children])
+    return end
+
+
+class ElementTable:
+    """一棵 UI 树的数组视图；下标与先序位置（ColumnarTree 下标）一致"""
+
+    def __init__(self, boxes, depth, type_id, flags, parent, types, names, source=None):
+        self.boxes = boxes        # (N, 4) int32：left, top, right, bottom
+        self.depth = depth        # (N,) int32
+        self.type_id = type_id    # (N,) int32 -> types
+        self.flags = flags        # (N,) uint8，位定义同 tree_format 的 FLAG_*
+        self.parent = parent      # (N,) int64，根为 -1
+        self.types = types
+        self.names = names        # list，按需读取
+        self.source = source      # 嵌套树的节点 dict 列表或 ColumnarTree，用于还原记录
+        self.end = subtree_ends(parent, depth)
+
+    @classmethod
+    def from_tree(cls, ui_tree):
+        if isinstance(ui_tree, ColumnarTree):
+            boxes = np.stack([np.frombuffer(getattr(ui_tree, column), dtype=np.int32)
+                              for column in ("left", "top", "right", "bottom")], axis=1) \
+                if len(ui_tree) else np.zeros((0, 4), dtype=np.int32)
+            names = [ui_tree.name(i) for i in range(len(ui_tree))]
+            return cls(boxes, np.asarray(ui_tree.depth, dtype=np.int32),
+                       np.asarray(ui_tree.type_idx, dtype=np.int32), np.asarray(ui_tree.flags, dtype=np.uint8),
+                       np.asarray(ui_tree.parent, dtype=np.int64), list(ui_tree.types), names, ui_tree)
+
+        nodes, parents = [], []
+        stack = [(ui_tree, -1)] if ui_tree else []
+        while stack:
+            node, parent = stack.pop()
+            nodes.append(node)
+            parents.append(parent)
+            me = len(nodes) - 1
+            stack.extend((child, me) for child in reversed(node.get("children") or []) if child)
+        types, type_ids = [], {}
+        type_id = np.empty(len(nodes), dtype=np.int32)
+        boxes = np.zeros((len(nodes), 4), dtype=np.int32)
+        for i, node in enumerate(nodes):
+            ctype = node.get("control_type", "Unknown")
+            tid = type_ids.get(ctype)
+            if tid is None:
+                tid = type_ids[ctype] = len(types)
+                types.append(ctype)
+            type_id[i] = tid
+            rect = node.get("rect")
+            if rect:
+                boxes[i] = (rect["left"], rect["top"], rect["right"], rect["bottom"])
+        return cls(boxes, np.fromiter((node.get("depth", 0) for node in nodes), dtype=np.int32, count=len(nodes)),
+                   type_id, np.fromiter((_node_flags(node) for node in nodes), dtype=np.uint8, count=len(nodes)),
+                   np.asarray(parents, dtype=np.int64), types, [node.get("name") for node in nodes], nodes)
+
+    def __len__(self):
+        return len(self.boxes)
+
+    # ---------- 掩码 ----------
+
+    def area(self, boxes=None):
+        boxes = self.boxes if boxes is None else boxes
+        width = np.clip(boxes[:, 2] - boxes[:, 0], 0, None).astype(np.int64)
+        height = np.clip(boxes[:, 3] - boxes[:, 1], 0, None).astype(np.int64)
+        return width * height
+
+    def type_mask(self, types):
+        wanted = np.array([i for i, name in enumerate(self.types) if name in set(types)], dtype=np.int32)
+        return np.isin(self.type_id, wanted)
+
+    def has_flag(self, flag):
+        return (self.flags & flag) != 0
+
+    def visible_mask(self):
+        return ~self.has_flag(FLAG_OFFSCREEN)
+
+    def in_bounds_mask(self, width, height):
+        boxes = self.boxes
+        return (boxes[:, 0] >= 0) & (boxes[:, 1] >= 0) & (boxes[:, 2] <= width) & (boxes[:, 3] <= height)
+
+    def subtree_mask(self, roots):
+        """roots（布尔掩码）中每个节点及其全部子孙为 True"""
+        starts = np.flatnonzero(roots)
+        marks = np.zeros(len(self) + 1, dtype=np.int64)
+        np.add.at(marks, starts, 1)
+        np.add.at(marks, self.end[starts], -1)
+        return np.cumsum(marks[:-1]) > 0
+
+    def clip(self, width, height):
+        """裁剪到 [0, width] x [0, height] 后的框（新数组）"""
+        clipped = self.boxes.copy()
+        clipped[:, [0, 2]] = np.clip(clipped[:, [0, 2]], 0, width)
+        clipped[:, [1, 3]] = np.clip(clipped[:, [1, 3]], 0, height)
+        return clipped
+
+    # ---------- 组合筛选 ----------
+
+    def select(self, types=None, visible_only=True, nonempty=True, size=None, out_of_bounds="prune"):
+        """返回 (下标数组, 框数组)
+
+        size=(宽, 高) 时处理超出画面的框：prune 连同子树剔除，drop 只剔除自身，clip 裁剪到画面内
+        （裁剪后为空的剔除）。没有 rect 的节点连同子树剔除。
+        """
+        keep = np.ones(len(self), dtype=bool)
+        if types is not None:
+            keep &= self.type_mask(types)
+        if visible_only:
+            keep &= self.visible_mask()
+        pruned = self.has_flag(FLAG_NO_RECT)
+        boxes = self.boxes
+        if size is not None:
+            if out_of_bounds == "clip":
+                boxes = self.clip(*size)
+            else:
+                outside = keep & ~self.in_bounds_mask(*size)
+                if out_of_bounds == "prune":
+                    pruned = pruned | outside
+                else:
+                    keep &= ~outside
+        if pruned.any():
+            keep &= ~self.subtree_mask(pruned)
+        if nonempty or (out_of_bounds == "clip" and size is not None):
+            keep &= self.area(boxes) > 0
+        indices = np.flatnonzero(keep)
+        return indices, boxes[indices]
+
+    def dedup(self, indices, boxes=None, iou=0.9, prefer=None):
+        """IoU 重复框抑制，返回保留的下标（先序顺序）
+
+        两个框 IoU >= iou 视为重复，保留优先级高的一个：prefer（类型列表）中的类型优先，其次深度大的
+        （更具体的控件），再次先序靠前的。
+        """
+        if len(indices) < 2:
+            return indices
+        boxes = (self.boxes[indices] if boxes is None else boxes).astype(np.int64)
+        rank = self.depth[indices].astype(np.int64)
+        if prefer:
+            rank = rank + self.type_mask(prefer)[indices] * (1 << 20)
+        order = np.lexsort((np.arange(len(indices)), -rank))
+        areas = self.area(boxes)
+        suppressed = np.zeros(len(indices), dtype=bool)
+        for pos, i in enumerate(order):
+            if suppressed[i]:
+                continue
+            rest = order[pos + 1:]
+            rest = rest[~suppressed[rest]]
+            if not len(rest):
+                break
+            iw = np.clip(np.minimum(boxes[i, 2], boxes[rest, 2]) - np.maximum(boxes[i, 0], boxes[rest, 0]), 0, None)
+            ih = np.clip(np.minimum(boxes[i, 3], boxes[rest, 3]) - np.maximum(boxes[i, 1], boxes[rest, 1]), 0, None)
+            inter = iw * ih
+            union = areas[i] + areas[rest] - inter
+            overlap = inter >= iou * np.maximum(union, 1)
+            suppressed[rest[overlap]] = True
+        return indices[~suppressed]
+
+    # ---------- 输出 ----------
+
+    def control_type(self, i):
+        return self.types[self.type_id[i]]
+
+    def node(self, i):
+        """第 i 个节点的原始记录（嵌套树为原 dict，ColumnarTree 为 node(i)）"""
+        if isinstance(self.source, ColumnarTree):
+            return self.source.node(int(i))
+        return self.source[i]
+
+    def elements(self, indices, boxes=None):
+        """[{"name", "type", "bbox", "depth", "clickable"}]，boxes 给出时用其中的（裁剪后的）框"""
+        boxes = self.boxes[indices] if boxes is None else boxes
+        out = []
+        for i, box in zip(indices.tolist(), boxes.tolist()):
+            if isinstance(self.source, ColumnarTree):
+                clickable = self.source.clickable(i)
+            else:
+                clickable = self.source[i].get("clickable")
+            out.append({"name": self.names[i], "type": self.control_type(i),
+                        "bbox": {"left": box[0], "top": box[1], "right": box[2], "bottom": box[3]},
+                        "depth": int(self.depth[i]), "clickable": clickable})
+        return out
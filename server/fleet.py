@@ -0,0 +1,300 @@
+"""多 VM 采集调度：把一批应用配置分发到多台被控端（windows_automation_server）并发执行
+
+- 每台被控端有并发上限（同时运行的任务数，默认 1），每个名额一个线程，从共享队列取任务
+- 健康检查：启动时与之后每 health_interval 秒请求一次 /workers/stats；不健康的被控端不再领取任务，恢复后自动重新加入
+- 任务失败后重新入队，优先交给还没失败过该任务的其他被控端，最多尝试 max_attempts 次；
+  连接失败 / 超时会立即把该被控端标记为不健康
+- 同一应用的任务不会同时运行（两者共用 data/<app_name>/ 与去重索引）
+- 每 report_interval 秒打印一次进度：完成 / 失败 / 运行中 / 排队、吞吐（任务/分钟）、预计剩余时间与各被控端状态
+
+用法：
+    python server/fleet.py --apps apps.json --vm 10.0.0.11 --vm 10.0.0.12:5000*2 [--mode click|extract]
+apps.json 为应用配置（与 click.py / controller.py 的 app_infos 相同）的列表。
+"""
+import argparse
+import json
+import threading
+import time
+from collections import deque
+
+import requests
+
+import utils  # noqa: F401  (puts client/ on sys.path for the shared format modules)
+from rpc_client import RpcClient, DEFAULT_PORT
+
+
+# ---------- 被控端与任务 ----------
+
+class Endpoint:
+    """一台被控端：地址、并发上限、健康状态与计数"""
+
+    def __init__(self, vm_ip, port=DEFAULT_PORT, concurrency=1):
+        self.vm_ip = vm_ip
+        self.port = port
+        self.concurrency = concurrency
+        self.name = f"{vm_ip}:{port}"
+        self.healthy = False
+        self.active = 0
+        self.completed = 0
+        self.failed = 0
+        self.rpc = RpcClient(vm_ip, port, retries=0)  # 健康检查不重试，失败即判不健康
+
+    @classmethod
+    def parse(cls, spec, concurrency=1):
+        """host、host:port 或 host:port*并发数"""
+        spec, _, limit = spec.partition("*")
+        host, _, port = spec.partition(":")
+        return cls(host, int(port or DEFAULT_PORT), int(limit or concurrency))
+
+    def check(self):
+        try:
+            self.healthy = self.rpc.get("workers/stats").status_code == 200
+        except requests.RequestException:
+            self.healthy = False
+        return self.healthy
+
+
+class Job:
+    def __init__(self, index, app_config):
+        self.index = index
+        self.app_config = app_config
+        self.app_name = app_config.get("app_name", f"job_{index}")
+        self.status = "queued"  # queued / running / done / failed
+        self.attempts = 0
+        self.tried = set()  # 失败过该任务的被控端
+        self.endpoint = None
+        self.error = None
+        self.elapsed = 0.0
+
+    def to_dict(self):
+        return {"app_name": self.app_name, "status": self.status, "attempts": self.attempts,
+                "endpoint": self.endpoint, "elapsed": round(self.elapsed, 3), "error": self.error}
+
+
+# ---------- 任务执行 ----------
+
+def run_clicker(endpoint, app_config):
+    from click import AutoClicker
+    return AutoClicker(endpoint.vm_ip, app_config, port=endpoint.port).run()
+
+
+def run_extractor(endpoint, app_config):
+    from controller import UI_Extractor
+    agent = UI_Extractor(endpoint.vm_ip, endpoint.port)
+    agent.set_app(app_config)
+    if not agent.init_task():
+        return False
+    try:
+        return agent.run_task()
+    finally:
+        agent.end_task()
+
+
+RUNNERS = {"click": run_clicker, "extract": run_extractor}
+
+
+# ---------- 调度 ----------
+
+class Fleet:
+    """runner(endpoint, app_config) 执行一个任务，返回真值表示成功，抛异常或返回假值表示失败"""
+
+    def __init__(self, endpoints, runner=run_clicker, max_attempts=3, health_interval=10.0,
+                 report_interval=5.0, offline_timeout=300.0):
+        self.endpoints = list(endpoints)
+        self.runner = runner
+        self.max_attempts = max_attempts
+        self.health_interval = health_interval
+        self.report_interval = report_interval
+        self.offline_timeout = offline_timeout  # 全部被控端不健康超过该时长时，放弃剩余任务
+        self._cond = threading.Condition()
+        self._queue = deque()
+        self._jobs = []
+        self._pending = 0
+        self._running_apps = set()
+        self._stop = threading.Event()
+        self._offline_since = None
+        self.started = None
+
+    def run(self, app_configs):
+        """执行全部任务，返回 summary()"""
+        self._jobs = [Job(i, cfg) for i, cfg in enumerate(app_configs)]
+        self._queue = deque(self._jobs)
+        self._pending = len(self._jobs)
+        self._stop.clear()
+        self.started = time.monotonic()
+        self.check_health()
+
+        threads = [threading.Thread(target=self._slot, args=(endpoint,), name=f"fleet-{endpoint.name}-{i}", daemon=True)
+                   for endpoint in self.endpoints for i in range(endpoint.concurrency)]
+        for thread in threads:
+            thread.start()
+        monitors = [threading.Thread(target=self._every, args=(self.health_interval, self.check_health), daemon=True),
+                    threading.Thread(target=self._every, args=(self.report_interval, self.report), daemon=True)]
+        for thread in monitors:
+            thread.start()
+        try:
+            for thread in threads:
+                thread.join()
+        finally:
+            self._stop.set()
+        self.report()
+        return self.summary()
+
+    def _every(self, interval, fn):
+        while not self._stop.wait(interval):
+            try:
+                fn()
+            except Exception as e:
+                print(f"Fleet monitor error: {e}")
+
+    # ---------- 取任务 ----------
+
+    def _take(self, endpoint):
+        """调用方持有锁：取出该被控端可以运行的第一个任务"""
+        healthy = {ep.name for ep in self.endpoints if ep.healthy}
+        for job in self._queue:
+            if job.app_name in self._running_apps:
+                continue
+            # 失败过的被控端只在其他健康的被控端也都失败过时才重试该任务
+            if endpoint.name in job.tried and not healthy <= job.tried:
+                continue
+            self._queue.remove(job)
+            return job
+        return None
+
+    def _slot(self, endpoint):
+        while True:
+            with self._cond:
+                job = None
+                while job is None:
+                    if self._pending == 0:
+                        return
+                    if endpoint.healthy:
+                        job = self._take(endpoint)
+                    if job is None:
+                        self._cond.wait(timeout=1.0)
+                job.status = "running"
+                job.attempts += 1
+                job.endpoint = endpoint.name
+                endpoint.active += 1
+                self._running_apps.add(job.app_name)
+            print(f"[fleet] {job.app_name} -> {endpoint.name} (attempt {job.attempts})")
+
+            t0 = time.monotonic()
+            error = None
+            try:
+                ok = bool(self.runner(endpoint, job.app_config))
+                if not ok:
+                    error = "runner reported failure"
+            except (requests.ConnectionError, requests.Timeout) as e:
+                ok, error = False, f"{type(e).__name__}: {e}"
+                endpoint.healthy = False  # 等下一次健康检查恢复
+                print(f"[fleet] {endpoint.name} unreachable, marked unhealthy")
+            except Exception as e:
+                ok, error = False, f"{type(e).__name__}: {e}"
+            self._finish(job, endpoint, ok, error, time.monotonic() - t0)
+
+    def _finish(self, job, endpoint, ok, error, elapsed):
+        with self._cond:
+            endpoint.active -= 1
+            self._running_apps.discard(job.app_name)
+            job.elapsed += elapsed
+            job.error = error
+            if ok:
+                job.status = "done"
+                endpoint.completed += 1
+                self._pending -= 1
+            else:
+                endpoint.failed += 1
+                job.tried.add(endpoint.name)
+                if job.attempts < self.max_attempts:
+                    job.status = "queued"
+                    self._queue.append(job)
+                else:
+                    job.status = "failed"
+                    self._pending -= 1
+            self._cond.notify_all()
+        if not ok:
+            print(f"[fleet] {job.app_name} failed on {endpoint.name}: {error}")
+
+    # ---------- 健康检查 ----------
+
+    def check_health(self):
+        for endpoint in self.endpoints:
+            was = endpoint.healthy
+            if endpoint.check() != was:
+                print(f"[fleet] {endpoint.name} is {'up' if endpoint.healthy else 'down'}")
+        with self._cond:
+            if any(endpoint.healthy for endpoint in self.endpoints):
+                self._offline_since = None
+            elif self._offline_since is None:
+                self._offline_since = time.monotonic()
+            elif time.monotonic() - self._offline_since > self.offline_timeout and self._queue:
+                print(f"[fleet] No healthy endpoint for {self.offline_timeout:.0f}s, "
+                      f"giving up {len(self._queue)} queued jobs")
+                for job in self._queue:
+                    job.status = "failed"
+                    job.error = "no healthy endpoint"
+                self._pending -= len(self._queue)
+                self._queue.clear()
+            self._cond.notify_all()
+
+    # ---------- 进度 ----------
+
+    def progress(self):
+        with self._cond:
+            counts = {"queued": 0, "running": 0, "done": 0, "failed": 0}
+            for job in self._jobs:
+                counts[job.status] += 1
+            endpoints = {endpoint.name: {"healthy": endpoint.healthy, "active": endpoint.active,
+                                         "concurrency": endpoint.concurrency, "completed": endpoint.completed,
+                                         "failed": endpoint.failed}
+                         for endpoint in self.endpoints}
+        elapsed = time.monotonic() - self.started if self.started else 0.0
+        finished = counts["done"] + counts["failed"]
+        rate = finished / elapsed * 60 if elapsed else 0.0
+        remaining = counts["queued"] + counts["running"]
+        return {"total": len(self._jobs), **counts, "elapsed": round(elapsed, 1),
+                "jobs_per_min": round(rate, 2), "eta_min": round(remaining / rate, 1) if rate else None,
+                "endpoints": endpoints}
+
+    def report(self):
+        p = self.progress()
+        eta = f"{p['eta_min']} min" if p["eta_min"] is not None else "-"
+        workers = ", ".join(f"{name} {'up' if e['healthy'] else 'DOWN'} {e['active']}/{e['concurrency']}"
+                            f" ok={e['completed']} err={e['failed']}" for name, e in p["endpoints"].items())
+        print(f"[fleet] {p['done']}/{p['total']} done, {p['failed']} failed, {p['running']} running, "
+              f"{p['queued']} queued | {p['jobs_per_min']} jobs/min | ETA {eta} | {workers}")
+
+    def summary(self):
+        return {**self.progress(), "jobs": [job.to_dict() for job in self._jobs]}
+
+
+# ---------- CLI ----------
+
+def main():
+    parser = argparse.ArgumentParser(description="Run collection jobs across several automation servers")
+    parser.add_argument("--apps", required=True, help="JSON file with a list of app configs")
+    parser.add_argument("--vm", action="append", required=True, help="host[:port][*concurrency], repeatable")
+    parser.add_argument("--mode", choices=sorted(RUNNERS), default="click", help="AutoClicker or UI_Extractor jobs")
+    parser.add_argument("--concurrency", type=int, default=1, help="Default jobs per VM")
+    parser.add_argument("--attempts", type=int, default=3, help="Max attempts per job")
+    parser.add_argument("--health-interval", type=float, default=10.0)
+    parser.add_argument("--report-interval", type=float, default=5.0)
+    parser.add_argument("--summary", help="Write the final job summary to this JSON file")
+    args = parser.parse_args()
+
+    with open(args.apps, "r", encoding="utf-8") as f:
+        app_configs = json.load(f)
+    endpoints = [Endpoint.parse(spec, args.concurrency) for spec in args.vm]
+    fleet = Fleet(endpoints, runner=RUNNERS[args.mode], max_attempts=args.attempts,
+                  health_interval=args.health_interval, report_interval=args.report_interval)
+    summary = fleet.run(app_configs)
+    if args.summary:
+        with open(args.summary, "w", encoding="utf-8") as f:
+            json.dump(summary, f, ensure_ascii=False, indent=2)
+        print(f"Summary saved: {args.summary}")
+
+
+if __name__ == "__main__":
+    main()
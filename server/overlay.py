@@ -0,0 +1,205 @@
+"""QA 用的叠加图（*_overlay.png）：在截图上绘制 UI 元素框与控件类型，仅用于质检，不作为训练输入
+
+- flatten_elements：把 UI 树（嵌套 dict 或 ColumnarTree）展平为 ElementTable，在数组上筛选（可裁剪、可 IoU 去重）
+- render_overlay：按元素表在截图上绘制并保存；AutoClicker / UI_Extractor 采集时（可选）与离线命令共用
+- 离线命令：扫描 data/<app> 目录，只渲染缺失或过期的叠加图，多进程并行
+
+    python server/overlay.py data/notepad [data/xmind ...] [--workers 8] [--hash] [--force]
+                             [--out-of-bounds prune|drop|clip] [--dedup-iou 0.9] [--drop-occluded]
+
+过期判断：叠加图不存在，或比截图 / layout 旧（mtime）；--hash 时另外比较 overlay_index.json 中记录的
+截图 + layout + 类型列表的哈希，数据集被拷贝、mtime 不可信时使用。
+"""
+import argparse
+import hashlib
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+import numpy as np
+from PIL import Image, ImageDraw
+
+from utils import COLORS
+from tree_format import ColumnarTree
+from element_table import ElementTable
+from spatial import SpatialIndex
+
+DEFAULT_TYPES = [
+    'ButtonControl', 'CheckBoxControl', 'ComboBoxControl', 'ScrollBarControl',
+    'RadioButtonControl', 'HyperlinkControl', 'MenuItemControl', 'PaneControl',
+    'TextControl', 'JavaControl', 'SwingControl', 'UwpButton', 'UwpText', 'TreeItemControl'
+]
+PALETTE = list(COLORS.values())
+INDEX_NAME = "overlay_index.json"
+
+
+# ---------- 元素表与绘制 ----------
+
+def flatten_elements(ui_tree, enabled_types=DEFAULT_TYPES, size=None, out_of_bounds="prune", dedup_iou=None,
+                     drop_occluded=False):
+    """返回要绘制的元素列表 [{"name", "type", "bbox", "depth", "clickable"}]（先序）
+
+    类型在 enabled_types 中且不在屏幕外的节点入表；没有矩形的节点连同其子树跳过。给定 size=(宽, 高) 时
+    超出画面的框按 out_of_bounds 处理：prune 连同子树跳过，drop 只跳过自身，clip 裁剪到画面内。
+    drop_occluded 时（默认关闭）去掉被后出现的控件完全遮挡的元素（SpatialIndex）；dedup_iou 给出时对重叠框做
+    IoU 抑制。筛选都在 ElementTable 的数组上完成。
+    """
+    table = ElementTable.from_tree(ui_tree)
+    indices, boxes = table.select(enabled_types, nonempty=False, size=size, out_of_bounds=out_of_bounds)
+    if drop_occluded and len(indices):
+        visible = SpatialIndex(table, size=size).visible_mask()[indices]
+        indices, boxes = indices[visible], boxes[visible]
+    if dedup_iou:
+        kept = table.dedup(indices, boxes, dedup_iou)
+        boxes = boxes[np.isin(indices, kept)]
+        indices = kept
+    return table.elements(indices, boxes)
+
+
+def overlay_path_for(screenshot_path):
+    path = Path(screenshot_path)
+    return path.with_stem(path.stem + "_overlay")
+
+
+def render_overlay(ui_tree, screenshot_path, enabled_types=DEFAULT_TYPES, image=None, **options):
+    """绘制 screenshot_path 的叠加图并保存在旁边，返回元素列表
+
+    image 为已解码的截图（采集时直接用内存中的图像）；省略时从 screenshot_path 读取。
+    options（out_of_bounds、dedup_iou）传给 flatten_elements。
+    """
+    if image is None:
+        with Image.open(screenshot_path) as src:
+            img = src.convert("RGB")
+    else:
+        img = image.convert("RGB")
+    draw = ImageDraw.Draw(img)
+    elements = flatten_elements(ui_tree, enabled_types, size=img.size, **options)
+    for element in elements:
+        bbox = element["bbox"]
+        color = PALETTE[element["depth"] % len(PALETTE)]
+        draw.rectangle([bbox["left"], bbox["top"], bbox["right"], bbox["bottom"]], outline=color)
+        draw.text((bbox["left"], bbox["top"]), element["type"], fill=color)
+    img.save(overlay_path_for(screenshot_path))
+    return elements
+
+
+def load_layout(path):
+    path = Path(path)
+    if path.suffix == ".uit":
+        return ColumnarTree.load(path)
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+# ---------- 离线渲染 ----------
+
+def find_samples(data_dir):
+    """返回 [(截图路径, layout 路径)]；没有 layout 的截图忽略"""
+    samples = []
+    for screenshot in sorted(Path(data_dir).rglob("*_screenshot.*")):
+        if screenshot.stem.endswith("_overlay"):
+            continue
+        prefix = screenshot.name[:-len("_screenshot" + screenshot.suffix)]
+        for suffix in (".json", ".uit"):
+            layout = screenshot.with_name(f"{prefix}_layout{suffix}")
+            if layout.exists():
+                samples.append((screenshot, layout))
+                break
+    return samples
+
+
+def sample_hash(screenshot, layout, enabled_types, options=None):
+    digest = hashlib.sha1()
+    for path in (screenshot, layout):
+        with open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(1 << 20), b""):
+                digest.update(chunk)
+    digest.update("|".join(enabled_types).encode("utf-8"))
+    digest.update(json.dumps(options, sort_keys=True).encode("utf-8"))
+    return digest.hexdigest()
+
+
+def is_stale(screenshot, layout, index=None, key=None, digest=None):
+    overlay = overlay_path_for(screenshot)
+    if not overlay.exists():
+        return True
+    if overlay.stat().st_mtime < max(screenshot.stat().st_mtime, layout.stat().st_mtime):
+        return True
+    return index is not None and index.get(key) != digest
+
+
+def _render_task(task):
+    """进程池中执行：返回 (截图路径, 元素数, 错误)"""
+    screenshot, layout, enabled_types, options = task
+    try:
+        return screenshot, len(render_overlay(load_layout(layout), screenshot, enabled_types, **options)), None
+    except Exception as e:
+        return screenshot, 0, f"{type(e).__name__}: {e}"
+
+
+def render_dataset(data_dir, enabled_types=DEFAULT_TYPES, workers=None, use_hash=False, force=False, **options):
+    """渲染 data_dir 下缺失或过期的叠加图，返回统计 dict；options 传给 render_overlay"""
+    t0 = time.perf_counter()
+    data_dir = Path(data_dir)
+    index_path = data_dir / INDEX_NAME
+    index = {}
+    if use_hash and index_path.exists():
+        with open(index_path, "r", encoding="utf-8") as f:
+            index = json.load(f)
+
+    samples = find_samples(data_dir)
+    digests = {}
+    todo = []
+    for screenshot, layout in samples:
+        digest = sample_hash(screenshot, layout, enabled_types, options) if use_hash else None
+        digests[screenshot] = digest
+        key = screenshot.relative_to(data_dir).as_posix()
+        if force or is_stale(screenshot, layout, index if use_hash else None, key, digest):
+            todo.append((screenshot, layout, list(enabled_types), options))
+
+    rendered, errors = 0, []
+    if todo:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            chunksize = max(1, len(todo) // ((workers or os.cpu_count() or 1) * 4))
+            for screenshot, count, error in pool.map(_render_task, todo, chunksize=chunksize):
+                if error:
+                    errors.append({"screenshot": str(screenshot), "error": error})
+                    print(f"Overlay failed for {screenshot}: {error}")
+                else:
+                    rendered += 1
+                    if use_hash:
+                        index[screenshot.relative_to(data_dir).as_posix()] = digests[screenshot]
+
+    if use_hash:
+        tmp_path = index_path.with_suffix(".tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(index, f, ensure_ascii=False)
+        os.replace(tmp_path, index_path)
+    return {"data_dir": str(data_dir), "samples": len(samples), "stale": len(todo), "rendered": rendered,
+            "errors": errors, "elapsed": round(time.perf_counter() - t0, 3)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Render missing or stale QA overlays for captured samples")
+    parser.add_argument("data_dirs", nargs="+", help="data/<app_name> directories")
+    parser.add_argument("--workers", type=int, default=None, help="Process pool size (default: CPU count)")
+    parser.add_argument("--types", nargs="+", default=DEFAULT_TYPES, help="Control types to draw")
+    parser.add_argument("--hash", action="store_true", help="Also compare content hashes from overlay_index.json")
+    parser.add_argument("--force", action="store_true", help="Re-render every overlay")
+    parser.add_argument("--out-of-bounds", choices=("prune", "drop", "clip"), default="prune",
+                        help="How to treat boxes outside the screenshot")
+    parser.add_argument("--dedup-iou", type=float, default=None, help="Suppress boxes overlapping at this IoU")
+    parser.add_argument("--drop-occluded", action="store_true", help="Skip elements fully covered by later controls")
+    args = parser.parse_args()
+    options = {"out_of_bounds": args.out_of_bounds, "dedup_iou": args.dedup_iou,
+               "drop_occluded": args.drop_occluded}
+    for data_dir in args.data_dirs:
+        stats = render_dataset(data_dir, args.types, args.workers, args.hash, args.force, **options)
+        print(f"{stats['data_dir']}: {stats['rendered']}/{stats['stale']} stale overlays rendered "
+              f"({stats['samples']} samples, {len(stats['errors'])} errors) in {stats['elapsed']}s")
+
+
+if __name__ == "__main__":
+    main()
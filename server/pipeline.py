@@ -0,0 +1,139 @@
+"""后台写盘流水线：采集循环只把样本放入队列，落盘与叠加图渲染在后台线程完成
+
+- 由若干级 Stage 串成：每级一个有界队列和若干工作线程，fn(item) 的返回值交给下一级，返回 None 表示到此为止
+- 背压：队列满时 submit / 向下一级投递会阻塞，内存中待处理的样本数有上限，采集不会无限领先于写盘
+- flush() 等待所有已提交的样本处理完；close() 先 flush 再停止线程，进程退出时（atexit）也会执行
+- 统计：每级的处理数、错误数、平均 / 最大耗时、队列最大深度，以及 submit 因背压阻塞的总时长
+"""
+import atexit
+import queue
+import threading
+import time
+
+_STOP = object()
+
+
+class Stage:
+    def __init__(self, name, fn, workers=1, maxsize=4):
+        self.name = name
+        self.fn = fn
+        self.workers = workers
+        self.queue = queue.Queue(maxsize)
+        self.next = None
+        self.threads = []
+        self.lock = threading.Lock()
+        self.processed = 0
+        self.errors = 0
+        self.busy_ms = 0.0
+        self.max_ms = 0.0
+        self.max_depth = 0
+
+    def put(self, item):
+        self.queue.put(item)
+        depth = self.queue.qsize()
+        if depth > self.max_depth:
+            self.max_depth = depth
+
+    def run(self):
+        while True:
+            item = self.queue.get()
+            try:
+                if item is _STOP:
+                    return
+                t0 = time.perf_counter()
+                try:
+                    out = self.fn(item)
+                except Exception as e:
+                    out = None
+                    with self.lock:
+                        self.errors += 1
+                    print(f"Pipeline stage '{self.name}' failed: {e}")
+                elapsed = (time.perf_counter() - t0) * 1000
+                with self.lock:
+                    self.processed += 1
+                    self.busy_ms += elapsed
+                    self.max_ms = max(self.max_ms, elapsed)
+                # 先投递到下一级再 task_done，flush 按级 join 时不会漏掉在途样本
+                if out is not None and self.next is not None:
+                    self.next.put(out)
+            finally:
+                self.queue.task_done()
+
+    def stats(self):
+        with self.lock:
+            return {
+                "workers": self.workers,
+                "processed": self.processed,
+                "errors": self.errors,
+                "avg_ms": round(self.busy_ms / self.processed, 3) if self.processed else 0.0,
+                "max_ms": round(self.max_ms, 3),
+                "queue_depth": self.queue.qsize(),
+                "max_depth": self.max_depth,
+            }
+
+
+class Pipeline:
+    def __init__(self, stages, name="pipeline"):
+        self.stages = list(stages)
+        self.name = name
+        for stage, following in zip(self.stages, self.stages[1:]):
+            stage.next = following
+        self.submitted = 0
+        self.blocked_ms = 0.0
+        self._closed = False
+        self._started = False
+
+    def start(self):
+        if self._started:
+            return self
+        self._started = True
+        for stage in self.stages:
+            for i in range(stage.workers):
+                thread = threading.Thread(target=stage.run, name=f"{self.name}-{stage.name}-{i}", daemon=True)
+                thread.start()
+                stage.threads.append(thread)
+        atexit.register(self.close)
+        return self
+
+    def submit(self, item):
+        """放入第一级队列；队列满时阻塞（背压）"""
+        if self._closed:
+            raise RuntimeError(f"Pipeline '{self.name}' is closed")
+        self.start()
+        t0 = time.perf_counter()
+        self.stages[0].put(item)
+        self.blocked_ms += (time.perf_counter() - t0) * 1000
+        self.submitted += 1
+
+    def flush(self):
+        """等待已提交的样本全部处理完"""
+        for stage in self.stages:
+            stage.queue.join()
+
+    def close(self):
+        if self._closed:
+            return
+        self._closed = True
+        if not self._started:
+            return
+        self.flush()
+        for stage in self.stages:
+            for _ in stage.threads:
+                stage.queue.put(_STOP)
+        for stage in self.stages:
+            for thread in stage.threads:
+                thread.join()
+        atexit.unregister(self.close)
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def stats(self):
+        return {
+            "submitted": self.submitted,
+            "blocked_ms": round(self.blocked_ms, 3),
+            "stages": {stage.name: stage.stats() for stage in self.stages},
+        }
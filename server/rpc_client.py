@@ -0,0 +1,195 @@
+"""控制端访问被控端（windows_automation_server）的 HTTP 客户端，AutoClicker 与 UI_Extractor 共用
+
+- 连接池：一个 requests.Session（keep-alive），同一 VM 的所有调用复用 TCP 连接
+- 按接口设置 (连接, 读取) 超时，被控端挂起时不会无限阻塞
+- 幂等接口在连接失败、超时或 502/503/504 时按指数退避重试，次数有上限；非幂等接口（/open_app、/click）不重试；
+  耗时的提取接口（EXPENSIVE）读取超时不重试：被控端上的第一次提取仍在运行，重试只会再排队一次整树提取
+- 同一个 RpcClient 可在多个线程间共享（连接池上限 pool_size）
+- AsyncRpcClient：asyncio 版本，在与连接池同样大小的专用线程池上执行调用，并发数不超过连接数，
+  post_many 并发发送一批请求
+- 按接口统计调用次数、错误、重试与耗时（平均 / p50 / p95 / 最大）
+"""
+import asyncio
+import random
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from requests.adapters import HTTPAdapter
+
+DEFAULT_PORT = 5000
+DEFAULT_TIMEOUT = (5, 30)
+RETRY_STATUS = (502, 503, 504)
+
+# 接口 -> ((连接超时, 读取超时), 是否幂等)
+ROUTES = {
+    "open_app": ((5, 60), False),
+    "click": ((5, 10), False),
+    "screenshot": ((5, 30), True),
+    "capture": ((5, 60), True),
+    "wait_stable": ((5, 30), True),
+    "get_ui_tree": ((5, 120), True),
+    "get_ui_tree/stream": ((5, 60), True),  # 流式响应：读取超时针对相邻两次读取的间隔
+    "query": ((5, 120), True),
+    "ui/top": ((5, 60), True),
+    "ui/expand": ((5, 60), True),
+    "ui/props": ((5, 30), True),
+    "get_ui": ((5, 30), True),
+    "get_processes_by_exe": ((5, 10), True),
+    "close_app": ((5, 30), True),
+    "close_apps": ((5, 30), True),
+    "workers/stats": ((3, 5), True),  # 调度器的健康检查
+    "events": ((5, 30), False),  # 长连接，断线由调用方重连
+}
+# 读取超时时不重试的接口（只重试连接失败与 502/503/504）
+EXPENSIVE = frozenset({"capture", "get_ui_tree", "get_ui_tree/stream", "query"})
+
+
+def route_of(path):
+    """/screenshot/<id> 等带参数的路径按前缀归类统计"""
+    if path.startswith("screenshot/"):
+        return "screenshot/{filename}"
+    return path
+
+
+class RouteStats:
+    def __init__(self, window=256):
+        self.calls = 0
+        self.errors = 0
+        self.retries = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+        self.samples = deque(maxlen=window)
+        self.lock = threading.Lock()
+
+    def record(self, elapsed_ms, ok):
+        with self.lock:
+            self._record(elapsed_ms, ok)
+
+    def retried(self):
+        with self.lock:
+            self.retries += 1
+
+    def _record(self, elapsed_ms, ok):
+        self.calls += 1
+        if not ok:
+            self.errors += 1
+        self.total_ms += elapsed_ms
+        self.max_ms = max(self.max_ms, elapsed_ms)
+        self.samples.append(elapsed_ms)
+
+    def to_dict(self):
+        with self.lock:
+            ordered = sorted(self.samples)
+
+        def pct(q):
+            return round(ordered[min(len(ordered) - 1, int(q * len(ordered)))], 3) if ordered else 0.0
+        return {
+            "calls": self.calls,
+            "errors": self.errors,
+            "retries": self.retries,
+            "avg_ms": round(self.total_ms / self.calls, 3) if self.calls else 0.0,
+            "p50_ms": pct(0.5),
+            "p95_ms": pct(0.95),
+            "max_ms": round(self.max_ms, 3),
+        }
+
+
+class RpcClient:
+    def __init__(self, vm_ip="127.0.0.1", port=DEFAULT_PORT, retries=3, backoff=0.25, max_backoff=4.0,
+                 pool_size=16):
+        self.base_url = f"http://{vm_ip}:{port}"
+        self.retries = retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        self.session.mount("http://", adapter)
+        self.pool_size = pool_size
+        self._stats = {}
+        self._stats_lock = threading.Lock()
+
+    def _route_stats(self, route):
+        with self._stats_lock:
+            return self._stats.setdefault(route, RouteStats())
+
+    def request(self, method, route, timeout=None, idempotent=None, **kwargs):
+        """发送请求并返回 Response；timeout / idempotent 缺省时取 ROUTES 中该接口的设置"""
+        default_timeout, default_idempotent = ROUTES.get(route, (DEFAULT_TIMEOUT, method == "GET"))
+        timeout = timeout or default_timeout
+        idempotent = default_idempotent if idempotent is None else idempotent
+        stats = self._route_stats(route_of(route))
+        url = f"{self.base_url}/{route}"
+
+        attempt = 0
+        while True:
+            t0 = time.perf_counter()
+            try:
+                response = self.session.request(method, url, timeout=timeout, **kwargs)
+            except (requests.ConnectionError, requests.Timeout) as e:
+                stats.record((time.perf_counter() - t0) * 1000, ok=False)
+                read_timeout = isinstance(e, requests.Timeout) and not isinstance(e, requests.ConnectTimeout)
+                if not idempotent or attempt >= self.retries or (read_timeout and route in EXPENSIVE):
+                    raise
+            else:
+                retryable = response.status_code in RETRY_STATUS and idempotent and attempt < self.retries
+                stats.record((time.perf_counter() - t0) * 1000, ok=response.status_code < 500)
+                if not retryable:
+                    return response
+                response.close()
+            attempt += 1
+            stats.retried()
+            delay = min(self.max_backoff, self.backoff * 2 ** (attempt - 1))
+            time.sleep(delay * (0.5 + random.random() / 2))
+
+    def post(self, route, payload=None, **kwargs):
+        return self.request("POST", route, json=payload or {}, **kwargs)
+
+    def get(self, route, **kwargs):
+        return self.request("GET", route, **kwargs)
+
+    def stats(self):
+        """按接口的调用次数、错误、重试与耗时"""
+        with self._stats_lock:
+            return {route: stats.to_dict() for route, stats in sorted(self._stats.items())}
+
+    def close(self):
+        self.session.close()
+
+
+
+class AsyncRpcClient:
+    """RpcClient 的 asyncio 版本：共用其连接池与重试 / 统计，调用在专用线程池上执行
+
+    requests 是阻塞的，并发数因此限制为 concurrency（默认等于连接池大小）：多出的协程在信号量上等待，
+    而不是占着线程排队等连接。不与 asyncio 默认线程池争用线程。
+    """
+
+    def __init__(self, client, concurrency=None):
+        self.client = client
+        self.concurrency = concurrency or client.pool_size
+        self._executor = ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix="rpc")
+        self._semaphore = None
+
+    async def request(self, method, route, **kwargs):
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.concurrency)
+        async with self._semaphore:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self._executor, lambda: self.client.request(method, route, **kwargs))
+
+    async def post(self, route, payload=None, **kwargs):
+        return await self.request("POST", route, json=payload or {}, **kwargs)
+
+    async def get(self, route, **kwargs):
+        return await self.request("GET", route, **kwargs)
+
+    async def post_many(self, route, payloads, **kwargs):
+        """并发发送一批请求，按输入顺序返回 Response（失败的位置为异常对象）"""
+        return await asyncio.gather(*(self.post(route, payload, **kwargs) for payload in payloads),
+                                    return_exceptions=True)
+
+    def close(self):
+        self._executor.shutdown(wait=False)
@@ -0,0 +1,242 @@
+"""分片数据集格式：样本追加写入大的 tar 分片，另有定长记录的索引文件，读取端 mmap 索引后可随机访问任一样本
+
+目录结构（默认 data/<app_name>/shards/）：
+    shard-000000.tar   # 普通 tar（不压缩），成员名 <样本名>.screenshot.png / <样本名>.layout.json 等，可用 tar 工具直接查看
+    shard-000001.tar   # 单个分片超过 max_shard_bytes 后切换到下一个
+    index.bin          # 头部 + 每个样本一条定长记录：分片号、各成员在分片内的数据偏移与长度
+    names.txt          # 每行一个样本名，与 index.bin 的记录一一对应
+
+写入端每次打开都从新的分片开始，index.bin / names.txt 只追加；读取端按文件长度计算记录数。
+用法：
+    python server/shards.py convert data/notepad [--out DIR] [--shard-size 1024] [--overlays]
+    python server/shards.py info data/notepad/shards
+"""
+import argparse
+import io
+import json
+import mmap
+import struct
+import tarfile
+import time
+from pathlib import Path
+
+import utils  # noqa: F401  (puts client/ on sys.path for the shared format modules)
+from tree_format import ColumnarTree
+
+INDEX_MAGIC = b"UISH"
+INDEX_VERSION = 1
+HEADER = struct.Struct("<4sHH")     # magic, version, 记录长度
+RECORD = struct.Struct("<IBBBxQQQQQQ")  # 分片号, 截图格式, layout 格式, 叠加图格式, 三个成员的 (偏移, 长度)
+IMAGE_FORMATS = ("", "png", "jpg", "jpeg", "webp", "bmp")
+LAYOUT_FORMATS = ("", "json", "uit")
+KINDS = ("screenshot", "layout", "overlay")
+DEFAULT_SHARD_BYTES = 1 << 30
+
+
+def _format_code(table, ext):
+    ext = ext.lower().lstrip(".")
+    if ext not in table:
+        raise ValueError(f"Unsupported format: {ext}")
+    return table.index(ext)
+
+
+# ---------- 写入 ----------
+
+class ShardWriter:
+    def __init__(self, root, max_shard_bytes=DEFAULT_SHARD_BYTES):
+        self.root = Path(root)
+        self.root.mkdir(parents=True, exist_ok=True)
+        self.max_shard_bytes = max_shard_bytes
+        existing = sorted(self.root.glob("shard-*.tar"))
+        self.shard_no = int(existing[-1].stem.split("-")[1]) + 1 if existing else 0
+        self._tar = None
+        self._names_file = open(self.root / "names.txt", "a", encoding="utf-8")
+        index_path = self.root / "index.bin"
+        new_index = not index_path.exists() or index_path.stat().st_size == 0
+        self._index_file = open(index_path, "ab")
+        if new_index:
+            self._index_file.write(HEADER.pack(INDEX_MAGIC, INDEX_VERSION, RECORD.size))
+        self.added = 0
+
+    def _shard(self):
+        if self._tar is not None and self._tar.offset >= self.max_shard_bytes:
+            self._tar.close()
+            self._tar = None
+            self.shard_no += 1
+        if self._tar is None:
+            self._tar = tarfile.open(self.root / f"shard-{self.shard_no:06d}.tar", "w", format=tarfile.PAX_FORMAT)
+        return self._tar
+
+    def add(self, name, screenshot, layout, overlay=None):
+        """追加一个样本；screenshot / layout / overlay 为 (bytes, 扩展名) 或 None"""
+        tar = self._shard()
+        fields = [self.shard_no, 0, 0, 0]
+        spans = []
+        for kind, table, member in (("screenshot", IMAGE_FORMATS, screenshot), ("layout", LAYOUT_FORMATS, layout),
+                                    ("overlay", IMAGE_FORMATS, overlay)):
+            if member is None:
+                spans += [0, 0]
+                continue
+            data, ext = member
+            fields[1 + KINDS.index(kind)] = _format_code(table, ext)
+            info = tarfile.TarInfo(f"{name}.{kind}.{ext.lower().lstrip('.')}")
+            info.size = len(data)
+            info.mtime = int(time.time())
+            tar.addfile(info, io.BytesIO(data))
+            # 成员数据按 512 字节块对齐写在头部之后：从写完后的位置倒推数据起点
+            spans += [tar.offset - -(-len(data) // tarfile.BLOCKSIZE) * tarfile.BLOCKSIZE, len(data)]
+        # 先落分片数据，再写索引，读取端看到的记录总能读到完整数据
+        tar.fileobj.flush()
+        self._index_file.write(RECORD.pack(*fields, *spans))
+        self._index_file.flush()
+        self._names_file.write(name.replace("\n", " ") + "\n")
+        self._names_file.flush()
+        self.added += 1
+
+    def close(self):
+        if self._tar is not None:
+            self._tar.close()
+            self._tar = None
+        self._index_file.close()
+        self._names_file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+# ---------- 读取 ----------
+
+class ShardReader:
+    """mmap index.bin，按下标或样本名随机读取成员字节"""
+
+    def __init__(self, root):
+        self.root = Path(root)
+        self._index_file = open(self.root / "index.bin", "rb")
+        self._index = mmap.mmap(self._index_file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, record_size = HEADER.unpack_from(self._index, 0)
+        if magic != INDEX_MAGIC or version != INDEX_VERSION or record_size != RECORD.size:
+            raise ValueError(f"Not a shard index: {self.root / 'index.bin'}")
+        self._count = (len(self._index) - HEADER.size) // RECORD.size
+        self._names = None
+        self._by_name = None
+        self._shards = {}
+
+    def __len__(self):
+        return self._count
+
+    @property
+    def names(self):
+        if self._names is None:
+            with open(self.root / "names.txt", "r", encoding="utf-8") as f:
+                self._names = f.read().splitlines()[:self._count]
+        return self._names
+
+    def find(self, name):
+        if self._by_name is None:
+            self._by_name = {sample: i for i, sample in enumerate(self.names)}
+        return self._by_name[name]
+
+    def record(self, i):
+        """(分片号, {kind: (格式, 偏移, 长度)})，不存在的成员不出现"""
+        if not 0 <= i < self._count:
+            raise IndexError(i)
+        shard, *values = RECORD.unpack_from(self._index, HEADER.size + i * RECORD.size)
+        codes, spans = values[:3], values[3:]
+        members = {}
+        for k, kind in enumerate(KINDS):
+            offset, size = spans[2 * k], spans[2 * k + 1]
+            if size:
+                table = LAYOUT_FORMATS if kind == "layout" else IMAGE_FORMATS
+                members[kind] = (table[codes[k]], offset, size)
+        return shard, members
+
+    def _shard(self, shard):
+        mapped = self._shards.get(shard)
+        if mapped is None:
+            with open(self.root / f"shard-{shard:06d}.tar", "rb") as f:
+                mapped = self._shards[shard] = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        return mapped
+
+    def read(self, i, kind="screenshot"):
+        """返回 (bytes, 格式)；i 可为下标或样本名，成员不存在时返回 (None, None)"""
+        if isinstance(i, str):
+            i = self.find(i)
+        shard, members = self.record(i)
+        if kind not in members:
+            return None, None
+        fmt, offset, size = members[kind]
+        return self._shard(shard)[offset:offset + size], fmt
+
+    def layout(self, i):
+        """解码后的 UI 树：嵌套 dict（json）或 ColumnarTree（uit）"""
+        data, fmt = self.read(i, "layout")
+        if data is None:
+            return None
+        return ColumnarTree.from_bytes(data) if fmt == "uit" else json.loads(data)
+
+    def close(self):
+        for mapped in self._shards.values():
+            mapped.close()
+        self._shards.clear()
+        self._index.close()
+        self._index_file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+# ---------- 转换 ----------
+
+def convert(data_dir, out_dir=None, max_shard_bytes=DEFAULT_SHARD_BYTES, overlays=False):
+    """把 data/<app> 目录下的散文件样本写入分片，返回统计 dict"""
+    from overlay import find_samples, overlay_path_for
+    t0 = time.perf_counter()
+    data_dir = Path(data_dir)
+    out_dir = Path(out_dir) if out_dir else data_dir / "shards"
+    samples = [(screenshot, layout) for screenshot, layout in find_samples(data_dir)
+               if out_dir not in screenshot.parents]
+    total = 0
+    with ShardWriter(out_dir, max_shard_bytes) as writer:
+        for screenshot, layout in samples:
+            name = screenshot.relative_to(data_dir).as_posix()[:-len("_screenshot" + screenshot.suffix)]
+            overlay = None
+            overlay_path = overlay_path_for(screenshot)
+            if overlays and overlay_path.exists():
+                overlay = (overlay_path.read_bytes(), overlay_path.suffix)
+            members = [(screenshot.read_bytes(), screenshot.suffix), (layout.read_bytes(), layout.suffix), overlay]
+            total += sum(len(member[0]) for member in members if member)
+            writer.add(name, *members)
+    return {"samples": len(samples), "bytes": total, "out_dir": str(out_dir),
+            "elapsed": round(time.perf_counter() - t0, 3)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Sharded dataset storage")
+    sub = parser.add_subparsers(dest="command", required=True)
+    p_convert = sub.add_parser("convert", help="Pack a data/<app> directory into shards")
+    p_convert.add_argument("data_dir")
+    p_convert.add_argument("--out", help="Output directory (default: <data_dir>/shards)")
+    p_convert.add_argument("--shard-size", type=int, default=DEFAULT_SHARD_BYTES >> 20, help="Shard size in MB")
+    p_convert.add_argument("--overlays", action="store_true", help="Also pack *_overlay images")
+    p_info = sub.add_parser("info", help="Summarize a shard directory")
+    p_info.add_argument("shard_dir")
+    args = parser.parse_args()
+
+    if args.command == "convert":
+        stats = convert(args.data_dir, args.out, args.shard_size << 20, args.overlays)
+        print(f"Packed {stats['samples']} samples ({stats['bytes'] / 2**20:.1f} MB) into {stats['out_dir']} "
+              f"in {stats['elapsed']}s")
+    else:
+        with ShardReader(args.shard_dir) as reader:
+            shards = {reader.record(i)[0] for i in range(len(reader))}
+            print(f"{args.shard_dir}: {len(reader)} samples in {len(shards)} shards")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,158 @@
+"""元素框的空间索引：点 -> 最上层元素，以及考虑遮挡后每个元素的可见比例
+
+层叠顺序按先序下标近似：子孙在祖先之上，后出现的兄弟（及其子树）在先出现的之上。
+一个元素只会被下标 >= end[i] 的元素（后出现的非子孙）遮挡，自己的子孙不算遮挡。
+只有承载内容的控件算遮挡物：Pane / Group / Custom 等布局容器（CONTAINER_TYPES）即使没有子节点、铺满整个窗口，
+也常常是透明的，把它们当作不透明会让前面的工具栏按钮等被误判为完全遮挡；容器里真正挡住别人的是其中的子孙。
+
+- 均匀网格：每个格子按层叠从上到下存放覆盖它的元素，点查询只检查一个格子，亚毫秒
+- 降采样的 id 缓冲（z-buffer）：按层叠从下到上把元素下标画进缓冲，元素框内“最上层属于自己子树”的格子占比即可见比例
+- 屏幕外（is_offscreen）与面积为 0 的元素不参与遮挡，可见比例为 0
+"""
+import numpy as np
+
+from element_table import ElementTable, FLAG_NO_RECT
+from tree_format import FLAG_OFFSCREEN
+
+CONTAINER_TYPES = frozenset({"WindowControl", "PaneControl", "GroupControl", "CustomControl", "ToolBarControl"})
+
+
+class SpatialIndex:
+    """size=(宽, 高) 时只考虑画面范围内的部分；省略时取所有框的外接矩形
+
+    elements：屏幕上有面积的元素（计算可见比例）；occluders：其中类型不在 containers 中的（画进 id 缓冲与网格）
+    """
+
+    def __init__(self, table, size=None, cell=64, scale=2, containers=CONTAINER_TYPES):
+        self.table = table
+        self.cell = cell
+        self.scale = scale
+        boxes = table.boxes.astype(np.int64)
+        on_screen = (table.area() > 0) & ((table.flags & (FLAG_OFFSCREEN | FLAG_NO_RECT)) == 0)
+        self.elements = np.flatnonzero(on_screen)
+        self.occluders = np.flatnonzero(on_screen & ~table.type_mask(containers))
+        if size is not None:
+            self.origin = (0, 0)
+            self.extent = (int(size[0]), int(size[1]))
+        elif len(self.elements):
+            painted = boxes[self.elements]
+            self.origin = (int(painted[:, 0].min()), int(painted[:, 1].min()))
+            self.extent = (int(painted[:, 2].max()), int(painted[:, 3].max()))
+        else:
+            self.origin = self.extent = (0, 0)
+        # 裁剪到索引范围，平移到原点
+        ox, oy = self.origin
+        self._boxes = np.empty_like(boxes)
+        self._boxes[:, [0, 2]] = np.clip(boxes[:, [0, 2]], ox, self.extent[0]) - ox
+        self._boxes[:, [1, 3]] = np.clip(boxes[:, [1, 3]], oy, self.extent[1]) - oy
+        self._build_grid()
+        self._buffer = None
+        self._fraction = None
+
+    @classmethod
+    def from_tree(cls, ui_tree, **kwargs):
+        return cls(ElementTable.from_tree(ui_tree), **kwargs)
+
+    # ---------- 网格与点查询 ----------
+
+    def _build_grid(self):
+        width, height = self.extent[0] - self.origin[0], self.extent[1] - self.origin[1]
+        self.cols = max(1, -(-width // self.cell))
+        self.rows = max(1, -(-height // self.cell))
+        boxes = self._boxes[self.occluders]
+        keep = (boxes[:, 2] > boxes[:, 0]) & (boxes[:, 3] > boxes[:, 1])
+        ids, boxes = self.occluders[keep], boxes[keep]
+        cx0, cy0 = boxes[:, 0] // self.cell, boxes[:, 1] // self.cell
+        cx1, cy1 = (boxes[:, 2] - 1) // self.cell, (boxes[:, 3] - 1) // self.cell
+        spans_x, spans_y = cx1 - cx0 + 1, cy1 - cy0 + 1
+        counts = spans_x * spans_y
+        owner = np.repeat(np.arange(len(ids)), counts)
+        # 每个元素覆盖的第 k 个格子：k 在该元素内的偏移换算成 (列, 行)
+        k = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+        cells = (cy0[owner] + k // spans_x[owner]) * self.cols + cx0[owner] + k % spans_x[owner]
+        order = np.lexsort((-ids[owner], cells))
+        self._cell_ids = ids[owner][order]
+        self._cell_start = np.searchsorted(cells[order], np.arange(self.rows * self.cols + 1))
+
+    def hits(self, x, y):
+        """包含点 (x, y) 的遮挡物下标，从最上层到最下层（布局容器不在其中）"""
+        px, py = x - self.origin[0], y - self.origin[1]
+        if not (0 <= px < self.extent[0] - self.origin[0] and 0 <= py < self.extent[1] - self.origin[1]):
+            return np.empty(0, dtype=np.int64)
+        cell = (py // self.cell) * self.cols + px // self.cell
+        candidates = self._cell_ids[self._cell_start[cell]:self._cell_start[cell + 1]]
+        boxes = self._boxes[candidates]
+        inside = (boxes[:, 0] <= px) & (px < boxes[:, 2]) & (boxes[:, 1] <= py) & (py < boxes[:, 3])
+        return candidates[inside]
+
+    def topmost(self, x, y):
+        """点 (x, y) 处最上层遮挡物的下标，没有时为 -1"""
+        hits = self.hits(x, y)
+        return int(hits[0]) if len(hits) else -1
+
+    def owns(self, i, j):
+        """j 是否为 i 本身或其子孙"""
+        return i <= j < self.table.end[i]
+
+    # ---------- 遮挡 ----------
+
+    def _cell_box(self, i):
+        s = self.scale
+        x0, y0, x1, y1 = self._boxes[i]
+        return y0 // s, -(-y1 // s), x0 // s, -(-x1 // s)
+
+    def buffer(self):
+        """降采样 id 缓冲：每格为最上层遮挡物下标，无遮挡物为 -1"""
+        if self._buffer is None:
+            s = self.scale
+            width, height = self.extent[0] - self.origin[0], self.extent[1] - self.origin[1]
+            buf = np.full((max(1, -(-height // s)), max(1, -(-width // s))), -1, dtype=np.int32)
+            for i in self.occluders.tolist():
+                y0, y1, x0, x1 = self._cell_box(i)
+                buf[y0:y1, x0:x1] = i
+            self._buffer = buf
+        return self._buffer
+
+    def visible_fraction(self):
+        """(N,) float32：元素框（画面范围内部分）中未被后出现的非子孙遮挡物盖住的比例
+
+        某格最上层的遮挡物下标 < end[i]（在 i 之下、属于 i 的子树，或没有遮挡物）即该格可见。
+        """
+        if self._fraction is None:
+            buf = self.buffer()
+            fraction = np.zeros(len(self.table), dtype=np.float32)
+            end = self.table.end
+            for i in self.elements.tolist():
+                y0, y1, x0, x1 = self._cell_box(i)
+                region = buf[y0:y1, x0:x1]
+                if region.size:
+                    fraction[i] = np.count_nonzero(region < end[i]) / region.size
+            self._fraction = fraction
+        return self._fraction
+
+    def visible_mask(self, min_fraction=0.0):
+        """可见比例大于 min_fraction 的元素；默认即去掉完全被遮挡的"""
+        return self.visible_fraction() > min_fraction
+
+    def _uncovered(self, i, hit):
+        """topmost 结果 hit 处 i 未被遮挡：没有遮挡物，或最上层在 i 之下 / 属于 i 的子树"""
+        return hit < self.table.end[i]
+
+    def click_point(self, i):
+        """元素 i 上一个未被遮挡的点：优先中心，否则取离中心最近的可见格；完全被遮挡时为 None"""
+        left, top, right, bottom = (int(v) for v in self.table.boxes[i])
+        x, y = (left + right) // 2, (top + bottom) // 2
+        if self._uncovered(i, self.topmost(x, y)):
+            return x, y
+        y0, y1, x0, x1 = self._cell_box(i)
+        region = self.buffer()[y0:y1, x0:x1]
+        ys, xs = np.nonzero(region < self.table.end[i])
+        if not len(ys):
+            return None
+        s = self.scale
+        px = self.origin[0] + (x0 + xs) * s + s // 2
+        py = self.origin[1] + (y0 + ys) * s + s // 2
+        for k in np.argsort((px - x) ** 2 + (py - y) ** 2)[:16].tolist():
+            if self._uncovered(i, self.topmost(int(px[k]), int(py[k]))):
+                return int(px[k]), int(py[k])
+        return None
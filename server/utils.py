@@ -1,3 +1,11 @@
+import sys
+from pathlib import Path
+
+# 控制端与被控端共用的格式模块（tree_format 等）放在 client/ 下，且只依赖标准库
+CLIENT_DIR = Path(__file__).resolve().parent.parent / "client"
+if str(CLIENT_DIR) not in sys.path:
+    sys.path.append(str(CLIENT_DIR))
+
 COLORS = {
     "red":     "#ff0000",
     "green":   "#00ff00",
@@ -0,0 +1,9 @@
+"""测试在任意平台运行：client/ 与 server/ 均为平铺模块，加入 sys.path 后按模块名导入"""
+import sys
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+for directory in ("client", "server"):
+    path = str(ROOT / directory)
+    if path not in sys.path:
+        sys.path.insert(0, path)
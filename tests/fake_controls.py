@@ -0,0 +1,32 @@
+"""测试共用的假控件树：FakeProvider 读取的嵌套 dict（与 *_layout.json 同结构）"""
+
+
+def node(name, control_type, rect=(0, 0, 10, 10), offscreen=False, children=()):
+    left, top, right, bottom = rect
+    return {
+        "name": name,
+        "control_type": control_type,
+        "automation_id": f"aid_{name}",
+        "is_enabled": True,
+        "is_offscreen": offscreen,
+        "rect": {"left": left, "top": top, "right": right, "bottom": bottom},
+        "clickable": [left + 1, top + 1, True],
+        "focusable": control_type == "ButtonControl",
+        "children": list(children),
+    }
+
+
+def sample_tree():
+    return node("root", "WindowControl", (0, 0, 100, 100), children=[
+        node("pane", "PaneControl", (0, 0, 50, 50), children=[
+            node("ok", "ButtonControl", (1, 1, 20, 10)),
+            node("label", "TextControl", (1, 20, 20, 30)),
+            node("hidden", "ButtonControl", (1, 40, 20, 50), offscreen=True, children=[
+                node("hidden_child", "TextControl", (2, 41, 5, 45)),
+            ]),
+        ]),
+        node("empty", "PaneControl", (60, 60, 60, 80), children=[
+            node("inside_empty", "ButtonControl", (60, 60, 70, 70)),
+        ]),
+        node("cancel", "ButtonControl", (60, 10, 90, 20)),
+    ])
@@ -0,0 +1,51 @@
+"""CaptureStore：限额淘汰与溢出到磁盘"""
+import threading
+
+from capture_store import CaptureStore
+
+
+def test_spill_creates_directory_and_serves_evicted(tmp_path):
+    spill_dir = tmp_path / "shared" / "spill"
+    store = CaptureStore(max_items=1, spill_dir=str(spill_dir))
+    assert spill_dir.is_dir()
+    first = store.put(b"first")
+    second = store.put(b"second")
+    assert store.stats()["spilled"] == 1
+    assert (spill_dir / first).read_bytes() == b"first"
+    assert store.get(first) == (b"first", "image/png")
+    assert not (spill_dir / first).exists()
+    assert store.get(second) == (b"second", "image/png")
+
+
+def test_spill_write_happens_outside_the_lock(tmp_path, monkeypatch):
+    import builtins
+
+    store = CaptureStore(max_items=1, spill_dir=str(tmp_path))
+    first = store.put(b"first")
+    writing, release = threading.Event(), threading.Event()
+    real_open = builtins.open
+
+    def slow_open(path, mode="r", *args, **kwargs):
+        if "w" in mode:
+            writing.set()
+            release.wait(5)
+        return real_open(path, mode, *args, **kwargs)
+
+    monkeypatch.setattr(builtins, "open", slow_open)
+    writer = threading.Thread(target=store.put, args=(b"second",))
+    writer.start()
+    assert writing.wait(5)
+    # 写盘进行中：仓库仍可读，被淘汰的条目从内存直接提供
+    assert store.stats()["items"] == 1
+    assert store.get(first) == (b"first", "image/png")
+    release.set()
+    writer.join(5)
+    assert store.stats()["spilled"] == 0 and not (tmp_path / first).exists()
+
+
+def test_lru_eviction_without_spill():
+    store = CaptureStore(max_items=2)
+    ids = [store.put(bytes([i])) for i in range(3)]
+    assert store.get(ids[0]) is None
+    assert store.get(ids[2]) == (bytes([2]), "image/png")
+    assert store.stats()["evicted_lru"] == 1
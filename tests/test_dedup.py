@@ -0,0 +1,24 @@
+"""DedupIndex：批量保存与跨运行加载"""
+import json
+
+from dedup import DedupIndex
+
+
+def test_index_saved_in_batches_and_on_report(tmp_path):
+    path = tmp_path / "dedup_index.json"
+    index = DedupIndex(path, save_every=3)
+    for i in range(4):
+        index.add(f"sample_{i}", i, f"tree_{i}")
+        assert path.exists() == (i >= 2)
+    assert len(json.loads(path.read_text())["entries"]) == 3
+    assert index.report()["known_states"] == 4
+    assert len(json.loads(path.read_text())["entries"]) == 4
+
+    reloaded = DedupIndex(path)
+    assert [entry["sample"] for entry in reloaded.entries] == [f"sample_{i}" for i in range(4)]
+
+
+def test_close_without_new_samples_does_not_write(tmp_path):
+    path = tmp_path / "dedup_index.json"
+    DedupIndex(path).close()
+    assert not path.exists()
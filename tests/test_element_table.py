@@ -0,0 +1,62 @@
+"""ElementTable：嵌套树与 ColumnarTree 的数组视图一致，筛选 / 裁剪 / IoU 去重在数组上完成"""
+import numpy as np
+
+from element_table import ElementTable, subtree_ends
+from fake_controls import node, sample_tree
+from tree_format import ColumnarTree
+from ui_tree import FakeProvider, build_tree
+
+
+def layout(root=None):
+    return build_tree(FakeProvider(), root or sample_tree(), "App")
+
+
+def names(table, indices):
+    return [table.names[i] for i in indices.tolist()]
+
+
+def test_nested_and_columnar_inputs_agree():
+    tree = layout()
+    nested, columnar = ElementTable.from_tree(tree), ElementTable.from_tree(ColumnarTree.from_tree(tree))
+    assert np.array_equal(nested.boxes, columnar.boxes)
+    assert np.array_equal(nested.parent, columnar.parent)
+    assert np.array_equal(nested.end, columnar.end)
+    assert nested.names == columnar.names
+    assert [nested.control_type(i) for i in range(len(nested))] == \
+        [columnar.control_type(i) for i in range(len(columnar))]
+
+
+def test_subtree_ends_match_preorder():
+    # root -> (a -> (b, c), d)
+    parent = np.array([-1, 0, 1, 1, 0])
+    depth = np.array([0, 1, 2, 2, 1])
+    assert subtree_ends(parent, depth).tolist() == [5, 4, 3, 4, 5]
+
+
+def test_select_drops_offscreen_empty_and_out_of_bounds_subtrees():
+    table = ElementTable.from_tree(layout())
+    indices, _ = table.select(["ButtonControl"])
+    # hidden 在屏幕外；inside_empty 的框非空，其父 empty 面积为 0 但不是按钮
+    assert names(table, indices) == ["ok", "inside_empty", "cancel"]
+    indices, _ = table.select(None, size=(50, 50), out_of_bounds="prune")
+    assert "empty" not in names(table, indices) and "inside_empty" not in names(table, indices)
+    assert "cancel" not in names(table, indices)
+    indices, boxes = table.select(["ButtonControl"], size=(80, 80), out_of_bounds="clip")
+    clipped = dict(zip(names(table, indices), boxes.tolist()))
+    assert clipped["cancel"] == [60, 10, 80, 20]
+
+
+def test_dedup_keeps_deepest_of_stacked_wrappers():
+    root = node("root", "WindowControl", (0, 0, 100, 100), children=[
+        node("wrapper", "PaneControl", (10, 10, 50, 30), children=[
+            node("button", "ButtonControl", (10, 10, 50, 31)),
+        ]),
+        node("other", "ButtonControl", (60, 10, 90, 30)),
+    ])
+    table = ElementTable.from_tree(layout(root))
+    indices, boxes = table.select(["PaneControl", "ButtonControl"])
+    assert names(table, table.dedup(indices, boxes, 0.9)) == ["button", "other"]
+    assert names(table, table.dedup(indices, boxes, 0.9, prefer=["PaneControl"])) == ["wrapper", "other"]
+    elements = table.elements(table.dedup(indices, boxes, 0.9))
+    assert elements[0]["bbox"] == {"left": 10, "top": 10, "right": 50, "bottom": 31}
+    assert elements[0]["depth"] == 2 and elements[0]["type"] == "ButtonControl"
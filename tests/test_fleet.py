@@ -0,0 +1,134 @@
+"""fleet 调度：每台被控端用线程化的 http.server 桩代替，提供 /workers/stats 与任务接口 /job"""
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from fleet import Endpoint, Fleet, Job
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    def log_message(self, *args):
+        pass
+
+    def _reply(self, status):
+        self.send_response(status)
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+    def do_GET(self):
+        self._reply(200 if self.server.healthy else 503)
+
+    def do_POST(self):
+        stub = self.server
+        self.rfile.read(int(self.headers.get("Content-Length") or 0))
+        with stub.lock:
+            stub.active += 1
+            stub.max_active = max(stub.max_active, stub.active)
+            stub.jobs += 1
+            first = stub.jobs == 1
+        if first and stub.down_after_first:
+            stub.healthy = False
+        time.sleep(stub.delay)
+        with stub.lock:
+            stub.active -= 1
+        self._reply(500 if stub.fail else 200)
+
+
+class Stub(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, delay=0.05, fail=False, healthy=True, down_after_first=False):
+        super().__init__(("127.0.0.1", 0), StubHandler)
+        self.delay = delay
+        self.fail = fail
+        self.healthy = healthy
+        self.down_after_first = down_after_first
+        self.lock = threading.Lock()
+        self.active = 0
+        self.max_active = 0
+        self.jobs = 0
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+
+    def endpoint(self, concurrency=1):
+        return Endpoint("127.0.0.1", self.server_address[1], concurrency)
+
+
+@pytest.fixture
+def stubs():
+    started = []
+
+    def make(**kwargs):
+        stub = Stub(**kwargs)
+        started.append(stub)
+        return stub
+    yield make
+    for stub in started:
+        stub.shutdown()
+        stub.server_close()
+
+
+def post_job(endpoint, app_config):
+    return endpoint.rpc.post("job", app_config).status_code == 200
+
+
+def apps(count):
+    return [{"app_name": f"app_{i}"} for i in range(count)]
+
+
+def test_concurrency_stays_within_slots(stubs):
+    first, second = stubs(delay=0.1), stubs(delay=0.1)
+    fleet = Fleet([first.endpoint(2), second.endpoint(1)], runner=post_job, health_interval=0.05,
+                  report_interval=60)
+    summary = fleet.run(apps(9))
+    assert summary["done"] == 9 and summary["failed"] == 0
+    assert first.max_active == 2
+    assert second.max_active == 1
+    assert first.jobs + second.jobs == 9
+    assert {name: e["completed"] for name, e in summary["endpoints"].items()} == \
+        {endpoint.name: stub.jobs for endpoint, stub in zip(fleet.endpoints, (first, second))}
+
+
+def test_failed_job_retried_on_other_endpoint(stubs):
+    # B 在首次健康检查时不健康，任务先落到 A；A 失败前 B 已恢复，重试必须交给 B 而不是 A
+    broken, good = stubs(delay=0.5, fail=True), stubs(healthy=False)
+    fleet = Fleet([broken.endpoint(), good.endpoint()], runner=post_job, health_interval=0.05,
+                  report_interval=60)
+    threading.Timer(0.1, lambda: setattr(good, "healthy", True)).start()
+    summary = fleet.run(apps(1))
+    job = summary["jobs"][0]
+    assert job["status"] == "done"
+    assert job["attempts"] == 2
+    assert job["endpoint"] == fleet.endpoints[1].name
+    assert broken.jobs == 1 and good.jobs == 1
+
+
+def test_unhealthy_endpoint_gives_up_after_offline_timeout(stubs):
+    stub = stubs(delay=0.3, down_after_first=True)
+    fleet = Fleet([stub.endpoint()], runner=post_job, health_interval=0.05, report_interval=60,
+                  offline_timeout=0.3)
+    t0 = time.monotonic()
+    summary = fleet.run(apps(3))
+    assert time.monotonic() - t0 < 5
+    assert stub.jobs == 1
+    assert not fleet.endpoints[0].healthy
+    assert summary["done"] == 1 and summary["failed"] == 2
+    assert [job["error"] for job in summary["jobs"][1:]] == ["no healthy endpoint"] * 2
+
+
+def test_report_counts_and_throughput(capsys):
+    fleet = Fleet([Endpoint("127.0.0.1", 1)])
+    fleet._jobs = [Job(i, cfg) for i, cfg in enumerate(apps(6))]
+    for job, status in zip(fleet._jobs, ("done", "done", "done", "failed", "queued", "running")):
+        job.status = status
+    fleet.started = time.monotonic() - 60
+    progress = fleet.progress()
+    assert (progress["total"], progress["done"], progress["failed"], progress["queued"], progress["running"]) == \
+        (6, 3, 1, 1, 1)
+    assert progress["jobs_per_min"] == pytest.approx(4.0, rel=0.01)
+    assert progress["eta_min"] == pytest.approx(0.5, rel=0.05)
+    fleet.report()
+    line = capsys.readouterr().out
+    assert "3/6 done, 1 failed, 1 running, 1 queued" in line
+    assert "127.0.0.1:1 DOWN 0/1" in line
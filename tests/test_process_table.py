@@ -0,0 +1,91 @@
+"""ProcessTable 的增量刷新、pid 复用与事件顺序：用可替换的 list_pids / read_process 模拟进程集合"""
+import pytest
+
+from events import EventHub, parse_pids, process_event
+from process_table import ProcessTable
+
+
+class FakeProcesses:
+    def __init__(self):
+        self.procs = {}
+
+    def spawn(self, pid, ppid, exe, create_time):
+        self.procs[pid] = {"ppid": ppid, "name": exe.rsplit("/", 1)[-1], "exe": exe, "create_time": create_time}
+
+    def kill(self, pid):
+        self.procs.pop(pid, None)
+
+    def list_pids(self):
+        return list(self.procs)
+
+    def read_process(self, pid):
+        info = self.procs.get(pid)
+        return dict(info) if info else None
+
+
+def make_table():
+    fake = FakeProcesses()
+    return fake, ProcessTable(min_interval=0, list_pids=fake.list_pids, read_process=fake.read_process)
+
+
+def test_exe_lookup_and_descendants():
+    fake, table = make_table()
+    fake.spawn(1, 0, "/bin/init", 1.0)
+    fake.spawn(10, 1, "/opt/app/app", 2.0)
+    fake.spawn(11, 10, "/opt/app/helper", 3.0)
+    fake.spawn(12, 11, "/opt/app/helper", 4.0)
+    assert table.pids_for_exe("/opt/app/app") == {10}
+    assert table.descendants(10) == {11, 12}
+    assert table.related([10, 99]) == {10, 11, 12}
+
+
+def test_reused_pid_is_replaced_between_refreshes():
+    fake, table = make_table()
+    fake.spawn(10, 0, "/opt/app/app", 2.0)
+    fake.spawn(11, 10, "/opt/app/app", 3.0)
+    assert table.pids_for_exe("/opt/app/app") == {10, 11}
+    # 11 退出后 pid 立即被无关进程复用：pid 集合没有变化
+    fake.kill(11)
+    fake.spawn(11, 0, "/usr/bin/editor", 9.0)
+    assert table.pids_for_exe("/opt/app/app") == {10}
+    assert table.processes_for_exe("/usr/bin/editor")[0]["create_time"] == 9.0
+    assert table.descendants(10) == frozenset()
+    assert table.info(11)["exe"] == "/usr/bin/editor"
+    assert table.stats()["reused"] == 1
+
+
+def test_reused_child_pid_dropped_from_descendants():
+    fake, table = make_table()
+    fake.spawn(10, 0, "/opt/app/app", 2.0)
+    fake.spawn(11, 10, "/opt/app/app", 3.0)
+    fake.spawn(12, 11, "/opt/app/app", 4.0)
+    assert table.descendants(10) == {11, 12}
+    fake.kill(11)
+    fake.kill(12)
+    fake.spawn(12, 0, "/usr/bin/editor", 9.0)
+    assert table.descendants(10) == frozenset()
+    assert table.related([10]) == {10}
+
+
+
+def test_spawn_events_published_parent_first():
+    fake, table = make_table()
+    fake.spawn(1, 0, "/bin/init", 1.0)
+    table.refresh()
+    hub = EventHub()
+    subscription = hub.subscribe(pids=[1])
+    table.listeners.append(lambda spawned, exited: [hub.publish(process_event("process_spawn", proc))
+                                                    for proc in spawned])
+    # 子孙进程在 pid 集合中排在父进程之前：按集合顺序发布时会先于父进程到达而被丢弃
+    for pid, ppid, created in ((7, 1, 2.0), (30, 7, 3.0), (500, 30, 4.0)):
+        fake.spawn(pid, ppid, "/opt/app/app", created)
+    table.refresh()
+    assert subscription.tracked == {1, 500, 30, 7}
+
+
+def test_parse_pids_rejects_garbage():
+    assert parse_pids("") == []
+    assert parse_pids(" 12, 34 ,") == [12, 34]
+    for bad in ("abc", "12,x", "-5", "0", "1.5"):
+        with pytest.raises(ValueError):
+            parse_pids(bad)
@@ -0,0 +1,78 @@
+"""RpcClient 的重试策略与 AsyncRpcClient 的并发上限：用线程化的 http.server 桩代替被控端"""
+import asyncio
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+import requests
+
+from rpc_client import AsyncRpcClient, RpcClient
+
+
+class SlowHandler(BaseHTTPRequestHandler):
+    def log_message(self, *args):
+        pass
+
+    def do_POST(self):
+        server = self.server
+        self.rfile.read(int(self.headers.get("Content-Length") or 0))
+        with server.lock:
+            server.hits += 1
+            server.active += 1
+            server.max_active = max(server.max_active, server.active)
+        time.sleep(server.delay)
+        with server.lock:
+            server.active -= 1
+        try:
+            self.send_response(200)
+            self.send_header("Content-Length", "2")
+            self.end_headers()
+            self.wfile.write(b"{}")
+        except OSError:
+            pass  # 客户端已超时断开
+
+
+@pytest.fixture
+def stub():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), SlowHandler)
+    server.daemon_threads = True
+    server.lock = threading.Lock()
+    server.hits = server.active = server.max_active = 0
+    server.delay = 0.0
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def client_for(server, **kwargs):
+    return RpcClient("127.0.0.1", server.server_address[1], backoff=0.01, **kwargs)
+
+
+def test_read_timeout_not_retried_on_expensive_routes(stub):
+    stub.delay = 0.3
+    rpc = client_for(stub, retries=2)
+    with pytest.raises(requests.Timeout):
+        rpc.post("capture", timeout=(1, 0.1))
+    assert stub.hits == 1
+    with pytest.raises(requests.Timeout):
+        rpc.post("screenshot", timeout=(1, 0.1))
+    assert stub.hits == 4
+    assert rpc.stats()["screenshot"]["retries"] == 2 and rpc.stats()["capture"]["retries"] == 0
+
+
+def test_connect_errors_still_retried_on_expensive_routes():
+    rpc = RpcClient("127.0.0.1", 9, retries=2, backoff=0.01)  # discard 端口，无人监听
+    with pytest.raises(requests.ConnectionError):
+        rpc.post("get_ui_tree")
+    assert rpc.stats()["get_ui_tree"]["retries"] == 2
+
+
+def test_post_many_bounded_by_concurrency(stub):
+    stub.delay = 0.05
+    client = AsyncRpcClient(client_for(stub, pool_size=4), concurrency=2)
+    responses = asyncio.run(client.post_many("query", [{"selector": "Button"}] * 6))
+    client.close()
+    assert [r.status_code for r in responses] == [200] * 6
+    assert stub.max_active == 2
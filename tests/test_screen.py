@@ -0,0 +1,22 @@
+"""截图编码：raw 只用于传输，落盘前转成可解码的 PNG"""
+import io
+
+import pytest
+
+Image = pytest.importorskip("PIL.Image")
+
+from screen import encode_image, persistable
+
+
+def test_raw_frames_are_persisted_as_png():
+    image = Image.new("RGB", (7, 3), (10, 20, 30))
+    image.putpixel((6, 2), (255, 0, 0))
+    body, fmt = persistable(encode_image(image, "raw"), "raw", 7, 3)
+    assert fmt == "png"
+    with Image.open(io.BytesIO(body)) as decoded:
+        assert decoded.size == (7, 3) and decoded.convert("RGB").getpixel((6, 2)) == (255, 0, 0)
+
+
+def test_encoded_formats_pass_through():
+    body = encode_image(Image.new("RGB", (2, 2)), "png")
+    assert persistable(body, "png", 2, 2) == (body, "png")
@@ -0,0 +1,61 @@
+"""shards：分片写入、索引随机读取、跨次打开追加"""
+import json
+import tarfile
+
+import pytest
+
+from fake_controls import sample_tree
+from shards import ShardReader, ShardWriter
+from tree_format import ColumnarTree
+from ui_tree import FakeProvider, build_tree
+
+
+def layout_bytes():
+    return json.dumps(build_tree(FakeProvider(), sample_tree(), "App")).encode("utf-8")
+
+
+def test_roundtrip_across_shards(tmp_path):
+    tree = json.loads(layout_bytes())
+    uit = ColumnarTree.from_tree(tree).to_bytes()
+    with ShardWriter(tmp_path, max_shard_bytes=1024) as writer:
+        writer.add("a/0", (b"png-0" * 300, "png"), (layout_bytes(), "json"), (b"overlay", ".webp"))
+        writer.add("a/1", (b"png-1", "png"), (uit, "uit"))
+        writer.add("b/0", (b"jpg-2", "JPG"), (layout_bytes(), "json"))
+
+    with ShardReader(tmp_path) as reader:
+        assert len(reader) == 3
+        assert reader.names == ["a/0", "a/1", "b/0"]
+        assert reader.read(0) == (b"png-0" * 300, "png")
+        assert reader.read("a/0", "overlay") == (b"overlay", "webp")
+        assert reader.read("a/1", "overlay") == (None, None)
+        assert reader.read(2) == (b"jpg-2", "jpg")
+        assert reader.layout(0) == tree
+        assert reader.layout("a/1").to_tree() == tree
+        # 第一个样本超过分片上限，后面的样本写进下一个分片
+        assert reader.record(0)[0] == 0 and reader.record(1)[0] == 1
+        with pytest.raises(IndexError):
+            reader.record(3)
+
+    with tarfile.open(tmp_path / "shard-000000.tar") as tar:
+        assert tar.getnames() == ["a/0.screenshot.png", "a/0.layout.json", "a/0.overlay.webp"]
+
+
+def test_reopen_appends_in_a_new_shard(tmp_path):
+    with ShardWriter(tmp_path) as writer:
+        writer.add("first", (b"1", "png"), (b"{}", "json"))
+    with ShardWriter(tmp_path) as writer:
+        writer.add("second", (b"2", "png"), (b"{}", "json"))
+    with ShardReader(tmp_path) as reader:
+        assert reader.names == ["first", "second"]
+        assert [reader.record(i)[0] for i in range(2)] == [0, 1]
+        assert reader.read("second") == (b"2", "png")
+
+
+def test_rejects_unknown_formats_and_bad_index(tmp_path):
+    with ShardWriter(tmp_path / "ok") as writer:
+        with pytest.raises(ValueError):
+            writer.add("x", (b"1", "gif"), (b"{}", "json"))
+    (tmp_path / "bad").mkdir()
+    (tmp_path / "bad" / "index.bin").write_bytes(b"NOPE" + bytes(16))
+    with pytest.raises(ValueError):
+        ShardReader(tmp_path / "bad")
@@ -0,0 +1,76 @@
+"""SpatialIndex：点查询与遮挡可见性；布局容器不算遮挡物，遮挡过滤默认关闭"""
+from element_table import ElementTable
+from fake_controls import node
+from overlay import flatten_elements
+from spatial import SpatialIndex
+from ui_tree import FakeProvider, build_tree
+
+
+def index_for(root, **kwargs):
+    table = ElementTable.from_tree(build_tree(FakeProvider(), root, "App"))
+    return table, SpatialIndex(table, **kwargs)
+
+
+def by_name(table, name):
+    return table.names.index(name)
+
+
+def toolbar_window():
+    return node("window", "WindowControl", (0, 0, 200, 100), children=[
+        node("toolbar", "ToolBarControl", (0, 0, 200, 20), children=[
+            node("Save", "ButtonControl", (0, 0, 40, 20)),
+            node("Open", "ButtonControl", (40, 0, 80, 20)),
+        ]),
+        node("content", "PaneControl", (0, 0, 200, 100)),  # 铺满窗口、没有子节点的透明容器
+    ])
+
+
+def test_childless_container_does_not_occlude():
+    table, spatial = index_for(toolbar_window())
+    visible = spatial.visible_mask()
+    for name in ("toolbar", "Save", "Open", "content"):
+        assert visible[by_name(table, name)], name
+    save = by_name(table, "Save")
+    assert spatial.topmost(20, 10) == save
+    assert spatial.click_point(save) == (20, 10)
+
+
+def test_content_inside_later_container_occludes():
+    root = node("window", "WindowControl", (0, 0, 100, 100), children=[
+        node("under", "ButtonControl", (10, 10, 50, 50)),
+        node("half", "ButtonControl", (60, 10, 100, 50)),
+        node("popup", "PaneControl", (0, 0, 100, 100), children=[
+            node("cover", "TextControl", (0, 0, 50, 60)),
+            node("strip", "TextControl", (60, 10, 80, 50)),
+        ]),
+    ])
+    table, spatial = index_for(root)
+    under, half = by_name(table, "under"), by_name(table, "half")
+    fraction = spatial.visible_fraction()
+    assert fraction[under] == 0 and not spatial.visible_mask()[under]
+    assert spatial.click_point(under) is None
+    assert 0.4 <= fraction[half] <= 0.6
+    x, y = spatial.click_point(half)
+    assert 80 <= x < 100 and 10 <= y < 50
+
+
+def test_offscreen_and_empty_elements_are_ignored():
+    root = node("window", "WindowControl", (0, 0, 100, 100), children=[
+        node("button", "ButtonControl", (10, 10, 50, 50)),
+        node("hidden", "TextControl", (0, 0, 100, 100), offscreen=True),
+        node("empty", "TextControl", (0, 0, 0, 100)),
+    ])
+    table, spatial = index_for(root)
+    assert spatial.visible_mask()[by_name(table, "button")]
+    assert not spatial.visible_mask()[by_name(table, "hidden")]
+    assert spatial.topmost(20, 20) == by_name(table, "button")
+
+
+def test_overlay_keeps_occluded_elements_unless_asked():
+    root = node("window", "WindowControl", (0, 0, 100, 100), children=[
+        node("under", "ButtonControl", (10, 10, 50, 50)),
+        node("cover", "TextControl", (0, 0, 60, 60)),
+    ])
+    tree = build_tree(FakeProvider(), root, "App")
+    assert [e["name"] for e in flatten_elements(tree)] == ["under", "cover"]
+    assert [e["name"] for e in flatten_elements(tree, drop_occluded=True)] == ["cover"]
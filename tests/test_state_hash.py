@@ -0,0 +1,33 @@
+"""state_hash：被控端的稳定判断与控制端的去重对同一状态给出相同的哈希"""
+import io
+
+from PIL import Image
+
+import ui_tree
+from dedup import image_dhash, tree_hash
+from fake_controls import sample_tree
+from state_hash import dhash, nodes_signature
+from tree_format import ColumnarTree
+from ui_tree import FakeProvider, build_tree, extract_records
+
+
+def test_tree_hash_matches_records_signature(monkeypatch):
+    monkeypatch.setattr(ui_tree, "open_provider", lambda ctrl, mode, prune: (FakeProvider(), ctrl))
+    signature = nodes_signature(extract_records(sample_tree()))
+    tree = build_tree(FakeProvider(), sample_tree(), "App")
+    assert tree_hash(tree) == signature
+    assert tree_hash(ColumnarTree.from_tree(tree)) == signature
+
+
+def test_tree_hash_sees_geometry():
+    tree = build_tree(FakeProvider(), sample_tree(), "App")
+    before = tree_hash(tree)
+    tree["children"][0]["rect"]["right"] += 1
+    assert tree_hash(tree) != before
+
+
+def test_image_dhash_matches_screen_dhash():
+    image = Image.linear_gradient("L").resize((64, 48)).convert("RGB")
+    buf = io.BytesIO()
+    image.save(buf, "PNG")
+    assert image_dhash(buf.getvalue()) == dhash(image)
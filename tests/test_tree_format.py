@@ -0,0 +1,56 @@
+"""v2 列式格式与嵌套 JSON 的无损互转"""
+from tree_format import ColumnarTree
+
+
+def leaf(name, **fields):
+    node = {"app_name": "App", "page_tag": "Main_0_1", "name": name, "control_type": "ButtonControl",
+            "automation_id": name, "is_enabled": True, "is_offscreen": False, "depth": 1,
+            "rect": {"left": 0, "top": 0, "right": 5, "bottom": 5}, "clickable": [1, 1, True],
+            "focusable": False, "children": []}
+    node.update(fields)
+    return node
+
+
+def sample_tree():
+    root = leaf("root", page_tag="Main_0", depth=0, control_type="WindowControl", clickable=None)
+    root["children"] = [
+        leaf("ok"),
+        leaf("unknown", is_enabled=None, focusable=None, automation_id=None),
+        leaf("disabled", is_enabled=False, focusable=True, extra_field=[1, 2]),
+    ]
+    return root
+
+
+def test_roundtrip_keeps_none_distinct_from_false():
+    tree = sample_tree()
+    decoded = ColumnarTree.from_bytes(ColumnarTree.from_tree(tree).to_bytes())
+    assert decoded.to_tree() == tree
+    unknown = decoded.node(2)
+    assert unknown["is_enabled"] is None and unknown["focusable"] is None
+    disabled = decoded.node(3)
+    assert disabled["is_enabled"] is False and disabled["focusable"] is True
+
+
+def test_unmap_point_inverts_the_capture_transform():
+    from tree_format import map_rect, unmap_point
+
+    transform = {"offset_x": 200, "offset_y": 100, "scale_x": 0.5, "scale_y": 0.5}
+    rect = map_rect({"left": 400, "top": 300, "right": 600, "bottom": 500}, transform)
+    assert rect == {"left": 100, "top": 100, "right": 200, "bottom": 200}
+    assert unmap_point((rect["left"] + rect["right"]) // 2, (rect["top"] + rect["bottom"]) // 2, transform) == (500, 400)
+
+
+def test_records_keep_extract_markers():
+    records = [
+        {"id": 0, "parent_id": None, "depth": 0, "name": "root", "control_type": "WindowControl",
+         "automation_id": "", "is_enabled": True, "is_offscreen": False,
+         "rect": {"left": 0, "top": 0, "right": 9, "bottom": 9}, "clickable": None, "focusable": False,
+         "truncated": True},
+        {"id": 1, "parent_id": 0, "depth": 1, "name": None, "control_type": "ButtonControl",
+         "automation_id": None, "is_enabled": None, "is_offscreen": False,
+         "rect": {"left": 1, "top": 1, "right": 5, "bottom": 5}, "clickable": None, "focusable": None,
+         "timed_out": True},
+    ]
+    decoded = ColumnarTree.from_bytes(ColumnarTree.from_records(records).to_bytes())
+    assert decoded.node(0)["truncated"] is True
+    assert decoded.node(1)["timed_out"] is True
@@ -0,0 +1,28 @@
+"""tree_query 选择器：属性值的类型按字段决定"""
+from fake_controls import node
+from tree_query import TreeQuery
+from ui_tree import FakeProvider, build_tree
+
+
+def numbered_tree():
+    return build_tree(FakeProvider(), node("root", "WindowControl", children=[
+        node("123", "ButtonControl"),
+        node("true", "TextControl"),
+        node("none", "TextControl"),
+        node("other", "ButtonControl"),
+    ]))
+
+
+def test_bare_number_matches_text_field():
+    query = TreeQuery(numbered_tree())
+    assert [n["name"] for n in query.query("*[name=123]")] == ["123"]
+    assert [n["name"] for n in query.query("Button[name!=123]")] == ["other"]
+    assert [n["name"] for n in query.query("*[name=true]")] == ["true"]
+    assert [n["name"] for n in query.query('*[name="none"]')] == ["none"]
+
+
+def test_bare_literals_keep_types_on_other_fields():
+    query = TreeQuery(numbered_tree())
+    assert [n["name"] for n in query.query("*[depth=0]")] == ["root"]
+    assert len(query.query("Text[is_enabled=true]")) == 2
+    assert query.query("*[name=none]") == []
@@ -0,0 +1,94 @@
+"""HandleCache：RuntimeId 路径句柄的 LRU / TTL 缓存、从最近的存活祖先找回、失效句柄"""
+import pytest
+
+import ui_browser
+from ui_browser import HandleCache, HandleError, format_handle, parse_handle
+from ui_tree import FakeProvider
+
+HWND = 100
+
+
+def control(rid, name, children=()):
+    return {"runtime_id": [rid], "name": name, "control_type": "PaneControl" if children else "ButtonControl",
+            "rect": {"left": 0, "top": 0, "right": 10, "bottom": 10}, "children": list(children)}
+
+
+def window():
+    return control(1, "root", [
+        control(2, "pane", [control(4, "ok"), control(5, "cancel"), control(6, "help")]),
+        control(3, "status"),
+    ])
+
+
+def make_cache(root, **kwargs):
+    windows = {HWND: root}
+    cache = HandleCache(lambda hwnd: windows[hwnd], alive=lambda hwnd: hwnd in windows, provider=FakeProvider(),
+                        **kwargs)
+    return cache, windows
+
+
+def handle(*rids):
+    out = str(HWND)
+    for rid in rids:
+        out = format_handle(out, (rid,))
+    return out
+
+
+def test_top_and_expand_return_child_handles():
+    cache, _ = make_cache(window())
+    top = cache.top(HWND, depth=1)
+    assert [child["handle"] for child in top["children"]] == [handle(2), handle(3)]
+    assert top["children"][0]["children"] is None  # 未展开
+    pane = cache.expand(handle(2))
+    assert [child["name"] for child in pane["children"]] == ["ok", "cancel", "help"]
+    assert cache.stats()["hits"] == 1 and cache.stats()["rewalks"] == 0
+
+
+def test_lru_eviction_and_rewalk_from_nearest_live_ancestor():
+    cache, _ = make_cache(window(), max_handles=5)
+    cache.top(HWND, depth=2)  # 依次写入 root, pane, status, ok, cancel, help -> 根被淘汰
+    assert cache.stats()["evicted_lru"] == 1
+    cache._drop(handle(2, 5))
+    before = cache.stats()["rewalk_steps"]
+    assert cache.properties([handle(2, 5)], ("name",)) == {handle(2, 5): {"name": "cancel"}}
+    stats = cache.stats()
+    # pane 仍在缓存中：只在它的 3 个子节点中找回，不必从（已被淘汰的）根开始
+    assert stats["rewalks"] == 1 and stats["rewalk_steps"] - before == 3
+
+
+def test_ttl_expiry_forces_rewalk(monkeypatch):
+    clock = [0.0]
+    monkeypatch.setattr(ui_browser.time, "monotonic", lambda: clock[0])
+    cache, _ = make_cache(window(), ttl=10.0)
+    cache.top(HWND, depth=2)
+    clock[0] = 11.0
+    assert cache.expand(handle(2), depth=0)["name"] == "pane"
+    stats = cache.stats()
+    assert stats["evicted_ttl"] >= 2 and stats["rewalks"] == 1
+
+
+def test_destroyed_element_and_closed_window_are_stale():
+    root = window()
+    cache, windows = make_cache(root)
+    cache.top(HWND, depth=2)
+    pane = root["children"][0]
+    ok = pane["children"].pop(0)
+    del ok["runtime_id"]  # 控件已销毁：重新读取的 RuntimeId 与句柄不再一致
+    with pytest.raises(HandleError):
+        cache.resolve(handle(2, 4))
+    assert cache.stats()["stale"] == 1 and cache.stats()["lost"] == 1
+    assert cache.properties([handle(2, 5)], ("name",))[handle(2, 5)] == {"name": "cancel"}
+
+    del windows[HWND]
+    result = cache.properties([handle(2, 5), "not-a-handle"], ("name",))
+    assert result[handle(2, 5)]["stale"] is True
+    assert "stale" not in result["not-a-handle"]
+    with pytest.raises(HandleError):
+        cache.expand(handle(2))
+
+
+def test_parse_handle_roundtrip_and_errors():
+    assert parse_handle(format_handle(format_handle("7", (42, 1)), (3,))) == (7, [(42, 1), (3,)])
+    for bad in ("", "x/1", "7/a.b", None):
+        with pytest.raises(ValueError):
+            parse_handle(bad)
@@ -0,0 +1,137 @@
+"""ui_tree 的建树与裁剪：用 FakeProvider 在 Linux 上对照原 extract_ui 的输出结构"""
+from fake_controls import sample_tree
+from tree_format import iter_tree
+from ui_tree import FakeProvider, PruneOptions, build_tree, extract_records, iter_nodes
+
+
+def baseline_extract_ui(ctrl, app_name="App", page_tag="Main", depth=0):
+    """原 windows_automation_server.extract_ui 的递归逻辑，控件属性换成 dict 读取"""
+    return {
+        "app_name": app_name,
+        "page_tag": f"{page_tag}_{depth}",
+        "name": ctrl["name"],
+        "control_type": ctrl["control_type"],
+        "automation_id": ctrl["automation_id"],
+        "is_enabled": ctrl["is_enabled"],
+        "is_offscreen": ctrl["is_offscreen"],
+        "depth": depth,
+        "rect": dict(ctrl["rect"]),
+        "clickable": ctrl["clickable"],
+        "focusable": ctrl["focusable"],
+        "children": [baseline_extract_ui(child, app_name, f"{page_tag}_{depth}", depth + 1)
+                     for child in ctrl["children"]],
+    }
+
+
+def names(tree):
+    return [n["name"] for n in iter_tree(tree)]
+
+
+def test_build_tree_matches_baseline_shape():
+    root = sample_tree()
+    for provider in (FakeProvider(), FakeProvider(cached=True)):
+        assert build_tree(provider, provider.prepare(root), "App") == baseline_extract_ui(root)
+
+
+def test_extract_records_are_preorder_and_flat():
+    root = sample_tree()
+    records = list(iter_nodes(FakeProvider(), root))
+    assert [r["id"] for r in records] == list(range(len(records)))
+    assert records[0]["parent_id"] is None
+    assert all(r["parent_id"] < r["id"] for r in records[1:])
+    assert [r["name"] for r in records] == names(baseline_extract_ui(root))
+    assert set(records[0]) == {"id", "parent_id", "depth", "name", "control_type", "automation_id",
+                               "is_enabled", "is_offscreen", "rect", "clickable", "focusable"}
+
+
+def test_extract_records_falls_back_to_live_walk(monkeypatch):
+    import ui_tree
+
+    root = sample_tree()
+    monkeypatch.setattr(ui_tree, "open_provider", lambda ctrl, mode, prune: (FakeProvider(), ctrl))
+    monkeypatch.setattr(ui_tree, "LiveProvider", FakeProvider)
+    assert [r["name"] for r in extract_records(root)] == names(sample_tree())
+
+
+def test_prune_include_types_reparents_to_kept_ancestor():
+    tree = build_tree(FakeProvider(), sample_tree(), prune=PruneOptions(include_types=["ButtonControl"]))
+    assert tree["name"] == "root"  # 根节点总是保留
+    assert [child["name"] for child in tree["children"]] == ["ok", "hidden", "inside_empty", "cancel"]
+    ok = tree["children"][0]
+    assert ok["depth"] == 2 and ok["page_tag"] == "Main_0_1_2"  # depth 保持真实深度
+
+
+def test_prune_drop_offscreen_and_empty_drop_whole_subtrees():
+    prune = PruneOptions(drop_offscreen=True)
+    tree = build_tree(FakeProvider(), sample_tree(), prune=prune)
+    assert "hidden" not in names(tree) and "hidden_child" not in names(tree)
+    cached = FakeProvider(cached=True)
+    assert build_tree(cached, cached.prepare(sample_tree()), prune=prune) == tree
+    tree = build_tree(FakeProvider(), sample_tree(), prune=PruneOptions(drop_empty=True))
+    assert "empty" not in names(tree) and "inside_empty" not in names(tree)
+    assert "ok" in names(tree)
+
+
+def test_prune_max_depth_and_clickable_types():
+    tree = build_tree(FakeProvider(), sample_tree(), prune=PruneOptions(max_depth=1))
+    assert names(tree) == ["root", "pane", "empty", "cancel"]
+    assert all(not child["children"] for child in tree["children"])
+    tree = build_tree(FakeProvider(), sample_tree(), prune=PruneOptions(clickable_types=["ButtonControl"]))
+    clickable = {n["name"]: n["clickable"] for n in iter_tree(tree)}
+    assert clickable["ok"] == [2, 2, True] and clickable["label"] is None
+
+
+def test_prune_exclude_types_skips_reads():
+    provider = FakeProvider()
+    tree = build_tree(provider, sample_tree(), prune=PruneOptions(exclude_types=["PaneControl"]))
+    assert names(tree) == ["root", "cancel"]
+    full = FakeProvider()
+    build_tree(full, sample_tree())
+    assert provider.calls < full.calls
+
+
+def test_no_prune_is_identity():
+    assert build_tree(FakeProvider(), sample_tree(), prune=PruneOptions()) == baseline_extract_ui(sample_tree())
+
+
+def test_cached_mode_is_skipped_when_it_would_fetch_pruned_subtrees():
+    from ui_tree import LiveProvider, cache_covers, open_provider
+
+    assert cache_covers(PruneOptions()) and cache_covers(PruneOptions(max_depth=1))
+    assert not cache_covers(PruneOptions(max_depth=2))
+    assert not cache_covers(PruneOptions(exclude_types=["PaneControl"]))
+    provider, root = open_provider("ctrl", "cached", PruneOptions(max_depth=3))
+    assert isinstance(provider, LiveProvider) and root == "ctrl"
+
+
+def test_budget_expiry_truncates_without_dispatching(monkeypatch):
+    import types
+
+    import ui_tree
+
+    clock = [0.0]
+    reads_after_deadline = []
+
+    class ExpiringProvider(FakeProvider):
+        """读取 "pane" 的 head 字段时把时钟拨过截止时间，模拟这次调用恰好用完预算"""
+
+        def read(self, node, fields=ui_tree.FIELDS):
+            if clock[0] >= 1.0:
+                reads_after_deadline.append((node["name"], fields))
+            if node["name"] == "pane" and fields == ui_tree.HEAD_FIELDS:
+                clock[0] = 1.0
+            return super().read(node, fields)
+
+        def children(self, node):
+            if clock[0] >= 1.0:
+                reads_after_deadline.append((node["name"], "children"))
+            return super().children(node)
+
+    monkeypatch.setattr(ui_tree, "time", types.SimpleNamespace(perf_counter=lambda: clock[0], sleep=lambda s: None))
+    monkeypatch.setattr(ui_tree, "LiveProvider", ExpiringProvider)
+    records, report = ui_tree.extract_budgeted(sample_tree(), mode="live", budget=1.0, call_timeout=5.0)
+    assert reads_after_deadline == []
+    assert report["abandoned_threads"] == 0 and report["timed_out"] == 0
+    pane = next(r for r in records if r["control_type"] == "PaneControl" and r["rect"]["right"] == 50)
+    assert pane["truncated"] and pane["name"] is None and pane["clickable"] is None
+    assert not report["complete"] and report["truncated"] >= 1